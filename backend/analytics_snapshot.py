@@ -0,0 +1,712 @@
+"""
+Columnar analytics snapshot for widget queries (optional)
+
+With WIDGET_ANALYTICS_ENGINE enabled and NumPy installed, each worker keeps
+every whitelisted widget column (widget_query_builder.ALLOWED_COLUMNS) as a
+NumPy array aligned on the application row, with strings and dates
+dictionary-encoded. execute_widget_query hands configs to AnalyticsSnapshot
+first: fields, aggregations, conditions, group_by, order_by and limit are
+evaluated as vectorized masks and group-bys over the arrays.
+
+Anything whose SQL result cannot be reproduced exactly raises Unsupported and
+runs through SQL instead, e.g. string ordering under a locale collation,
+PostgreSQL numeric averages, type-coerced comparisons, or a LIMIT that cuts
+through rows the ORDER BY leaves tied.
+
+The snapshot follows writes through the response_cache data version. When it
+moves, rows whose updated_at is within SNAPSHOT_OVERLAP of the newest change
+already seen are re-read. Deleted applications, or FULL_REBUILD_INTERVAL
+elapsing, trigger a full rebuild in the background; SQL answers meanwhile.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import select, func, text, Boolean, Integer, BigInteger, Date, DateTime, String
+
+from models import db, Application
+from response_cache import get_data_version
+from widget_query_builder import TABLE_MODELS, ALLOWED_COLUMNS, ALLOWED_AGGREGATIONS, ALLOWED_OPERATORS, validate_column
+
+try:
+    import numpy as np
+except ImportError:  # Optional: without NumPy every widget runs through SQL
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Re-read rows changed this long before the newest updated_at already seen,
+# so transactions that committed late with an earlier timestamp are picked up
+SNAPSHOT_OVERLAP = timedelta(minutes=5)
+
+# Seconds after which the snapshot is rebuilt from scratch in the background
+FULL_REBUILD_INTERVAL = 900
+
+# Lower-case ASCII only, like SQLite's lower() and LIKE
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+class Unsupported(Exception):
+    """The snapshot cannot reproduce this config's SQL result exactly"""
+
+
+def _kind(column_type):
+    if isinstance(column_type, Boolean):
+        return 'bool'
+    if isinstance(column_type, Integer):
+        return 'int'
+    if isinstance(column_type, DateTime):
+        return 'datetime'
+    if isinstance(column_type, Date):
+        return 'date'
+    if isinstance(column_type, String):
+        return 'str'
+    raise TypeError(f'Unsupported column type {column_type}')
+
+
+class _Column:
+    """One whitelisted column over all application rows"""
+
+    def __init__(self, kind, bigint, values):
+        self.kind = kind
+        self.bigint = bigint
+        self.dictionary = []
+        self.lookup = {}
+        self._ranks = None
+        self.null = np.array([value is None for value in values], dtype=bool)
+        if kind == 'bool':
+            self.values = np.array([bool(value) if value is not None else False for value in values], dtype=np.int64)
+        elif kind == 'int':
+            self.values = np.array([value if value is not None else 0 for value in values], dtype=np.int64)
+        else:
+            self.values = np.array([self._code(value) for value in values], dtype=np.int64)
+
+    @property
+    def encoded(self):
+        return self.kind in ('str', 'date', 'datetime')
+
+    def _code(self, value):
+        if value is None:
+            return -1
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        return code
+
+    def grow(self, count):
+        self.null = np.concatenate([self.null, np.ones(count, dtype=bool)])
+        fill = -1 if self.encoded else 0
+        self.values = np.concatenate([self.values, np.full(count, fill, dtype=np.int64)])
+
+    def set(self, row, value):
+        self.null[row] = value is None
+        if self.encoded:
+            before = len(self.dictionary)
+            self.values[row] = self._code(value)
+            if len(self.dictionary) != before:
+                self._ranks = None
+        elif value is not None:
+            self.values[row] = int(value)
+
+    def ranks(self):
+        """
+        Sort rank of each dictionary code (the dictionary itself is in arrival
+        order), indexable by code; the NULL code -1 ranks -1
+        """
+        if self._ranks is None:
+            order = sorted(range(len(self.dictionary)), key=self.dictionary.__getitem__)
+            ranks = np.full(len(order) + 1, -1, dtype=np.int64)
+            ranks[order] = np.arange(len(order))
+            self._ranks = ranks
+        return self._ranks
+
+    def decode(self, code_or_value, is_null=False):
+        if is_null:
+            return None
+        if self.encoded:
+            return None if code_or_value < 0 else self.dictionary[code_or_value]
+        return bool(code_or_value) if self.kind == 'bool' else int(code_or_value)
+
+
+class AnalyticsSnapshot:
+    """Per-worker columnar copy of the widget columns; see the module docstring"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._building = False
+        self._frame = None
+
+    # ----- Building and refreshing -----
+
+    def _load(self):
+        """Read every table into a new frame"""
+        connection = db.session.connection()
+        dialect = connection.dialect.name
+        version = get_data_version()
+
+        frame = {
+            'dialect': dialect,
+            'version': version,
+            'built_at': time.monotonic(),
+            'byte_order_strings': True,
+            'present': {},
+            'columns': {},
+            'watermarks': {},
+        }
+        if dialect == 'postgresql':
+            collation = connection.execute(text(
+                'SELECT datcollate FROM pg_database WHERE datname = current_database()'
+            )).scalar()
+            frame['byte_order_strings'] = collation in ('C', 'POSIX')
+
+        candidates = connection.execute(
+            select(Application.candidate_id).order_by(Application.id)
+        ).scalars().all()
+        index = {candidate_id: row for row, candidate_id in enumerate(candidates)}
+        frame['candidates'] = list(candidates)
+        frame['index'] = index
+
+        for table, model in TABLE_MODELS.items():
+            names = ALLOWED_COLUMNS[table]
+            rows = connection.execute(select(
+                model.candidate_id, model.updated_at, *[getattr(model, name) for name in names]
+            )).all()
+            present = np.zeros(len(candidates), dtype=bool)
+            aligned = [[None] * len(candidates) for _ in names]
+            watermark = None
+            for row in rows:
+                position = index.get(row[0])
+                if position is None:
+                    continue
+                present[position] = True
+                if row[1] is not None and (watermark is None or row[1] > watermark):
+                    watermark = row[1]
+                for values, value in zip(aligned, row[2:]):
+                    values[position] = value
+            frame['present'][table] = present
+            frame['watermarks'][table] = watermark
+            for name, values in zip(names, aligned):
+                column_type = model.__table__.c[name].type
+                frame['columns'][(table, name)] = _Column(_kind(column_type), isinstance(column_type, BigInteger), values)
+        return frame
+
+    def build(self):
+        """Load the snapshot from the database (blocking)"""
+        frame = self._load()
+        with self._lock:
+            self._frame = frame
+        return len(frame['candidates'])
+
+    def _build_in_background(self, app):
+        try:
+            with app.app_context():
+                rows = self.build()
+                logger.info(f"Analytics snapshot built ({rows} applications)")
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"Analytics snapshot build failed: {str(e)}")
+        finally:
+            self._building = False
+
+    def _start_build(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(
+            target=self._build_in_background,
+            args=(current_app._get_current_object(),),
+            daemon=True
+        ).start()
+
+    def _grow(self, frame, candidate_ids):
+        start = len(frame['candidates'])
+        for offset, candidate_id in enumerate(candidate_ids):
+            frame['index'][candidate_id] = start + offset
+        frame['candidates'].extend(candidate_ids)
+        for table in frame['present']:
+            frame['present'][table] = np.concatenate([frame['present'][table], np.zeros(len(candidate_ids), dtype=bool)])
+        for column in frame['columns'].values():
+            column.grow(len(candidate_ids))
+
+    def _refresh(self, frame):
+        """
+        Apply rows changed since the last refresh
+
+        Returns: False if a full rebuild is needed instead
+        """
+        version = get_data_version()
+        connection = db.session.connection()
+        for table, model in TABLE_MODELS.items():
+            names = ALLOWED_COLUMNS[table]
+            query = select(model.candidate_id, model.updated_at, *[getattr(model, name) for name in names])
+            watermark = frame['watermarks'][table]
+            if watermark is not None:
+                query = query.where(model.updated_at >= watermark - SNAPSHOT_OVERLAP)
+            rows = connection.execute(query).all()
+
+            if model is Application:
+                new = [row[0] for row in rows if row[0] not in frame['index']]
+                if new:
+                    self._grow(frame, new)
+
+            present = frame['present'][table]
+            columns = [frame['columns'][(table, name)] for name in names]
+            for row in rows:
+                position = frame['index'].get(row[0])
+                if position is None:
+                    return False
+                present[position] = True
+                if row[1] is not None and (watermark is None or row[1] > watermark):
+                    watermark = row[1]
+                for column, value in zip(columns, row[2:]):
+                    column.set(position, value)
+            frame['watermarks'][table] = watermark
+
+        # Deleted applications leave stale rows behind
+        count = connection.execute(select(func.count(Application.id))).scalar()
+        if count != len(frame['candidates']):
+            return False
+        frame['version'] = version
+        return True
+
+    def _current_frame(self):
+        """The frame reflecting the latest data, or None (starting a rebuild) if there is none"""
+        frame = self._frame
+        if frame is None:
+            self._start_build()
+            return None
+        if time.monotonic() - frame['built_at'] > FULL_REBUILD_INTERVAL:
+            self._start_build()
+        if frame['version'] == get_data_version():
+            return frame
+        with self._lock:
+            if frame is not self._frame:
+                return self._current_frame()
+            if frame['version'] == get_data_version() or self._refresh(frame):
+                return frame
+            self._frame = None
+        self._start_build()
+        return None
+
+    # ----- Evaluation -----
+
+    def execute(self, config):
+        """
+        Evaluate a widget config against the snapshot
+
+        Returns: {'data': [...], 'row_count': int} exactly as execute_widget_query
+        would return it, or None to run the config through SQL
+        """
+        if np is None:
+            return None
+        try:
+            frame = self._current_frame()
+            if frame is None:
+                return None
+            with self._lock:
+                return _Evaluation(frame, config).run()
+        except Unsupported:
+            return None
+        except (TypeError, AttributeError, KeyError, ValueError):
+            # Malformed config: let the SQL path report the error
+            return None
+
+
+class _Evaluation:
+    """One widget config evaluated over a frame, mirroring execute_widget_query"""
+
+    def __init__(self, frame, config):
+        self.frame = frame
+        self.config = config
+        self.dialect = frame['dialect']
+
+    def column(self, table, name):
+        return self.frame['columns'][(table, name)]
+
+    def nulls(self, table, name):
+        """NULL mask of a column including rows its table has no row for (outer join)"""
+        return self.column(table, name).null | ~self.frame['present'][table]
+
+    def check_string_order(self, column):
+        if column.kind == 'str' and not self.frame['byte_order_strings']:
+            raise Unsupported('string ordering follows a locale collation')
+
+    # ----- Conditions -----
+
+    def _check_value(self, column, value):
+        """Only compare values SQL would bind without type coercion"""
+        if column.kind == 'bool' and isinstance(value, bool):
+            return
+        if column.kind == 'int' and isinstance(value, (int, float)) and not isinstance(value, bool) \
+                and abs(value) < 2 ** 63:
+            return
+        if column.kind == 'str' and isinstance(value, str):
+            return
+        raise Unsupported('value type does not match column type')
+
+    def _compare(self, column, operator, value):
+        """Rows where column <operator> value is true (NULLs never match)"""
+        if column.encoded:
+            if operator in ('=', '!='):
+                code = column.lookup.get(value)
+                equal = column.values == (code if code is not None else -2)
+                return equal if operator == '=' else ~equal
+            self.check_string_order(column)
+            lut = np.array([_COMPARE[operator](entry, value) for entry in column.dictionary] + [False], dtype=bool)
+            return lut[column.values]
+        return _COMPARE[operator](column.values, value)
+
+    def _like(self, column, value, nulls):
+        if column.kind != 'str' or not isinstance(value, str) or any(ch in value for ch in '%_\\'):
+            raise Unsupported('LIKE needs a plain string on a string column')
+        if self.dialect != 'sqlite' and not (value.isascii() and all(entry.isascii() for entry in column.dictionary)):
+            raise Unsupported('case folding of non-ASCII text is locale dependent')
+        pattern = value.translate(_ASCII_LOWER)
+        lut = np.array([pattern in entry.translate(_ASCII_LOWER) for entry in column.dictionary] + [False], dtype=bool)
+        return lut[column.values] & ~nulls
+
+    def _in(self, column, values):
+        if not values or any(value is None for value in values):
+            raise Unsupported('empty IN lists and NULL members follow SQL three-valued logic')
+        for value in values:
+            self._check_value(column, value)
+        if column.encoded:
+            codes = [column.lookup[value] for value in values if value in column.lookup]
+            return np.isin(column.values, codes)
+        return np.isin(column.values, values)
+
+    def condition_mask(self, table, name, operator, value):
+        column = self.column(table, name)
+        nulls = self.nulls(table, name)
+        if operator == 'IS NULL':
+            return nulls
+        if operator == 'IS NOT NULL':
+            return ~nulls
+        if column.kind in ('date', 'datetime'):
+            raise Unsupported('date comparisons depend on driver coercion')
+        if operator in ('=', '!=') and value is None:
+            # SQLAlchemy renders == None / != None as IS NULL / IS NOT NULL
+            return nulls if operator == '=' else ~nulls
+        if operator in _COMPARE:
+            self._check_value(column, value)
+            if column.kind == 'bool' and operator not in ('=', '!='):
+                raise Unsupported('ordering comparison on a boolean')
+            return self._compare(column, operator, value) & ~nulls
+        if operator in ('LIKE', 'NOT LIKE'):
+            matches = self._like(column, value, nulls)
+            return matches if operator == 'LIKE' else ~matches & ~nulls
+        if operator in ('IN', 'NOT IN'):
+            if isinstance(value, str):
+                if column.kind != 'str':
+                    raise Unsupported('comma-separated IN on a non-string column')
+                value = [v.strip() for v in value.split(',')]
+            elif not isinstance(value, list):
+                return None  # SQL adds no clause for other value types
+            matches = self._in(column, value) & ~nulls
+            return matches if operator == 'IN' else ~matches & ~nulls
+        raise Unsupported(f'operator {operator}')
+
+    # ----- Aggregation -----
+
+    def aggregate(self, aggregation, table, name, rows, groups, group_count):
+        column = self.column(table, name)
+        not_null = ~self.nulls(table, name)[rows]
+        counts = np.bincount(groups[not_null], minlength=group_count)
+        if aggregation == 'COUNT':
+            return [int(count) for count in counts]
+
+        values = column.values[rows][not_null]
+        member = groups[not_null]
+        if aggregation in ('SUM', 'AVG'):
+            if column.kind != 'int':
+                raise Unsupported(f'{aggregation} of a non-integer column')
+            if values.size and int(np.abs(values).max()) * values.size >= 2 ** 53:
+                raise Unsupported('sum may exceed exact float range')
+            sums = np.zeros(group_count, dtype=np.int64)
+            np.add.at(sums, member, values)
+            if aggregation == 'AVG':
+                if self.dialect != 'sqlite':
+                    raise Unsupported('AVG of integers is a numeric with database-specific scale')
+                return [int(total) / int(count) if count else None for total, count in zip(sums, counts)]
+            if self.dialect == 'postgresql' and column.bigint:
+                return [Decimal(int(total)) if count else None for total, count in zip(sums, counts)]
+            return [int(total) if count else None for total, count in zip(sums, counts)]
+
+        # MIN / MAX
+        if column.kind == 'bool':
+            raise Unsupported(f'{aggregation} of a boolean')
+        self.check_string_order(column)
+        keys = column.ranks()[values] if column.encoded else values
+        if aggregation == 'MIN':
+            result = np.full(group_count, np.iinfo(np.int64).max, dtype=np.int64)
+            np.minimum.at(result, member, keys)
+        else:
+            result = np.full(group_count, np.iinfo(np.int64).min, dtype=np.int64)
+            np.maximum.at(result, member, keys)
+        if column.encoded:
+            by_rank = np.argsort(column.ranks()[:-1])
+            return [column.dictionary[by_rank[key]] if count else None for key, count in zip(result, counts)]
+        return [int(key) if count else None for key, count in zip(result, counts)]
+
+    def group_key(self, table, name, rows):
+        column = self.column(table, name)
+        if column.encoded:
+            return np.where(self.nulls(table, name)[rows], -1, column.values[rows])
+        values, nulls = column.values[rows], self.nulls(table, name)[rows]
+        if not nulls.any():
+            return values
+        # NULLs form one group, keyed just below the smallest value
+        return np.where(nulls, values[~nulls].min(initial=1) - 1, values)
+
+    def decode(self, table, name, rows):
+        column = self.column(table, name)
+        nulls = self.nulls(table, name)[rows]
+        return [column.decode(value, is_null) for value, is_null in zip(column.values[rows], nulls)]
+
+    # ----- Ordering -----
+
+    def _null_sort_key(self, value):
+        # PostgreSQL sorts NULL as the largest value, SQLite as the smallest
+        null_large = self.dialect != 'sqlite'
+        if value is None:
+            return (1, 0) if null_large else (0, 0)
+        return (0, value) if null_large else (1, value)
+
+    def sort_rows(self, rows, keys):
+        """Stable multi-key sort of output rows; keys are [(values per row, descending)]"""
+        order = list(range(len(rows)))
+        for values, descending in reversed(keys):
+            order.sort(key=lambda i: self._null_sort_key(values[i]), reverse=descending)
+        return order
+
+    # ----- Whole config -----
+
+    def run(self):
+        config = self.config
+        data_source = config.get('data_source', {})
+        fields = config.get('fields', [])
+        conditions = config.get('conditions', [])
+        group_by = config.get('group_by', [])
+        order_by = config.get('order_by', [])
+        limit = min(config.get('limit', 100), 1000)
+        if not isinstance(limit, int) or isinstance(limit, bool) or not fields:
+            raise Unsupported('invalid limit or no fields')
+
+        base_table = data_source.get('base_table', 'application')
+        if base_table not in TABLE_MODELS:
+            raise Unsupported('invalid base table')
+        required_tables = {base_table}
+        required_tables.update(t for t in data_source.get('joins', []) if t in TABLE_MODELS)
+        required_tables.update(f.get('table', base_table) for f in fields if f.get('table', base_table) in TABLE_MODELS)
+        required_tables.update(c.get('table', base_table) for c in conditions if c.get('table', base_table) in TABLE_MODELS)
+
+        # SELECT list: (alias, table, column, aggregation or None)
+        outputs = []
+        for field in fields:
+            table = field.get('table', base_table)
+            name = field.get('column')
+            validate_column(table, name)
+            aggregation = field.get('aggregation')
+            aggregation = aggregation if aggregation and aggregation in ALLOWED_AGGREGATIONS else None
+            if field.get('transform') is not None or aggregation == 'PERCENTILE':
+                raise Unsupported('field transforms and percentiles')
+            outputs.append((field.get('alias', name), table, name, aggregation))
+        aliases = {alias: position for position, (alias, _, _, _) in enumerate(outputs)}
+
+        # FROM the first field's table, outer-joined to the rest on candidate_id
+        mask = self.frame['present'][outputs[0][1]].copy()
+
+        for condition in conditions:
+            table = condition.get('table', base_table)
+            name = condition.get('column')
+            operator = condition.get('operator')
+            if not name or operator not in ALLOWED_OPERATORS:
+                continue
+            try:
+                validate_column(table, name)
+            except ValueError:
+                continue
+            matches = self.condition_mask(table, name, operator, condition.get('value'))
+            if matches is not None:
+                mask &= matches
+
+        group_columns = []
+        for gb in group_by:
+            if '.' in gb:
+                parts = gb.split('.')
+                if len(parts) == 2:
+                    try:
+                        validate_column(*parts)
+                        group_columns.append(tuple(parts))
+                    except ValueError:
+                        continue
+            else:
+                for field in fields:
+                    if field.get('alias') == gb or field.get('column') == gb:
+                        try:
+                            validate_column(field.get('table', base_table), field.get('column'))
+                            group_columns.append((field.get('table', base_table), field.get('column')))
+                        except ValueError:
+                            continue
+                        break
+        if any(table not in required_tables for table, _ in group_columns):
+            raise Unsupported('GROUP BY a table that is not joined')
+
+        # ORDER BY: (output position or raw (table, column), descending)
+        order_keys = []
+        for ob in order_by:
+            col_name = ob.get('column')
+            descending = ob.get('direction', 'ASC').upper() == 'DESC'
+            if col_name in aliases:
+                order_keys.append((aliases[col_name], descending))
+                continue
+            for field in fields:
+                if field.get('column') == col_name or field.get('alias') == col_name:
+                    table = field.get('table', base_table)
+                    try:
+                        validate_column(table, col_name if field.get('column') == col_name else field.get('column'))
+                        order_keys.append(((table, field.get('column')), descending))
+                    except ValueError:
+                        continue
+                    break
+
+        rows = np.flatnonzero(mask)
+        aggregated = bool(group_columns) or any(aggregation for _, _, _, aggregation in outputs)
+        if aggregated:
+            result_rows, sort_values = self._run_aggregated(outputs, group_columns, order_keys, rows)
+        else:
+            result_rows, sort_values = self._run_rows(outputs, order_keys, rows, limit)
+
+        # A LIMIT cutting through rows the ORDER BY leaves tied picks arbitrary rows in SQL
+        if limit > 0 and len(result_rows) > limit:
+            if not order_keys:
+                raise Unsupported('LIMIT without ORDER BY')
+            if sort_values(limit - 1) == sort_values(limit):
+                raise Unsupported('LIMIT cuts through tied rows')
+            result_rows = result_rows[:limit]
+
+        data = []
+        for values in result_rows:
+            row_dict = {}
+            for (alias, _, _, _), value in zip(outputs, values):
+                if hasattr(value, 'isoformat'):
+                    value = value.isoformat()
+                row_dict[alias] = value
+            data.append(row_dict)
+        return {'data': data, 'row_count': len(data)}
+
+    def _run_aggregated(self, outputs, group_columns, order_keys, rows):
+        group_set = set(group_columns)
+        for _, table, name, aggregation in outputs:
+            if not aggregation and (table, name) not in group_set:
+                raise Unsupported('selected column is neither grouped nor aggregated')
+
+        if group_columns:
+            if rows.size == 0:
+                return [], None
+            # Fold the group columns into one dense key, in group column order
+            groups, group_count = np.zeros(rows.size, dtype=np.int64), 1
+            for table, name in group_columns:
+                inverse, distinct = _dense_ranks(self.group_key(table, name, rows))
+                groups, group_count = _dense_ranks(groups * distinct + inverse)
+            first = np.full(group_count, rows.size, dtype=np.int64)
+            np.minimum.at(first, groups, np.arange(rows.size))
+            representatives = rows[first]
+        else:
+            groups, group_count = np.zeros(rows.size, dtype=np.int64), 1
+            representatives = None
+
+        columns = []
+        for _, table, name, aggregation in outputs:
+            if aggregation:
+                columns.append(self.aggregate(aggregation, table, name, rows, groups, group_count))
+            else:
+                columns.append(self.decode(table, name, representatives))
+
+        sort_keys = []
+        for key, descending in order_keys:
+            if isinstance(key, tuple):
+                if key not in group_set:
+                    raise Unsupported('ORDER BY a column that is not grouped')
+                self.check_string_order(self.column(*key))
+                sort_keys.append((self.decode(key[0], key[1], representatives), descending))
+            else:
+                _, table, name, aggregation = outputs[key]
+                if aggregation in (None, 'MIN', 'MAX'):
+                    self.check_string_order(self.column(table, name))
+                sort_keys.append((columns[key], descending))
+
+        order = self.sort_rows(range(group_count), sort_keys)
+        result_rows = [tuple(column[i] for column in columns) for i in order]
+
+        def sort_values(position):
+            return tuple(values[order[position]] for values, _ in sort_keys)
+        return result_rows, sort_values
+
+    def _run_rows(self, outputs, order_keys, rows, limit):
+        sort_arrays = []
+        for key, descending in order_keys:
+            table, name = outputs[key][1:3] if not isinstance(key, tuple) else key
+            column = self.column(table, name)
+            self.check_string_order(column)
+            nulls = self.nulls(table, name)[rows]
+            values = column.ranks()[column.values[rows]] if column.encoded else column.values[rows]
+            if descending:
+                values = -values
+            null_first = (self.dialect == 'sqlite') != descending
+            null_key = np.where(nulls, 0, 1) if null_first else np.where(nulls, 1, 0)
+            sort_arrays.append((null_key, np.where(nulls, 0, values)))
+
+        if sort_arrays:
+            # np.lexsort sorts by the last key first
+            lex_keys = [array for pair in reversed(sort_arrays) for array in reversed(pair)]
+            order = np.lexsort(lex_keys)
+        else:
+            order = np.arange(rows.size)
+
+        # Only decode what can be returned (plus one row to detect a tied cut-off)
+        keep = order[:limit + 1] if limit > 0 else order
+        selected = rows[keep]
+        columns = [self.decode(table, name, selected) for _, table, name, _ in outputs]
+        result_rows = [tuple(column[i] for column in columns) for i in range(len(selected))]
+
+        def sort_values(position):
+            return tuple(int(key[keep[position]]) for pair in sort_arrays for key in pair)
+        return result_rows, sort_values
+
+
+def _dense_ranks(keys):
+    """
+    Rank of each key among the distinct keys, ascending
+
+    Returns: (ranks, number of distinct keys)
+    """
+    low = int(keys.min())
+    span = int(keys.max()) - low + 1
+    if span > 4 * keys.size + 1024:
+        distinct, ranks = np.unique(keys, return_inverse=True)
+        return ranks.reshape(-1), len(distinct)
+    # Small key range (dictionary codes, counts, flags): bucket instead of sorting
+    seen = np.zeros(span, dtype=bool)
+    seen[keys - low] = True
+    ranks = np.cumsum(seen) - 1
+    return ranks[keys - low], int(ranks[-1]) + 1
+
+
+_COMPARE = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '>': lambda a, b: a > b,
+    '<=': lambda a, b: a <= b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+# Shared by every request in this worker
+analytics_snapshot = AnalyticsSnapshot()
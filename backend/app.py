@@ -1,11 +1,13 @@
 import os
 import json
 import uuid
+import time
 import logging
 from logging.handlers import RotatingFileHandler
 import traceback
-from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+import click
+from datetime import datetime, timedelta
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager, create_access_token, verify_jwt_in_request, get_jwt_identity, jwt_required
@@ -22,9 +24,22 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from sqlalchemy import func
 
 from config import Config
-from models import db, User, Submission, FormConfig, ValidationSchema, Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo, Widget, EmailQueue, OTPVerification, EditToken
-from helpers import save_normalized_application
-from widget_query_builder import get_widget_metadata, execute_widget_query, get_widget_candidate_ids, get_widget_segment_candidate_ids
+from models import db, User, Submission, FormConfig, ValidationSchema, Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo, Widget, WidgetSnapshot, EmailQueue, OTPVerification, EditToken
+from helpers import save_normalized_application, resolve_application_list_fields, serialize_application_list_row, APPLICATION_LIST_COLUMNS, load_application_details, serialize_application_details
+from response_cache import application_detail_cache, dashboard_cache, widget_data_cache, widget_candidate_cache, dashboard_filter_cache, track_data_version
+from pagination import keyset_paginate, count_total
+from widget_query_guard import WidgetQueryError, cancel_widget_query
+from widget_profiler import recent_executions, summarize_executions
+from widget_bulk import MAX_BULK_WIDGETS, WIDGET_TYPES, reorder_widget_positions, save_widgets
+from widget_snapshots import MIN_REFRESH_INTERVAL, load_widget_snapshots, snapshot_freshness, shared_data_version, refresh_widget_snapshot
+from widget_query_builder import get_widget_metadata, execute_widget_query_cached, execute_widget_queries, MAX_BATCH_WIDGETS, WIDGET_CANDIDATE_PAGE_SIZE, MAX_WIDGET_CANDIDATE_PAGE_SIZE, build_widget_candidate_query, build_widget_segment_candidate_query, page_widget_candidate_ids, iter_widget_candidate_csv, save_widget_candidate_segment, widget_config_hash, profile_widget_query
+from application_export import resolve_export_columns, build_export_query, iter_csv, write_xlsx, iter_file
+from dashboard_stats import compute_dashboard_stats
+from dashboard_filters import FILTER_PAGE_SIZE, MAX_FILTER_PAGE_SIZE, normalize_filters, iter_filter_leaves, build_filter_candidate_query, filter_cache_key, describe_filters
+from dashboard_counters import register_counter_hooks, rebuild_dashboard_counters
+from facet_index import facet_index, page_candidate_ids, register_facet_hooks
+from metrics_rollup import get_timeseries, refresh_metric_rollups
+from segments import SegmentNotFound, create_segment_from_query, create_segment_from_ids, get_segment, segment_candidates, filter_by_segment, serialize_segment
 
 
 # Role-based access control decorators
@@ -247,6 +262,9 @@ def create_app():
     setup_logging(app)
 
     db.init_app(app)
+    register_counter_hooks()
+    track_data_version(Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo)
+    register_facet_hooks()
     CORS(app,
      origins=[
          'https://t2026.vglug.org',
@@ -1279,27 +1297,37 @@ def create_app():
 
         return jsonify({'msg': 'Validation schema activated'}), 200
 
-    @app.route('/admin/applications', methods=['GET'])
-    @can_view_applications
-    def get_applications():
-        """List all applications with pagination, sorting, and search"""
-        # Get query parameters
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        sort_by = request.args.get('sort_by', 'created_at')
-        sort_order = request.args.get('sort_order', 'desc')
-        search = request.args.get('search', '').strip()
-        candidate_ids = request.args.get('candidate_ids', '').strip()
+    def resolve_sort_column(sort_by):
+        """Map a sort_by request parameter to a real Application/BasicInfo column"""
+        if sort_by in Application.__table__.columns:
+            return getattr(Application, sort_by)
+        if sort_by in BasicInfo.__table__.columns:
+            return getattr(BasicInfo, sort_by)
+        return None
+
+    def build_applications_query(args):
+        """
+        Build the filtered application list query from request arguments
+
+        Raises SegmentNotFound if segment_id refers to an unknown or expired segment.
+        """
+        search = args.get('search', '').strip()
+        candidate_ids = args.get('candidate_ids', '').strip()
+        segment_id = args.get('segment_id', '').strip()
 
         # Quick filters
-        filter_appeared = request.args.get('filter_appeared', '').strip()
-        filter_selected = request.args.get('filter_selected', '').strip()
-        filter_considered = request.args.get('filter_considered', '').strip()
+        filter_appeared = args.get('filter_appeared', '').strip()
+        filter_selected = args.get('filter_selected', '').strip()
+        filter_considered = args.get('filter_considered', '').strip()
 
         # Build query
         query = Application.query.join(BasicInfo)
 
-        # Apply candidate_ids filter (for widget navigation)
+        # Restrict to a saved segment (for widget and dashboard drill-downs)
+        if segment_id:
+            query = filter_by_segment(query, Application.candidate_id, segment_id)
+
+        # Apply candidate_ids filter (legacy widget navigation)
         if candidate_ids:
             ids_list = [cid.strip() for cid in candidate_ids.split(',') if cid.strip()]
             if ids_list:
@@ -1334,129 +1362,143 @@ def create_app():
             )
             query = query.filter(search_filter)
 
-        # Apply sorting
-        sort_column = getattr(Application, sort_by, None) or getattr(BasicInfo, sort_by, None)
-        if sort_column is not None:
-            if sort_order == 'desc':
-                query = query.order_by(sort_column.desc())
-            else:
-                query = query.order_by(sort_column.asc())
-        else:
-            query = query.order_by(Application.created_at.desc())
+        return query
 
-        # Paginate
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    @app.route('/admin/applications', methods=['GET'])
+    @can_view_applications
+    def get_applications():
+        """
+        List applications with keyset pagination, sorting, and search
+
+        Pass the previous response's next_cursor (or prev_cursor) as `cursor`
+        to fetch the next (or previous) page. `page` is deprecated: it pages
+        with OFFSET and is only kept for clients that do not use cursors.
+        The total is estimated unless include_total=true is given.
+        `fields` narrows the returned columns (see APPLICATION_LIST_COLUMNS);
+        rows are fetched as plain column tuples in a single statement.
+        """
+        # Get query parameters
+        page = request.args.get('page', 1, type=int)
+        per_page = max(request.args.get('per_page', 20, type=int), 1)
+        sort_by = request.args.get('sort_by', 'created_at')
+        sort_order = 'asc' if request.args.get('sort_order', 'desc') == 'asc' else 'desc'
+        cursor = request.args.get('cursor', '').strip()
+        include_total = request.args.get('include_total', '').strip() == 'true'
 
-        applications = []
-        for app in pagination.items:
-            applications.append({
-                'id': app.id,
-                'candidate_id': app.candidate_id,
-                'uuid': app.uuid,
-                'status': app.status,
-                'created_at': app.created_at.isoformat(),
-                'basic_info': {
-                    'full_name': app.basic_info.full_name,
-                    'email': app.basic_info.email,
-                    'contact': app.basic_info.contact,
-                    'gender': app.basic_info.gender,
-                    'dob': app.basic_info.dob.isoformat() if app.basic_info.dob else None,
-                    'shortlisted': app.basic_info.shortlisted,
-                    'appeared_for_one_to_one': app.basic_info.appeared_for_one_to_one,
-                    'selected': app.basic_info.selected,
-                    'considered': app.basic_info.considered
-                }
-            })
+        try:
+            fields = resolve_application_list_fields(request.args.get('fields', '').strip())
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+
+        try:
+            query = build_applications_query(request.args)
+        except SegmentNotFound as e:
+            return jsonify({'msg': str(e)}), 404
+
+        # Apply sorting (candidate_id breaks ties so cursors are unambiguous)
+        sort_column = resolve_sort_column(sort_by)
+        if sort_column is None:
+            sort_by, sort_order = 'created_at', 'desc'
+            sort_column = Application.created_at
+
+        try:
+            result = keyset_paginate(
+                query.with_entities(*[APPLICATION_LIST_COLUMNS[f] for f in fields]),
+                sort_column,
+                Application.candidate_id,
+                sort_key=sort_by,
+                direction=sort_order,
+                cursor=cursor or None,
+                per_page=per_page,
+                offset=(page - 1) * per_page if page > 1 else None
+            )
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+
+        total, total_is_exact = count_total(query, exact=include_total)
+
+        applications = [serialize_application_list_row(row, fields) for row in result['items']]
 
         return jsonify({
             'applications': applications,
-            'total': pagination.total,
+            'total': total,
+            'total_is_exact': total_is_exact,
             'page': page,
             'per_page': per_page,
-            'pages': pagination.pages
+            'pages': (total + per_page - 1) // per_page,
+            'next_cursor': result['next_cursor'],
+            'prev_cursor': result['prev_cursor'],
+            'has_more': result['has_more']
         }), 200
 
+    @app.route('/admin/applications/export', methods=['GET'])
+    @can_view_applications
+    def export_applications():
+        """
+        Export applications as CSV or XLSX
+
+        Takes the same filters, segment_id, sort_by and sort_order as the list
+        endpoint. `format` is csv (default) or xlsx; `columns` narrows the
+        export to comma-separated column or section names (see EXPORT_COLUMNS).
+        Rows are streamed from a server-side cursor so memory stays flat.
+        """
+        export_format = request.args.get('format', 'csv').strip().lower()
+        if export_format not in ('csv', 'xlsx'):
+            return jsonify({'msg': 'format must be csv or xlsx'}), 400
+
+        try:
+            columns = resolve_export_columns(request.args.get('columns', '').strip())
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+
+        try:
+            query = build_applications_query(request.args)
+        except SegmentNotFound as e:
+            return jsonify({'msg': str(e)}), 404
+
+        sort_order = 'asc' if request.args.get('sort_order', 'desc') == 'asc' else 'desc'
+        sort_column = resolve_sort_column(request.args.get('sort_by', 'created_at'))
+        if sort_column is None:
+            sort_column, sort_order = Application.created_at, 'desc'
+
+        query = build_export_query(query, columns, sort_column, sort_order)
+        filename = f"applications_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+
+        if export_format == 'csv':
+            return Response(
+                stream_with_context(iter_csv(query, columns)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename={filename}'}
+            )
+
+        try:
+            path = write_xlsx(query, columns)
+        except ImportError:
+            return jsonify({'msg': 'XLSX export requires the XlsxWriter package'}), 501
+
+        return Response(
+            iter_file(path),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={
+                'Content-Disposition': f'attachment; filename={filename}',
+                'Content-Length': str(os.path.getsize(path))
+            }
+        )
+
     @app.route('/admin/application/<candidate_id>', methods=['GET'])
     @can_view_applications
     def get_application_detail(candidate_id):
         """Get full application details by candidate_id"""
-        application = Application.query.filter_by(candidate_id=candidate_id).first()
-        if not application:
+        result = application_detail_cache.get(candidate_id)
+        if result is not None:
+            return jsonify(result), 200
+
+        details = load_application_details(candidate_id=candidate_id)
+        if not details:
             return jsonify({'msg': 'Application not found'}), 404
 
-        # Build complete application data
-        result = {
-            'id': application.id,
-            'candidate_id': application.candidate_id,
-            'uuid': application.uuid,
-            'status': application.status,
-            'created_at': application.created_at.isoformat(),
-            'updated_at': application.updated_at.isoformat(),
-            'basic_info': {
-                'full_name': application.basic_info.full_name,
-                'dob': application.basic_info.dob.isoformat() if application.basic_info.dob else None,
-                'gender': application.basic_info.gender,
-                'email': application.basic_info.email,
-                'differently_abled': application.basic_info.differently_abled,
-                'contact': application.basic_info.contact,
-                'contact_as_whatsapp': application.basic_info.contact_as_whatsapp,
-                'whatsapp_contact': application.basic_info.whatsapp_contact,
-                'has_laptop': application.basic_info.has_laptop,
-                'laptop_ram': application.basic_info.laptop_ram,
-                'laptop_processor': application.basic_info.laptop_processor,
-                # Panel member review fields
-                'considered': application.basic_info.considered,
-                'selected': application.basic_info.selected,
-                'shortlisted': application.basic_info.shortlisted,
-                'shortlisted_by': application.basic_info.shortlisted_by,
-                'shortlisted_at': application.basic_info.shortlisted_at.isoformat() if application.basic_info.shortlisted_at else None,
-                'shortlister_email': application.basic_info.shortlister.email if application.basic_info.shortlister else None,
-                'remarks': application.basic_info.remarks,
-                'reviewed_by': application.basic_info.reviewed_by,
-                'reviewer_email': application.basic_info.reviewer.email if application.basic_info.reviewer else None
-            },
-            'educational_info': {
-                'college_name': application.educational_info.college_name,
-                'degree': application.educational_info.degree,
-                'department': application.educational_info.department,
-                'year': application.educational_info.year,
-                'tamil_medium': application.educational_info.tamil_medium,
-                'six_to_8_govt_school': application.educational_info.six_to_8_govt_school,
-                'six_to_8_school_name': application.educational_info.six_to_8_school_name,
-                'nine_to_10_govt_school': application.educational_info.nine_to_10_govt_school,
-                'nine_to_10_school_name': application.educational_info.nine_to_10_school_name,
-                'eleven_to_12_govt_school': application.educational_info.eleven_to_12_govt_school,
-                'eleven_to_12_school_name': application.educational_info.eleven_to_12_school_name,
-                'present_work': application.educational_info.present_work,
-                'received_scholarship': application.educational_info.received_scholarship,
-                'scholarship_details': application.educational_info.scholarship_details,
-                'transport_mode': application.educational_info.transport_mode,
-                'vglug_applied_before': application.educational_info.vglug_applied_before
-            },
-            'family_info': {
-                'family_environment': application.family_info.family_environment,
-                'single_parent_info': application.family_info.single_parent_info,
-                'family_members_count': application.family_info.family_members_count,
-                'family_members_details': application.family_info.family_members_details,
-                'earning_members_count': application.family_info.earning_members_count,
-                'earning_members_details': application.family_info.earning_members_details,
-                'guardian_details': application.family_info.guardian_details
-            },
-            'income_info': {
-                'total_family_income': application.income_info.total_family_income,
-                'own_land_size': application.income_info.own_land_size,
-                'house_ownership': application.income_info.house_ownership,
-                'full_address': application.income_info.full_address,
-                'pincode': application.income_info.pincode,
-                'district': application.income_info.district
-            },
-            'course_info': {
-                'preferred_course': application.course_info.preferred_course,
-                'training_benefit': application.course_info.training_benefit,
-                'heard_about_vglug': application.course_info.heard_about_vglug,
-                'participated_in_vglug_events': application.course_info.participated_in_vglug_events
-            }
-        }
+        result = serialize_application_details(details)
+        application_detail_cache.set(candidate_id, result)
 
         return jsonify(result), 200
 
@@ -1594,6 +1636,7 @@ def create_app():
             application.status = data['status']
 
         db.session.commit()
+        application_detail_cache.delete(candidate_id)
 
         return jsonify({'msg': 'Application updated successfully'}), 200
 
@@ -1620,6 +1663,7 @@ def create_app():
             application.basic_info.shortlisted_at = None
 
         db.session.commit()
+        application_detail_cache.delete(candidate_id)
 
         return jsonify({
             'msg': f'Application {"shortlisted" if shortlisted else "un-shortlisted"} successfully',
@@ -1636,27 +1680,35 @@ def create_app():
 
         data = request.get_json() or {}
         candidate_ids = data.get('candidate_ids', [])
+        segment_id = data.get('segment_id')
         shortlisted = data.get('shortlisted', True)
 
-        if not candidate_ids:
-            return jsonify({'msg': 'candidate_ids array is required'}), 400
+        if segment_id:
+            try:
+                get_segment(segment_id)
+            except SegmentNotFound as e:
+                return jsonify({'msg': str(e)}), 404
+            target = BasicInfo.candidate_id.in_(segment_candidates(segment_id))
+        elif candidate_ids:
+            target = BasicInfo.candidate_id.in_(candidate_ids)
+        else:
+            return jsonify({'msg': 'candidate_ids array or segment_id is required'}), 400
 
-        updated_count = 0
         now = datetime.utcnow()
 
-        for candidate_id in candidate_ids:
-            application = Application.query.filter_by(candidate_id=candidate_id).first()
-            if application and application.basic_info:
-                application.basic_info.shortlisted = shortlisted
-                if shortlisted:
-                    application.basic_info.shortlisted_by = user_id
-                    application.basic_info.shortlisted_at = now
-                else:
-                    application.basic_info.shortlisted_by = None
-                    application.basic_info.shortlisted_at = None
-                updated_count += 1
+        # Single UPDATE against the target set instead of a lookup per candidate
+        updated_count = BasicInfo.query.filter(target).update({
+            'shortlisted': shortlisted,
+            'shortlisted_by': user_id if shortlisted else None,
+            'shortlisted_at': now if shortlisted else None
+        }, synchronize_session=False)
 
         db.session.commit()
+        if segment_id:
+            # The segment's members are never loaded here, so drop every cached detail at once
+            application_detail_cache.clear_all()
+        else:
+            application_detail_cache.delete(*candidate_ids)
 
         return jsonify({
             'msg': f'{updated_count} application(s) {"shortlisted" if shortlisted else "un-shortlisted"} successfully',
@@ -1686,234 +1738,36 @@ def create_app():
     @admin_required
     def get_dashboard_stats():
         """Get dashboard statistics for admin (admin only)"""
-        from sqlalchemy import func
-
-        # Total applications count
-        total_applications = Application.query.count()
-
-        # Review status counts
-        considered_count = BasicInfo.query.filter(BasicInfo.considered == True).count()
-        not_considered_count = BasicInfo.query.filter(BasicInfo.considered == False).count()
-        pending_review_count = BasicInfo.query.filter(BasicInfo.considered == None).count()
-
-        selected_count = BasicInfo.query.filter(BasicInfo.selected == True).count()
-        not_selected_count = BasicInfo.query.filter(BasicInfo.selected == False).count()
-
-        # ===== Educational Statistics =====
-
-        # Government school statistics by year range
-        govt_school_6_to_8 = EducationalInfo.query.filter(EducationalInfo.six_to_8_govt_school == True).count()
-        private_school_6_to_8 = EducationalInfo.query.filter(EducationalInfo.six_to_8_govt_school == False).count()
-
-        govt_school_9_to_10 = EducationalInfo.query.filter(EducationalInfo.nine_to_10_govt_school == True).count()
-        private_school_9_to_10 = EducationalInfo.query.filter(EducationalInfo.nine_to_10_govt_school == False).count()
-
-        govt_school_11_to_12 = EducationalInfo.query.filter(EducationalInfo.eleven_to_12_govt_school == True).count()
-        private_school_11_to_12 = EducationalInfo.query.filter(EducationalInfo.eleven_to_12_govt_school == False).count()
-
-        # College-wise distribution (top 10)
-        college_distribution = db.session.query(
-            EducationalInfo.college_name,
-            func.count(EducationalInfo.id).label('count')
-        ).group_by(EducationalInfo.college_name).order_by(func.count(EducationalInfo.id).desc()).limit(10).all()
-
-        # Degree-wise distribution
-        degree_distribution = db.session.query(
-            EducationalInfo.degree,
-            func.count(EducationalInfo.id).label('count')
-        ).group_by(EducationalInfo.degree).order_by(func.count(EducationalInfo.id).desc()).all()
-
-        # Department-wise distribution (top 10)
-        department_distribution = db.session.query(
-            EducationalInfo.department,
-            func.count(EducationalInfo.id).label('count')
-        ).group_by(EducationalInfo.department).order_by(func.count(EducationalInfo.id).desc()).limit(10).all()
-
-        # Year of study distribution
-        year_distribution = db.session.query(
-            EducationalInfo.year,
-            func.count(EducationalInfo.id).label('count')
-        ).group_by(EducationalInfo.year).order_by(EducationalInfo.year).all()
-
-        # Scholarship statistics
-        scholarship_received = EducationalInfo.query.filter(EducationalInfo.received_scholarship == True).count()
-        scholarship_not_received = EducationalInfo.query.filter(EducationalInfo.received_scholarship == False).count()
-
-        # Tamil medium statistics
-        tamil_medium_count = EducationalInfo.query.filter(EducationalInfo.tamil_medium == True).count()
-        english_medium_count = EducationalInfo.query.filter(EducationalInfo.tamil_medium == False).count()
-
-        # Transport mode distribution
-        transport_distribution = db.session.query(
-            EducationalInfo.transport_mode,
-            func.count(EducationalInfo.id).label('count')
-        ).group_by(EducationalInfo.transport_mode).order_by(func.count(EducationalInfo.id).desc()).all()
-
-        # VGLUG applied before distribution
-        vglug_applied_distribution = db.session.query(
-            EducationalInfo.vglug_applied_before,
-            func.count(EducationalInfo.id).label('count')
-        ).group_by(EducationalInfo.vglug_applied_before).all()
-
-        # ===== Family Statistics =====
-
-        # Family environment distribution
-        family_env_distribution = db.session.query(
-            FamilyInfo.family_environment,
-            func.count(FamilyInfo.id).label('count')
-        ).group_by(FamilyInfo.family_environment).all()
-
-        # Single parent info distribution
-        single_parent_distribution = db.session.query(
-            FamilyInfo.single_parent_info,
-            func.count(FamilyInfo.id).label('count')
-        ).filter(FamilyInfo.single_parent_info != None).group_by(FamilyInfo.single_parent_info).all()
-
-        # Family members count distribution
-        family_members_distribution = db.session.query(
-            FamilyInfo.family_members_count,
-            func.count(FamilyInfo.id).label('count')
-        ).group_by(FamilyInfo.family_members_count).order_by(FamilyInfo.family_members_count).all()
-
-        # Earning members count distribution
-        earning_members_distribution = db.session.query(
-            FamilyInfo.earning_members_count,
-            func.count(FamilyInfo.id).label('count')
-        ).group_by(FamilyInfo.earning_members_count).order_by(FamilyInfo.earning_members_count).all()
-
-        # ===== Income Statistics =====
-
-        # Total family income distribution by ranges
-        # Get all income values and categorize them into ranges
-        all_incomes = db.session.query(IncomeInfo.total_family_income).filter(
-            IncomeInfo.total_family_income != None,
-            IncomeInfo.total_family_income != ''
-        ).all()
+        # Shared across admins and dropped on the next application write
+        return jsonify(dashboard_cache.get_or_compute('stats', compute_dashboard_stats)), 200
 
-        # Define income ranges
-        income_ranges = {
-            '< 50,000': 0,
-            '50,000 - 1,00,000': 0,
-            '1,00,000 - 2,50,000': 0,
-            '2,50,000 - 4,00,000': 0,
-            '> 4,00,000': 0,
-            'Not Specified': 0
-        }
-
-        for (income_str,) in all_incomes:
-            try:
-                # Try to parse the income value (remove commas, spaces, etc.)
-                income_clean = ''.join(c for c in str(income_str) if c.isdigit())
-                if income_clean:
-                    income_val = int(income_clean)
-                    if income_val < 50000:
-                        income_ranges['< 50,000'] += 1
-                    elif income_val < 100000:
-                        income_ranges['50,000 - 1,00,000'] += 1
-                    elif income_val < 250000:
-                        income_ranges['1,00,000 - 2,50,000'] += 1
-                    elif income_val < 400000:
-                        income_ranges['2,50,000 - 4,00,000'] += 1
-                    else:
-                        income_ranges['> 4,00,000'] += 1
-                else:
-                    income_ranges['Not Specified'] += 1
-            except (ValueError, TypeError):
-                income_ranges['Not Specified'] += 1
-
-        # Convert to list format for frontend, maintaining order
-        income_range_order = ['< 50,000', '50,000 - 1,00,000', '1,00,000 - 2,50,000', '2,50,000 - 4,00,000', '> 4,00,000']
-        income_distribution = [{'name': r, 'count': income_ranges[r]} for r in income_range_order if income_ranges[r] > 0]
-
-        # House ownership distribution
-        house_ownership_distribution = db.session.query(
-            IncomeInfo.house_ownership,
-            func.count(IncomeInfo.id).label('count')
-        ).group_by(IncomeInfo.house_ownership).all()
-
-        # District-wise distribution (top 10)
-        district_distribution = db.session.query(
-            IncomeInfo.district,
-            func.count(IncomeInfo.id).label('count')
-        ).group_by(IncomeInfo.district).order_by(func.count(IncomeInfo.id).desc()).limit(10).all()
-
-        # ===== Basic Info Statistics =====
-
-        # Gender distribution
-        gender_distribution = db.session.query(
-            BasicInfo.gender,
-            func.count(BasicInfo.id).label('count')
-        ).group_by(BasicInfo.gender).all()
-
-        # Differently abled statistics
-        differently_abled_count = BasicInfo.query.filter(BasicInfo.differently_abled == True).count()
-        not_differently_abled_count = BasicInfo.query.filter(BasicInfo.differently_abled == False).count()
-
-        # Laptop availability
-        has_laptop_count = BasicInfo.query.filter(BasicInfo.has_laptop == True).count()
-        no_laptop_count = BasicInfo.query.filter(BasicInfo.has_laptop == False).count()
-
-        # ===== Course Statistics =====
-
-        # Preferred course distribution
-        course_distribution = db.session.query(
-            CourseInfo.preferred_course,
-            func.count(CourseInfo.id).label('count')
-        ).group_by(CourseInfo.preferred_course).order_by(func.count(CourseInfo.id).desc()).all()
-
-        # Heard about VGLUG statistics
-        heard_about_vglug = CourseInfo.query.filter(CourseInfo.heard_about_vglug == True).count()
-        not_heard_about_vglug = CourseInfo.query.filter(CourseInfo.heard_about_vglug == False).count()
-
-        # Participated in VGLUG events
-        participated_count = CourseInfo.query.filter(CourseInfo.participated_in_vglug_events == True).count()
-        not_participated_count = CourseInfo.query.filter(CourseInfo.participated_in_vglug_events == False).count()
+    @app.route('/admin/metrics/timeseries', methods=['GET'])
+    @admin_required
+    def get_metrics_timeseries():
+        """
+        Zero-filled activity series from the metric_rollup buckets (admin only)
+
+        Query params: metric (submissions, otp_sent, otp_verified, emails_sent,
+        email_queue_lag), granularity (minute, hour, day; default hour) and
+        optional ISO since/until (default: the last 60 buckets).
+        """
+        metric = request.args.get('metric', 'submissions')
+        granularity = request.args.get('granularity', 'hour')
+        try:
+            since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+            until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        except ValueError:
+            return jsonify({'msg': 'since and until must be ISO 8601 datetimes'}), 400
+
+        try:
+            points = get_timeseries(metric, granularity, since, until)
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
 
         return jsonify({
-            'overview': {
-                'total_applications': total_applications,
-                'considered': considered_count,
-                'not_considered': not_considered_count,
-                'pending_review': pending_review_count,
-                'selected': selected_count,
-                'not_selected': not_selected_count
-            },
-            'educational': {
-                'govt_school_by_year': {
-                    '6_to_8': {'govt': govt_school_6_to_8, 'private': private_school_6_to_8},
-                    '9_to_10': {'govt': govt_school_9_to_10, 'private': private_school_9_to_10},
-                    '11_to_12': {'govt': govt_school_11_to_12, 'private': private_school_11_to_12}
-                },
-                'college_distribution': [{'name': c[0], 'count': c[1]} for c in college_distribution],
-                'degree_distribution': [{'name': d[0], 'count': d[1]} for d in degree_distribution],
-                'department_distribution': [{'name': d[0], 'count': d[1]} for d in department_distribution],
-                'year_distribution': [{'name': y[0], 'count': y[1]} for y in year_distribution],
-                'scholarship': {'received': scholarship_received, 'not_received': scholarship_not_received},
-                'medium': {'tamil': tamil_medium_count, 'english': english_medium_count},
-                'transport_distribution': [{'name': t[0], 'count': t[1]} for t in transport_distribution],
-                'vglug_applied_before': [{'name': v[0], 'count': v[1]} for v in vglug_applied_distribution]
-            },
-            'family': {
-                'family_environment': [{'name': f[0], 'count': f[1]} for f in family_env_distribution],
-                'single_parent': [{'name': s[0], 'count': s[1]} for s in single_parent_distribution],
-                'family_members': [{'name': str(f[0]), 'count': f[1]} for f in family_members_distribution],
-                'earning_members': [{'name': str(e[0]), 'count': e[1]} for e in earning_members_distribution]
-            },
-            'income': {
-                'income_distribution': income_distribution,
-                'house_ownership': [{'name': h[0], 'count': h[1]} for h in house_ownership_distribution],
-                'district_distribution': [{'name': d[0], 'count': d[1]} for d in district_distribution]
-            },
-            'basic': {
-                'gender': [{'name': g[0], 'count': g[1]} for g in gender_distribution],
-                'differently_abled': {'yes': differently_abled_count, 'no': not_differently_abled_count},
-                'laptop': {'has': has_laptop_count, 'no': no_laptop_count}
-            },
-            'course': {
-                'preferred_course': [{'name': c[0], 'count': c[1]} for c in course_distribution],
-                'heard_about_vglug': {'yes': heard_about_vglug, 'no': not_heard_about_vglug},
-                'participated_in_events': {'yes': participated_count, 'no': not_participated_count}
-            }
+            'metric': metric,
+            'granularity': granularity,
+            'points': points
         }), 200
 
     # ===== Widget Endpoints =====
@@ -1937,6 +1791,8 @@ def create_app():
             'config_json': w.config_json,
             'position': w.position,
             'width': w.width,
+            'materialize': w.materialize,
+            'refresh_interval': w.refresh_interval,
             'created_by': w.creator.email if w.creator else None,
             'created_at': w.created_at.isoformat() if w.created_at else None,
             'updated_at': w.updated_at.isoformat() if w.updated_at else None
@@ -1958,9 +1814,12 @@ def create_app():
                 return jsonify({'msg': f'{field} is required'}), 400
 
         # Validate widget_type
-        valid_types = ['pie', 'bar', 'line', 'number', 'table']
-        if data['widget_type'] not in valid_types:
-            return jsonify({'msg': f'Invalid widget_type. Must be one of: {valid_types}'}), 400
+        if data['widget_type'] not in WIDGET_TYPES:
+            return jsonify({'msg': f'Invalid widget_type. Must be one of: {WIDGET_TYPES}'}), 400
+
+        refresh_interval = data.get('refresh_interval')
+        if refresh_interval is not None and (not isinstance(refresh_interval, int) or refresh_interval < MIN_REFRESH_INTERVAL):
+            return jsonify({'msg': f'refresh_interval must be at least {MIN_REFRESH_INTERVAL} seconds'}), 400
 
         # Get max position
         max_pos = db.session.query(func.max(Widget.position)).filter_by(is_active=True).scalar() or 0
@@ -1972,6 +1831,8 @@ def create_app():
             config_json=data['config_json'],
             position=max_pos + 1,
             width=data.get('width', 'col-md-6'),
+            materialize=bool(data.get('materialize', False)),
+            refresh_interval=refresh_interval,
             created_by=user_id
         )
 
@@ -2001,6 +1862,8 @@ def create_app():
             'position': widget.position,
             'width': widget.width,
             'is_active': widget.is_active,
+            'materialize': widget.materialize,
+            'refresh_interval': widget.refresh_interval,
             'created_by': widget.creator.email if widget.creator else None,
             'created_at': widget.created_at.isoformat() if widget.created_at else None,
             'updated_at': widget.updated_at.isoformat() if widget.updated_at else None
@@ -2021,9 +1884,8 @@ def create_app():
         if 'description' in data:
             widget.description = data['description']
         if 'widget_type' in data:
-            valid_types = ['pie', 'bar', 'line', 'number', 'table']
-            if data['widget_type'] not in valid_types:
-                return jsonify({'msg': f'Invalid widget_type. Must be one of: {valid_types}'}), 400
+            if data['widget_type'] not in WIDGET_TYPES:
+                return jsonify({'msg': f'Invalid widget_type. Must be one of: {WIDGET_TYPES}'}), 400
             widget.widget_type = data['widget_type']
         if 'config_json' in data:
             widget.config_json = data['config_json']
@@ -2033,6 +1895,13 @@ def create_app():
             widget.width = data['width']
         if 'is_active' in data:
             widget.is_active = data['is_active']
+        if 'materialize' in data:
+            widget.materialize = bool(data['materialize'])
+        if 'refresh_interval' in data:
+            refresh_interval = data['refresh_interval']
+            if refresh_interval is not None and (not isinstance(refresh_interval, int) or refresh_interval < MIN_REFRESH_INTERVAL):
+                return jsonify({'msg': f'refresh_interval must be at least {MIN_REFRESH_INTERVAL} seconds'}), 400
+            widget.refresh_interval = refresh_interval
 
         db.session.commit()
 
@@ -2062,77 +1931,364 @@ def create_app():
             return jsonify({'msg': 'config_json is required'}), 400
 
         try:
-            result = execute_widget_query(config)
+            result = execute_widget_query_cached(config)
             return jsonify({
                 'data': result['data'],
                 'row_count': result['row_count']
             }), 200
+        except WidgetQueryError as e:
+            return jsonify(e.to_dict()), e.status
         except ValueError as e:
             return jsonify({'msg': str(e)}), 400
         except Exception as e:
             return jsonify({'msg': f'Query execution failed: {str(e)}'}), 500
 
+    @app.route('/admin/widgets/queries/<query_id>/cancel', methods=['POST'])
+    @admin_required
+    def cancel_widget_query_route(query_id):
+        """
+        Cancel a running widget query
+
+        query_id is the X-Widget-Query-Id header the query's request was sent
+        with; the query stops in whichever worker runs it.
+        """
+        try:
+            running_here = cancel_widget_query(query_id)
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+        return jsonify({'msg': 'Cancellation requested', 'query_id': query_id, 'running_here': running_here}), 202
+
+    @app.route('/admin/widgets/cache-stats', methods=['GET'])
+    @admin_required
+    def get_widget_cache_stats():
+        """
+        Widget result cache hits, misses and coalesced requests in this worker,
+        with the drill-down candidate page cache under 'candidates'
+        """
+        return jsonify({**widget_data_cache.stats(), 'candidates': widget_candidate_cache.stats()}), 200
+
+    @app.route('/admin/widgets/data', methods=['GET'])
+    @admin_required
+    def get_widgets_data():
+        """
+        Get data for several saved widgets in one request
+
+        Query params:
+        - ids: Comma-separated widget IDs (default: every active widget, by position)
+
+        Widgets run concurrently; each entry carries its own timing, and a
+        failing or missing widget reports its error without failing the rest.
+        Materialized widgets are served from their snapshot, with its freshness
+        under 'snapshot' (None for widgets computed live).
+        """
+        started = time.perf_counter()
+        ids_param = request.args.get('ids')
+        if ids_param:
+            try:
+                ids = list(dict.fromkeys(int(i) for i in ids_param.split(',') if i.strip()))
+            except ValueError:
+                return jsonify({'msg': 'ids must be a comma-separated list of widget IDs'}), 400
+            if len(ids) > MAX_BATCH_WIDGETS:
+                return jsonify({'msg': f'At most {MAX_BATCH_WIDGETS} widgets per request'}), 400
+            found = {w.id: w for w in Widget.query.filter(Widget.id.in_(ids)).all()}
+            widgets = [found.get(widget_id) for widget_id in ids]
+        else:
+            ids = None
+            widgets = Widget.query.filter_by(is_active=True).order_by(Widget.position).limit(MAX_BATCH_WIDGETS).all()
+
+        existing = [w for w in widgets if w is not None]
+        snapshots = load_widget_snapshots(existing)
+        version = shared_data_version() if snapshots else None
+        live = [w for w in existing if w.id not in snapshots]
+        outcomes = dict(zip((w.id for w in live), execute_widget_queries([w.config_json for w in live])))
+
+        items = []
+        for position, widget in enumerate(widgets):
+            if widget is None:
+                items.append({'widget_id': ids[position], 'msg': 'Widget not found', 'status': 404})
+                continue
+            snapshot = snapshots.get(widget.id)
+            outcome = {**snapshot.payload, 'elapsed_ms': 0.0} if snapshot else outcomes[widget.id]
+            if 'msg' in outcome:
+                items.append({'widget_id': widget.id, **outcome})
+            else:
+                items.append({
+                    'widget_id': widget.id,
+                    'title': widget.title,
+                    'widget_type': widget.widget_type,
+                    'data': outcome['data'],
+                    'row_count': outcome['row_count'],
+                    'chart_config': widget.config_json.get('chart_config', {}),
+                    'elapsed_ms': outcome['elapsed_ms'],
+                    'snapshot': snapshot_freshness(snapshot, version) if snapshot else None
+                })
+
+        return jsonify({
+            'widgets': items,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }), 200
+
     @app.route('/admin/widgets/<int:widget_id>/data', methods=['GET'])
     @admin_required
     def get_widget_data(widget_id):
-        """Get data for a specific saved widget"""
+        """
+        Get data for a specific saved widget
+
+        Materialized widgets are served from their snapshot, with its freshness
+        under 'snapshot' (None when the data was computed live).
+        """
         widget = Widget.query.get(widget_id)
         if not widget:
             return jsonify({'msg': 'Widget not found'}), 404
 
         try:
-            result = execute_widget_query(widget.config_json)
+            snapshot = load_widget_snapshots([widget]).get(widget.id)
+            result = snapshot.payload if snapshot else execute_widget_query_cached(widget.config_json)
             return jsonify({
                 'widget_id': widget.id,
                 'title': widget.title,
                 'widget_type': widget.widget_type,
                 'data': result['data'],
                 'row_count': result['row_count'],
-                'chart_config': widget.config_json.get('chart_config', {})
+                'chart_config': widget.config_json.get('chart_config', {}),
+                'snapshot': snapshot_freshness(snapshot, shared_data_version()) if snapshot else None
             }), 200
+        except WidgetQueryError as e:
+            return jsonify(e.to_dict()), e.status
         except ValueError as e:
             return jsonify({'msg': str(e)}), 400
         except Exception as e:
             return jsonify({'msg': f'Query execution failed: {str(e)}'}), 500
 
+    @app.route('/admin/widgets/<int:widget_id>/profile', methods=['GET'])
+    @admin_required
+    def get_widget_profile(widget_id):
+        """
+        Recent executions of a widget's query (SQL, timings, rows, errors) and
+        their summary, from the widget profile buffer
+
+        Query params:
+        - limit: Most executions returned (default 20)
+        """
+        widget = Widget.query.get(widget_id)
+        if not widget:
+            return jsonify({'msg': 'Widget not found'}), 404
+
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), 500)
+            config_hash = widget_config_hash(widget.config_json)
+        except (TypeError, AttributeError, ValueError) as e:
+            return jsonify({'msg': str(e)}), 400
+
+        executions = recent_executions(config_hash)
+        return jsonify({
+            'widget_id': widget.id,
+            'title': widget.title,
+            'config_hash': config_hash,
+            'summary': summarize_executions(executions).get(config_hash),
+            'executions': executions[:limit]
+        }), 200
+
+    @app.route('/admin/widgets/<int:widget_id>/profile', methods=['POST'])
+    @admin_required
+    def capture_widget_profile(widget_id):
+        """
+        Run a widget's query in SQL now and capture its EXPLAIN output
+        (EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL); bypasses the result cache
+        """
+        widget = Widget.query.get(widget_id)
+        if not widget:
+            return jsonify({'msg': 'Widget not found'}), 404
+
+        try:
+            profile = profile_widget_query(widget.config_json)
+            return jsonify({'widget_id': widget.id, 'title': widget.title, 'profile': profile}), 200
+        except WidgetQueryError as e:
+            return jsonify(e.to_dict()), e.status
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+
+    @app.route('/admin/widgets/slowest', methods=['GET'])
+    @admin_required
+    def get_slowest_widgets():
+        """
+        Widgets ranked by the query time they used in the recent executions
+        of the widget profile buffer
+
+        Query params:
+        - limit: Number of widgets (default 10)
+        - sort: total (default), avg, p95 or max
+
+        Configs matching no active widget (previews, edited widgets) are
+        listed with widget_id None.
+        """
+        sort = request.args.get('sort', 'total')
+        if sort not in ('total', 'avg', 'p95', 'max'):
+            return jsonify({'msg': 'sort must be total, avg, p95 or max'}), 400
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+        except ValueError:
+            return jsonify({'msg': 'limit must be an integer'}), 400
+
+        widgets_by_hash = {}
+        for widget in Widget.query.filter_by(is_active=True).all():
+            try:
+                widgets_by_hash.setdefault(widget_config_hash(widget.config_json), widget)
+            except (TypeError, AttributeError, ValueError):
+                continue
+
+        executions = recent_executions()
+        ranked = sorted(summarize_executions(executions).items(),
+                        key=lambda item: item[1][f'{sort}_ms'], reverse=True)[:limit]
+        return jsonify({
+            'executions_recorded': len(executions),
+            'widgets': [{
+                'widget_id': widgets_by_hash[config_hash].id if config_hash in widgets_by_hash else None,
+                'title': widgets_by_hash[config_hash].title if config_hash in widgets_by_hash else None,
+                'config_hash': config_hash,
+                **stats
+            } for config_hash, stats in ranked]
+        }), 200
+
+    @app.route('/admin/widgets/<int:widget_id>/snapshot', methods=['POST'])
+    @admin_required
+    def refresh_widget_snapshot_now(widget_id):
+        """
+        Recompute a materialized widget's snapshot without waiting for its interval
+
+        Queued to Celery; computed in the request if Celery is unavailable.
+        """
+        widget = Widget.query.get(widget_id)
+        if not widget:
+            return jsonify({'msg': 'Widget not found'}), 404
+        if not widget.materialize:
+            return jsonify({'msg': 'Widget is not materialized'}), 400
+
+        try:
+            from tasks import refresh_widget_snapshot_task
+            refresh_widget_snapshot_task.delay(widget.id)
+            return jsonify({'msg': 'Snapshot refresh queued', 'widget_id': widget.id}), 202
+        except Exception as celery_error:
+            app.logger.warning(f"Celery not available, refreshing snapshot directly: {str(celery_error)}")
+
+        try:
+            version = shared_data_version()
+            snapshot = refresh_widget_snapshot(widget, WidgetSnapshot.query.get(widget.id), version)
+            return jsonify({
+                'msg': 'Snapshot refreshed',
+                'widget_id': widget.id,
+                'snapshot': snapshot_freshness(snapshot, version)
+            }), 200
+        except WidgetQueryError as e:
+            db.session.rollback()
+            return jsonify(e.to_dict()), e.status
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'msg': str(e)}), 400
+
     @app.route('/admin/widgets/reorder', methods=['PUT'])
     @admin_required
     def reorder_widgets():
-        """Reorder widgets by updating their positions"""
+        """
+        Reorder widgets by updating their positions
+
+        Body: {"positions": [{"id", "position"}]}. All positions are set with
+        one UPDATE; results report each entry (404 for unknown widgets).
+        """
         data = request.get_json() or {}
         positions = data.get('positions', [])  # List of {id, position}
 
-        if not positions:
+        if not positions or not isinstance(positions, list):
             return jsonify({'msg': 'positions array is required'}), 400
+        if len(positions) > MAX_BULK_WIDGETS:
+            return jsonify({'msg': f'At most {MAX_BULK_WIDGETS} widgets per request'}), 400
 
-        for item in positions:
-            widget_id = item.get('id')
-            position = item.get('position')
-            if widget_id and position is not None:
-                widget = Widget.query.get(widget_id)
-                if widget:
-                    widget.position = position
+        results = reorder_widget_positions(positions)
 
-        db.session.commit()
+        return jsonify({'msg': 'Widgets reordered successfully', 'results': results}), 200
 
-        return jsonify({'msg': 'Widgets reordered successfully'}), 200
+    @app.route('/admin/widgets/bulk', methods=['POST'])
+    @admin_required
+    def save_widgets_bulk():
+        """
+        Create and update several widgets in one transaction
+
+        Body: {"widgets": [...]} with the fields of POST /admin/widgets; items
+        with an "id" update that widget. Every item, config included, is
+        validated first and nothing is saved unless all of them are valid.
+        Results list each item's status (201 created, 200 updated, 400/404).
+        """
+        data = request.get_json() or {}
+        items = data.get('widgets')
+
+        if not items or not isinstance(items, list):
+            return jsonify({'msg': 'widgets array is required'}), 400
+        if len(items) > MAX_BULK_WIDGETS:
+            return jsonify({'msg': f'At most {MAX_BULK_WIDGETS} widgets per request'}), 400
+
+        results, saved = save_widgets(items, int(get_jwt_identity()))
+        if not saved:
+            failed = sum(1 for result in results if result['status'] >= 400)
+            return jsonify({'msg': f'No widgets were saved: {failed} invalid', 'results': results}), 400
+
+        return jsonify({'msg': 'Widgets saved successfully', 'results': results}), 200
 
     @app.route('/admin/widgets/<int:widget_id>/candidates', methods=['GET'])
     @admin_required
     def get_widget_candidates(widget_id):
-        """Get candidate IDs matching the widget's query conditions"""
+        """
+        Get candidate IDs matching the widget's query conditions
+
+        Query params:
+        - cursor: next_cursor of the previous page (IDs come in candidate_id order)
+        - per_page: Page size (default 1000, max 5000)
+        - stream=true: Every matching ID as a streamed CSV instead of one page
+        - segment=true: Save every match server-side and return only the
+          segment id, for use as segment_id in other endpoints
+
+        Pages report the exact number of matches as count.
+        """
         widget = Widget.query.get(widget_id)
         if not widget:
             return jsonify({'msg': 'Widget not found'}), 404
 
         try:
-            candidate_ids = get_widget_candidate_ids(widget.config_json)
+            config = widget.config_json
+            stmt = build_widget_candidate_query(config)
+
+            if request.args.get('segment') == 'true':
+                segment = save_widget_candidate_segment(
+                    config, stmt,
+                    source='widget',
+                    description=widget.title,
+                    created_by=int(get_jwt_identity())
+                )
+                return jsonify({
+                    'widget_id': widget.id,
+                    'widget_title': widget.title,
+                    **serialize_segment(segment)
+                }), 201
+
+            if request.args.get('stream') == 'true':
+                return Response(
+                    stream_with_context(iter_widget_candidate_csv(config, stmt)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename=widget_{widget.id}_candidates.csv'}
+                )
+
+            per_page = min(max(int(request.args.get('per_page', WIDGET_CANDIDATE_PAGE_SIZE)), 1),
+                           MAX_WIDGET_CANDIDATE_PAGE_SIZE)
+            page = page_widget_candidate_ids(config, stmt, request.args.get('cursor'), per_page)
             return jsonify({
                 'widget_id': widget.id,
                 'widget_title': widget.title,
-                'candidate_ids': candidate_ids,
-                'count': len(candidate_ids)
+                'candidate_ids': page['items'],
+                'count': page['count'],
+                'next_cursor': page['next_cursor'],
+                'has_more': page['has_more']
             }), 200
+        except WidgetQueryError as e:
+            return jsonify(e.to_dict()), e.status
         except ValueError as e:
             return jsonify({'msg': str(e)}), 400
         except Exception as e:
@@ -2141,7 +2297,14 @@ def create_app():
     @app.route('/admin/widgets/<int:widget_id>/segment-candidates', methods=['POST'])
     @admin_required
     def get_widget_segment_candidates(widget_id):
-        """Get candidate IDs matching the widget's query conditions plus a segment filter"""
+        """
+        Get candidate IDs matching the widget's query conditions plus a segment filter
+
+        Body: {"segment_field", "segment_value"} plus "cursor" / "per_page" for
+        paging as in GET /admin/widgets/<id>/candidates. With "stream": true
+        every matching ID is streamed as CSV; with "segment": true the matches
+        are saved server-side and only the segment id is returned.
+        """
         widget = Widget.query.get(widget_id)
         if not widget:
             return jsonify({'msg': 'Widget not found'}), 404
@@ -2154,20 +2317,47 @@ def create_app():
             return jsonify({'msg': 'segment_field is required'}), 400
 
         try:
-            candidate_ids = get_widget_segment_candidate_ids(
-                widget.config_json,
-                segment_field,
-                segment_value
-            )
+            config = widget.config_json
+            stmt = build_widget_segment_candidate_query(config, segment_field, segment_value)
+
+            if data.get('segment'):
+                segment = save_widget_candidate_segment(
+                    config, stmt,
+                    source='widget_segment',
+                    description=f'{widget.title} - {segment_field}: {segment_value}',
+                    created_by=int(get_jwt_identity())
+                )
+                return jsonify({
+                    'widget_id': widget.id,
+                    'widget_title': widget.title,
+                    'segment_field': segment_field,
+                    'segment_value': segment_value,
+                    **serialize_segment(segment)
+                }), 201
+
+            if data.get('stream'):
+                return Response(
+                    stream_with_context(iter_widget_candidate_csv(config, stmt)),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename=widget_{widget.id}_segment_candidates.csv'}
+                )
+
+            per_page = min(max(int(data.get('per_page', WIDGET_CANDIDATE_PAGE_SIZE)), 1),
+                           MAX_WIDGET_CANDIDATE_PAGE_SIZE)
+            page = page_widget_candidate_ids(config, stmt, data.get('cursor'), per_page)
             return jsonify({
                 'widget_id': widget.id,
                 'widget_title': widget.title,
                 'segment_field': segment_field,
                 'segment_value': segment_value,
-                'candidate_ids': candidate_ids,
-                'count': len(candidate_ids)
+                'candidate_ids': page['items'],
+                'count': page['count'],
+                'next_cursor': page['next_cursor'],
+                'has_more': page['has_more']
             }), 200
-        except ValueError as e:
+        except WidgetQueryError as e:
+            return jsonify(e.to_dict()), e.status
+        except (TypeError, ValueError) as e:
             return jsonify({'msg': str(e)}), 400
         except Exception as e:
             return jsonify({'msg': f'Failed to get segment candidate IDs: {str(e)}'}), 500
@@ -2175,253 +2365,113 @@ def create_app():
     @app.route('/admin/dashboard-filter-candidates', methods=['POST'])
     @admin_required
     def get_dashboard_filter_candidates():
-        """Get candidate IDs based on dashboard widget filter criteria"""
-        from sqlalchemy import func
-
+        """
+        Get candidate IDs based on dashboard widget filter criteria
+
+        Body: {"filter_type", "filter_value"}, or {"filters": [...], "match": "all"|"any"}
+        where items are filters or nested groups and any of them may be negated.
+        IDs are returned a page at a time ("per_page", "cursor"); with
+        "segment": true the matches are saved server-side and only the segment
+        id is returned, and "count_only": true returns just the count. Answers
+        come from the in-memory facet index when it is current, otherwise from
+        SQL, and are cached per filter set until the data changes.
+        """
         data = request.get_json() or {}
-        filter_type = data.get('filter_type')
-        filter_value = data.get('filter_value')
 
-        if not filter_type:
-            return jsonify({'msg': 'filter_type is required'}), 400
+        try:
+            expression = normalize_filters(data)
+            query, candidate_column = build_filter_candidate_query(expression)
+            per_page = min(max(int(data.get('per_page', FILTER_PAGE_SIZE)), 1), MAX_FILTER_PAGE_SIZE)
+        except (TypeError, ValueError) as e:
+            return jsonify({'msg': str(e)}), 400
+
+        cache_key = filter_cache_key(expression)
+        response = {'description': describe_filters(expression)}
+        leaves = list(iter_filter_leaves(expression))
+        if len(leaves) == 1 and not leaves[0]['negate'] and not expression['negate']:
+            response['filter_type'] = leaves[0]['filter_type']
+            response['filter_value'] = leaves[0]['filter_value']
 
         try:
-            candidate_ids = []
-
-            # Review status filters (from BasicInfo)
-            if filter_type == 'review_status':
-                if filter_value == 'Considered':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.considered == True).all()
-                elif filter_value == 'Not Considered':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.considered == False).all()
-                elif filter_value == 'Pending':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.considered == None).all()
-                else:
-                    return jsonify({'msg': f'Unknown filter_value for review_status: {filter_value}'}), 400
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Selection status filters
-            elif filter_type == 'selection_status':
-                if filter_value == 'Selected':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.selected == True).all()
-                elif filter_value == 'Not Selected':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.selected == False).all()
-                else:
-                    return jsonify({'msg': f'Unknown filter_value for selection_status: {filter_value}'}), 400
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Gender filter
-            elif filter_type == 'gender':
-                candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.gender == filter_value).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Laptop availability filter
-            elif filter_type == 'laptop':
-                if filter_value == 'Has Laptop':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.has_laptop == True).all()
-                elif filter_value == 'No Laptop':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.has_laptop == False).all()
-                else:
-                    return jsonify({'msg': f'Unknown filter_value for laptop: {filter_value}'}), 400
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Differently abled filter
-            elif filter_type == 'differently_abled':
-                if filter_value == 'Yes':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.differently_abled == True).all()
-                elif filter_value == 'No':
-                    candidates = db.session.query(BasicInfo.candidate_id).filter(BasicInfo.differently_abled == False).all()
-                else:
-                    return jsonify({'msg': f'Unknown filter_value for differently_abled: {filter_value}'}), 400
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Preferred course filter
-            elif filter_type == 'preferred_course':
-                candidates = db.session.query(CourseInfo.candidate_id).filter(CourseInfo.preferred_course == filter_value).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Government school filters
-            elif filter_type == 'govt_school_6_to_8':
-                is_govt = filter_value == 'Government'
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.six_to_8_govt_school == is_govt
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            elif filter_type == 'govt_school_9_to_10':
-                is_govt = filter_value == 'Government'
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.nine_to_10_govt_school == is_govt
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            elif filter_type == 'govt_school_11_to_12':
-                is_govt = filter_value == 'Government'
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.eleven_to_12_govt_school == is_govt
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # College filter
-            elif filter_type == 'college':
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.college_name == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Degree filter
-            elif filter_type == 'degree':
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.degree == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Department filter
-            elif filter_type == 'department':
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.department == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Year filter
-            elif filter_type == 'year':
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.year == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Scholarship filter
-            elif filter_type == 'scholarship':
-                if filter_value == 'Received':
-                    candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                        EducationalInfo.received_scholarship == True
-                    ).all()
-                elif filter_value == 'Not Received':
-                    candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                        EducationalInfo.received_scholarship == False
-                    ).all()
-                else:
-                    return jsonify({'msg': f'Unknown filter_value for scholarship: {filter_value}'}), 400
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Medium filter
-            elif filter_type == 'medium':
-                if filter_value == 'Tamil Medium':
-                    candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                        EducationalInfo.tamil_medium == True
-                    ).all()
-                elif filter_value == 'English Medium':
-                    candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                        EducationalInfo.tamil_medium == False
-                    ).all()
+            if data.get('count_only'):
+                count = facet_index.count(expression)
+                if count is None:
+                    count = dashboard_filter_cache.get_or_compute(
+                        f'count:{cache_key}', lambda: query.order_by(None).count())
+                return jsonify({**response, 'count': count}), 200
+
+            if data.get('segment'):
+                def compute_segment():
+                    candidate_ids = facet_index.candidate_ids(expression)
+                    if candidate_ids is not None:
+                        segment = create_segment_from_ids(candidate_ids, source='dashboard_filter',
+                                                          description=response['description'],
+                                                          created_by=int(get_jwt_identity()))
+                    else:
+                        segment = create_segment_from_query(query, source='dashboard_filter',
+                                                            description=response['description'],
+                                                            created_by=int(get_jwt_identity()))
+                    return serialize_segment(segment)
+
+                # The same filter set reuses its segment while the data is unchanged
+                segment = dashboard_filter_cache.get_or_compute(f'segment:{cache_key}', compute_segment)
+                return jsonify({**response, **segment}), 201
+
+            cursor = data.get('cursor')
+
+            def compute_page():
+                candidate_ids = facet_index.candidate_ids(expression)
+                if candidate_ids is not None:
+                    page = page_candidate_ids(candidate_ids, cursor, per_page)
+                    count = len(candidate_ids)
                 else:
-                    return jsonify({'msg': f'Unknown filter_value for medium: {filter_value}'}), 400
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Transport filter
-            elif filter_type == 'transport':
-                candidates = db.session.query(EducationalInfo.candidate_id).filter(
-                    EducationalInfo.transport_mode == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Family environment filter
-            elif filter_type == 'family_environment':
-                candidates = db.session.query(FamilyInfo.candidate_id).filter(
-                    FamilyInfo.family_environment == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Single parent filter
-            elif filter_type == 'single_parent':
-                candidates = db.session.query(FamilyInfo.candidate_id).filter(
-                    FamilyInfo.single_parent_info == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # Family members filter
-            elif filter_type == 'family_members':
-                try:
-                    count = int(filter_value)
-                    candidates = db.session.query(FamilyInfo.candidate_id).filter(
-                        FamilyInfo.family_members_count == count
-                    ).all()
-                    candidate_ids = [c[0] for c in candidates if c[0]]
-                except ValueError:
-                    return jsonify({'msg': f'Invalid filter_value for family_members: {filter_value}'}), 400
-
-            # Earning members filter
-            elif filter_type == 'earning_members':
-                try:
-                    count = int(filter_value)
-                    candidates = db.session.query(FamilyInfo.candidate_id).filter(
-                        FamilyInfo.earning_members_count == count
-                    ).all()
-                    candidate_ids = [c[0] for c in candidates if c[0]]
-                except ValueError:
-                    return jsonify({'msg': f'Invalid filter_value for earning_members: {filter_value}'}), 400
-
-            # Income range filter
-            elif filter_type == 'income_range':
-                # Get all income records and filter by range
-                all_incomes = db.session.query(
-                    IncomeInfo.candidate_id,
-                    IncomeInfo.total_family_income
-                ).filter(
-                    IncomeInfo.total_family_income != None,
-                    IncomeInfo.total_family_income != ''
-                ).all()
-
-                for candidate_id, income_str in all_incomes:
-                    if not candidate_id:
-                        continue
-                    try:
-                        income_clean = ''.join(c for c in str(income_str) if c.isdigit())
-                        if income_clean:
-                            income_val = int(income_clean)
-                            matches = False
-                            if filter_value == '< 50,000' and income_val < 50000:
-                                matches = True
-                            elif filter_value == '50,000 - 1,00,000' and 50000 <= income_val < 100000:
-                                matches = True
-                            elif filter_value == '1,00,000 - 2,50,000' and 100000 <= income_val < 250000:
-                                matches = True
-                            elif filter_value == '2,50,000 - 4,00,000' and 250000 <= income_val < 400000:
-                                matches = True
-                            elif filter_value == '> 4,00,000' and income_val >= 400000:
-                                matches = True
-                            if matches:
-                                candidate_ids.append(candidate_id)
-                    except (ValueError, TypeError):
-                        continue
-
-            # House ownership filter
-            elif filter_type == 'house_ownership':
-                candidates = db.session.query(IncomeInfo.candidate_id).filter(
-                    IncomeInfo.house_ownership == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            # District filter
-            elif filter_type == 'district':
-                candidates = db.session.query(IncomeInfo.candidate_id).filter(
-                    IncomeInfo.district == filter_value
-                ).all()
-                candidate_ids = [c[0] for c in candidates if c[0]]
-
-            else:
-                return jsonify({'msg': f'Unknown filter_type: {filter_type}'}), 400
+                    page = keyset_paginate(query, candidate_column, candidate_column, 'candidate_id',
+                                           direction='asc', cursor=cursor, per_page=per_page)
+                    count = query.order_by(None).count()
+                return {
+                    'candidate_ids': page['items'],
+                    'count': count,
+                    'next_cursor': page['next_cursor'],
+                    'has_more': page['has_more']
+                }
 
-            return jsonify({
-                'filter_type': filter_type,
-                'filter_value': filter_value,
-                'candidate_ids': candidate_ids,
-                'count': len(candidate_ids)
-            }), 200
+            page = dashboard_filter_cache.get_or_compute(f'ids:{cache_key}:{per_page}:{cursor or ""}', compute_page)
+            return jsonify({**response, **page}), 200
 
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
         except Exception as e:
             return jsonify({'msg': f'Failed to get candidate IDs: {str(e)}'}), 500
 
+    # ===== Saved Segment Endpoints =====
+
+    @app.route('/admin/segments', methods=['POST'])
+    @can_view_applications
+    def create_segment():
+        """Save an explicit list of candidate IDs as a segment"""
+        data = request.get_json() or {}
+        candidate_ids = data.get('candidate_ids', [])
+
+        if not candidate_ids or not isinstance(candidate_ids, list):
+            return jsonify({'msg': 'candidate_ids array is required'}), 400
+
+        segment = create_segment_from_ids(
+            candidate_ids,
+            description=data.get('description'),
+            created_by=int(get_jwt_identity())
+        )
+        return jsonify(serialize_segment(segment)), 201
+
+    @app.route('/admin/segments/<segment_id>', methods=['GET'])
+    @can_view_applications
+    def get_segment_info(segment_id):
+        """Get metadata (size, source, expiry) of a saved segment"""
+        try:
+            segment = get_segment(segment_id)
+        except SegmentNotFound as e:
+            return jsonify({'msg': str(e)}), 404
+        return jsonify(serialize_segment(segment)), 200
+
     # ===== Widget Agent Endpoints =====
 
     @app.route('/admin/widgets/agent/generate', methods=['POST'])
@@ -2456,7 +2506,7 @@ def create_app():
 
             # Also preview the data with the generated config
             try:
-                preview_result = execute_widget_query(result['config']['config_json'])
+                preview_result = execute_widget_query_cached(result['config']['config_json'])
                 result['preview_data'] = preview_result.get('data', [])[:10]  # Limit preview to 10 rows
                 result['preview_row_count'] = preview_result.get('row_count', 0)
             except Exception as e:
@@ -2501,7 +2551,7 @@ def create_app():
 
             # Also preview the data with the refined config
             try:
-                preview_result = execute_widget_query(result['config']['config_json'])
+                preview_result = execute_widget_query_cached(result['config']['config_json'])
                 result['preview_data'] = preview_result.get('data', [])[:10]
                 result['preview_row_count'] = preview_result.get('row_count', 0)
             except Exception as e:
@@ -2523,12 +2573,19 @@ def create_app():
 
         try:
             # Validate and execute the query
-            preview_result = execute_widget_query(config_json)
+            preview_result = execute_widget_query_cached(config_json)
             return jsonify({
                 'success': True,
                 'data': preview_result.get('data', [])[:100],  # Limit to 100 rows for preview
                 'row_count': preview_result.get('row_count', 0)
             }), 200
+        except WidgetQueryError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'error_code': e.code,
+                'expensive': e.expensive
+            }), e.status
         except ValueError as e:
             return jsonify({
                 'success': False,
@@ -2772,9 +2829,17 @@ def create_app():
 
         data = request.get_json() or {}
         candidate_ids = data.get('candidate_ids', [])
+        segment_id = data.get('segment_id')
+
+        if segment_id:
+            try:
+                get_segment(segment_id)
+            except SegmentNotFound as e:
+                return jsonify({'msg': str(e)}), 404
+            candidate_ids = [row[0] for row in db.session.execute(segment_candidates(segment_id))]
 
         # If no specific IDs provided, get all candidates without email verification
-        if not candidate_ids:
+        elif not candidate_ids:
             filter_type = data.get('filter', 'not_sent')  # not_sent, failed, all
 
             query = BasicInfo.query.filter(BasicInfo.email.isnot(None), BasicInfo.email != '')
@@ -2852,10 +2917,12 @@ def create_app():
     @app.route('/admin/email/candidates', methods=['GET'])
     @admin_required
     def get_email_candidates():
-        """Get list of candidates with email status"""
+        """Get list of candidates with email status (keyset paginated, see get_applications)"""
         status = request.args.get('status', 'all')  # all, verified, failed, not_sent
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = max(request.args.get('per_page', 20, type=int), 1)
+        cursor = request.args.get('cursor', '').strip()
+        include_total = request.args.get('include_total', '').strip() == 'true'
 
         query = BasicInfo.query.filter(BasicInfo.email.isnot(None), BasicInfo.email != '')
 
@@ -2866,12 +2933,25 @@ def create_app():
         elif status == 'not_sent':
             query = query.filter(BasicInfo.email_verified.is_(None))
 
-        query = query.order_by(BasicInfo.email_sent_at.desc().nullsfirst())
+        try:
+            result = keyset_paginate(
+                query,
+                BasicInfo.email_sent_at,
+                BasicInfo.candidate_id,
+                sort_key='email_sent_at',
+                direction='desc',
+                cursor=cursor or None,
+                per_page=per_page,
+                nulls_first=True,
+                offset=(page - 1) * per_page if page > 1 else None
+            )
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
 
-        paginated = query.paginate(page=page, per_page=per_page, error_out=False)
+        total, total_is_exact = count_total(query, exact=include_total)
 
         candidates = []
-        for basic in paginated.items:
+        for basic in result['items']:
             candidates.append({
                 'candidate_id': basic.candidate_id,
                 'full_name': basic.full_name,
@@ -2885,10 +2965,30 @@ def create_app():
         return jsonify({
             'candidates': candidates,
             'page': page,
-            'pages': paginated.pages,
-            'total': paginated.total
+            'pages': (total + per_page - 1) // per_page,
+            'total': total,
+            'total_is_exact': total_is_exact,
+            'next_cursor': result['next_cursor'],
+            'prev_cursor': result['prev_cursor'],
+            'has_more': result['has_more']
         }), 200
 
+    # ===== CLI Commands =====
+
+    @app.cli.command('rebuild-dashboard-counters')
+    def rebuild_dashboard_counters_command():
+        """Recompute the dashboard_counter rollup from the info tables"""
+        buckets = rebuild_dashboard_counters()
+        print(f"✓ Rebuilt dashboard counters ({buckets} buckets)")
+
+    @app.cli.command('refresh-metric-rollups')
+    @click.option('--days', default=0, type=int, help='Recount this many days of history (backfill)')
+    def refresh_metric_rollups_command(days):
+        """Recompute the metric_rollup time-series buckets"""
+        since = datetime.utcnow() - timedelta(days=days) if days else None
+        buckets = refresh_metric_rollups(since=since)
+        print(f"✓ Refreshed metric rollups ({buckets} buckets)")
+
     return app
 
 
@@ -0,0 +1,176 @@
+"""
+Streaming export of applications across all five info tables
+
+Rows are read through a server-side cursor (yield_per) and written out as they
+arrive, so memory stays flat regardless of how many applications match. CSV is
+streamed straight to the client; XLSX is written with XlsxWriter's
+constant_memory mode to a temporary file which is then streamed and removed.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime, date
+
+from models import Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo
+from pagination import order_clauses
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+# Bytes buffered before a CSV chunk is handed to the client
+CSV_CHUNK_SIZE = 64 * 1024
+
+# Sections in export order, keyed by the name used in the application detail payload
+EXPORT_SECTIONS = [
+    ('basic_info', BasicInfo),
+    ('educational_info', EducationalInfo),
+    ('family_info', FamilyInfo),
+    ('income_info', IncomeInfo),
+    ('course_info', CourseInfo),
+]
+
+# Internal columns that are never exported
+EXPORT_SKIP_COLUMNS = {'id', 'candidate_id', 'application_id', 'updated_at'}
+
+
+def _build_export_columns():
+    columns = {
+        'candidate_id': Application.candidate_id,
+        'uuid': Application.uuid,
+        'status': Application.status,
+        'created_at': Application.created_at,
+        'updated_at': Application.updated_at,
+    }
+    for section, model in EXPORT_SECTIONS:
+        for column in model.__table__.columns:
+            if column.name not in EXPORT_SKIP_COLUMNS:
+                columns[f'{section}.{column.name}'] = getattr(model, column.key)
+    return columns
+
+
+# Exportable columns keyed by their header name ('section.field' for info tables)
+EXPORT_COLUMNS = _build_export_columns()
+
+
+def resolve_export_columns(columns_param):
+    """
+    Parse the comma-separated `columns` parameter of the export
+
+    Accepts column names from EXPORT_COLUMNS or a bare section name
+    (e.g. 'income_info') for all of its columns. candidate_id is always
+    exported first. Unknown names raise ValueError.
+
+    Returns: list of column names in EXPORT_COLUMNS order
+    """
+    if not columns_param:
+        return list(EXPORT_COLUMNS)
+
+    requested = set()
+    unknown = []
+    sections = {section for section, _ in EXPORT_SECTIONS}
+    for name in (c.strip() for c in columns_param.split(',')):
+        if not name:
+            continue
+        if name in EXPORT_COLUMNS:
+            requested.add(name)
+        elif name in sections:
+            requested.update(c for c in EXPORT_COLUMNS if c.startswith(name + '.'))
+        else:
+            unknown.append(name)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    requested.add('candidate_id')
+    return [name for name in EXPORT_COLUMNS if name in requested]
+
+
+def build_export_query(query, columns, sort_column, direction='desc'):
+    """
+    Project a filtered application query onto the export columns
+
+    Args:
+        query: Filtered Application query already joined to BasicInfo
+        columns: Column names from resolve_export_columns
+        sort_column: Column to order by (candidate_id breaks ties)
+        direction: 'asc' or 'desc'
+
+    Returns: Query yielding one tuple per application, streamed in batches
+    """
+    # Only join the info tables whose columns were asked for
+    for section, model in EXPORT_SECTIONS:
+        if model is BasicInfo:
+            continue
+        if any(name.startswith(section + '.') for name in columns):
+            query = query.outerjoin(model, model.candidate_id == Application.candidate_id)
+
+    return query.with_entities(*[EXPORT_COLUMNS[name] for name in columns])\
+        .order_by(*order_clauses(sort_column, Application.candidate_id, direction))\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def _cell(value):
+    """Convert a column value to a plain CSV/XLSX cell value"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(query, columns):
+    """Yield the export as CSV text chunks, reading rows lazily from query"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for row in query:
+        writer.writerow([_cell(value) for value in row])
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def write_xlsx(query, columns):
+    """
+    Write the export to a temporary XLSX file in constant memory
+
+    Raises ImportError if XlsxWriter is not installed.
+
+    Returns: path of the temporary file (caller removes it)
+    """
+    import xlsxwriter
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx', prefix='applications_')
+    os.close(fd)
+    try:
+        # constant_memory flushes each row to disk as soon as the next one starts
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+        worksheet = workbook.add_worksheet('Applications')
+        bold = workbook.add_format({'bold': True})
+        worksheet.write_row(0, 0, columns, bold)
+
+        for row_num, row in enumerate(query, start=1):
+            worksheet.write_row(row_num, 0, [_cell(value) for value in row])
+
+        workbook.close()
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_file(path, chunk_size=CSV_CHUNK_SIZE):
+    """Yield a file in chunks and delete it once fully sent (or abandoned)"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
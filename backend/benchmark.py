@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for admin dashboard queries
+
+Seeds a scratch database with synthetic applicants and times admin endpoints,
+reporting the number of SQL statements and the latency of each call.
+
+NEVER point this at a real database: the target is wiped and reseeded for
+every size.
+
+Usage:
+    python benchmark.py dashboard-stats --sizes 10000,50000,200000
+    python benchmark.py dashboard-stats --database-url postgresql://.../vglug_bench
+    python benchmark.py facets --sizes 10000,200000
+    python benchmark.py widget-engine --sizes 10000,200000
+    python benchmark.py widget-render --sizes 10000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, date, timedelta
+
+# Rows per INSERT batch while seeding
+SEED_BATCH_SIZE = 5000
+
+COLLEGES = [f'College {i}' for i in range(40)]
+DEGREES = ['B.E', 'B.Tech', 'B.Sc', 'B.Com', 'BCA', 'B.A', 'Diploma']
+DEPARTMENTS = ['CSE', 'ECE', 'EEE', 'Mech', 'Civil', 'IT', 'Maths', 'Physics', 'Commerce', 'English', 'Chemistry']
+YEARS = ['1st Year', '2nd Year', '3rd Year', '4th Year', 'Completed']
+TRANSPORT = ['Bus', 'Bike', 'Cycle', 'Walk', 'Train']
+FAMILY_ENV = ['Joint', 'Nuclear']
+SINGLE_PARENT = [None, None, None, 'Mother only', 'Father only', 'Guardian']
+INCOMES = ['', None, '25000', '30,000', 'Rs. 75000', '1,20,000', '2,00,000', '300000', '5 lakh', '500000', '45000']
+HOUSE = ['Own', 'Rent', 'Lease', 'Government']
+DISTRICTS = [f'District {i}' for i in range(30)]
+COURSES = ['Python', 'Web Development', 'Linux', 'Data Science', 'Networking', 'Hardware']
+
+
+def seed_applicants(db, count, rnd):
+    """Insert count synthetic applicants with all five info sections"""
+    from models import Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo, parse_income_amount
+
+    start = datetime(2025, 1, 1)
+    for offset in range(0, count, SEED_BATCH_SIZE):
+        batch = range(offset, min(offset + SEED_BATCH_SIZE, count))
+        apps, basic, edu, family, income, course = [], [], [], [], [], []
+        for i in batch:
+            cid = f'BEN{i:08d}'
+            apps.append({
+                'uuid': str(uuid.uuid4()), 'candidate_id': cid, 'status': 'submitted',
+                'created_at': start + timedelta(minutes=i), 'updated_at': start + timedelta(minutes=i)
+            })
+            considered = rnd.choice([None, None, True, False])
+            basic.append({
+                'candidate_id': cid, 'full_name': f'Applicant {i}',
+                'dob': date(2000, 1, 1) + timedelta(days=rnd.randint(0, 2500)),
+                'gender': rnd.choice(['Male', 'Female', 'Other']), 'email': f'applicant{i}@example.org',
+                'differently_abled': rnd.random() < 0.05, 'contact': f'9{i:09d}',
+                'contact_as_whatsapp': True, 'has_laptop': rnd.random() < 0.4,
+                'considered': considered, 'selected': rnd.choice([None, True, False]) if considered else None,
+                'shortlisted': rnd.random() < 0.2, 'appeared_for_one_to_one': rnd.random() < 0.3
+            })
+            edu.append({
+                'candidate_id': cid, 'college_name': rnd.choice(COLLEGES), 'degree': rnd.choice(DEGREES),
+                'department': rnd.choice(DEPARTMENTS), 'year': rnd.choice(YEARS),
+                'tamil_medium': rnd.random() < 0.5,
+                'six_to_8_govt_school': rnd.random() < 0.6, 'six_to_8_school_name': 'School',
+                'nine_to_10_govt_school': rnd.random() < 0.55, 'nine_to_10_school_name': 'School',
+                'eleven_to_12_govt_school': rnd.random() < 0.5, 'eleven_to_12_school_name': 'School',
+                'received_scholarship': rnd.random() < 0.3, 'transport_mode': rnd.choice(TRANSPORT),
+                'vglug_applied_before': rnd.choice(['Yes', 'No'])
+            })
+            family.append({
+                'candidate_id': cid, 'family_environment': rnd.choice(FAMILY_ENV),
+                'single_parent_info': rnd.choice(SINGLE_PARENT),
+                'family_members_count': rnd.randint(2, 8), 'family_members_details': '',
+                'earning_members_count': rnd.randint(0, 3), 'earning_members_details': ''
+            })
+            income_text = rnd.choice(INCOMES)
+            income.append({
+                'candidate_id': cid, 'total_family_income': income_text,
+                'total_family_income_amount': parse_income_amount(income_text), 'own_land': rnd.random() < 0.2,
+                'house_ownership': rnd.choice(HOUSE), 'full_address': 'Address',
+                'pincode': f'60{rnd.randint(0, 9999):04d}', 'district': rnd.choice(DISTRICTS)
+            })
+            course.append({
+                'candidate_id': cid, 'preferred_course': rnd.choice(COURSES), 'training_benefit': '',
+                'heard_about_vglug': rnd.random() < 0.5, 'participated_in_vglug_events': rnd.random() < 0.2
+            })
+
+        for model, rows in ((Application, apps), (BasicInfo, basic), (EducationalInfo, edu),
+                            (FamilyInfo, family), (IncomeInfo, income), (CourseInfo, course)):
+            db.session.execute(model.__table__.insert(), rows)
+        db.session.commit()
+
+
+class StatementCounter:
+    """Counts SQL statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def time_call(fn, repeat):
+    """Run fn repeat times and return (median ms, min ms)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), min(timings)
+
+
+def prepare_app(database_url, size):
+    """Create the app on a freshly seeded scratch database"""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    from models import db, User
+    from flask_jwt_extended import create_access_token
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        admin = User(email='benchmark-admin', role='admin')
+        admin.set_password(uuid.uuid4().hex)
+        db.session.add(admin)
+        db.session.commit()
+
+        started = time.perf_counter()
+        seed_applicants(db, size, random.Random(size))
+        print(f'  seeded {size} applicants in {time.perf_counter() - started:.1f}s')
+
+        token = create_access_token(identity=str(admin.id))
+    return app, {'Authorization': f'Bearer {token}'}
+
+
+def bench_dashboard_stats(app, headers, repeat):
+    """Dashboard stats computed live, from the dashboard_counter rollup, and from the response cache"""
+    from models import db
+    from dashboard_counters import rebuild_dashboard_counters
+    from response_cache import bump_data_version
+
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+
+    def call(uncached=True):
+        if uncached:
+            bump_data_version()
+        response = client.get('/admin/dashboard-stats', headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    for label in ('live', 'rollup', 'cached'):
+        if label == 'rollup':
+            with app.app_context():
+                rebuild_dashboard_counters()
+        uncached = label != 'cached'
+        call(uncached)  # warm up
+        with StatementCounter(engine) as counter:
+            call(uncached)
+        median_ms, min_ms = time_call(lambda: call(uncached), repeat)
+        print(f'  dashboard-stats ({label}): {counter.count} statements, '
+              f'median {median_ms:.1f} ms, min {min_ms:.1f} ms')
+
+
+# Dashboard drill-downs timed by the facets benchmark
+FACET_EXPRESSIONS = {
+    'single': {'filter_type': 'gender', 'filter_value': 'Female'},
+    'govt 6-12 AND tamil AND no laptop AND district': {'filters': [
+        {'filter_type': 'govt_school_6_to_8', 'filter_value': 'Government'},
+        {'filter_type': 'govt_school_9_to_10', 'filter_value': 'Government'},
+        {'filter_type': 'govt_school_11_to_12', 'filter_value': 'Government'},
+        {'filter_type': 'medium', 'filter_value': 'Tamil Medium'},
+        {'filter_type': 'laptop', 'filter_value': 'No Laptop'},
+        {'filter_type': 'district', 'filter_value': 'District 3'},
+    ]},
+    '(college OR college) AND NOT income range': {'filters': [
+        {'filters': [{'filter_type': 'college', 'filter_value': 'College 1'},
+                     {'filter_type': 'college', 'filter_value': 'College 2'}], 'match': 'any'},
+        {'filter_type': 'income_range', 'filter_value': '> 4,00,000', 'negate': True},
+    ]},
+}
+
+
+def bench_facets(app, headers, repeat):
+    """Dashboard filter counts and ID sets from SQL vs the in-memory facet index"""
+    from dashboard_filters import normalize_filters, build_filter_candidate_query
+    from facet_index import facet_index
+
+    with app.test_request_context():
+        started = time.perf_counter()
+        buckets = facet_index.build()
+        size = sum(bitmap.bit_length() // 8 for bitmap in facet_index.bitmaps.values())
+        print(f'  facet index built in {time.perf_counter() - started:.2f}s '
+              f'({buckets} bitmaps, {size / 1024 / 1024:.1f} MB)')
+
+        for label, body in FACET_EXPRESSIONS.items():
+            expression = normalize_filters(body)
+            query, _ = build_filter_candidate_query(expression)
+            sql_count, _ = time_call(lambda: query.order_by(None).count(), repeat)
+            sql_ids, _ = time_call(lambda: query.all(), repeat)
+            facet_count, _ = time_call(lambda: facet_index.count(expression), repeat)
+            facet_ids, _ = time_call(lambda: facet_index.candidate_ids(expression), repeat)
+            assert facet_index.count(expression) == query.order_by(None).count()
+            print(f'  {label} ({facet_index.count(expression)} matches): '
+                  f'count sql {sql_count:.2f} ms / index {facet_count * 1000:.0f} us, '
+                  f'ids sql {sql_ids:.2f} ms / index {facet_ids:.2f} ms')
+
+
+# Widget configs timed by the widget-engine benchmark
+WIDGET_CONFIGS = {
+    'count by district': {
+        'data_source': {'base_table': 'income_info'},
+        'fields': [{'table': 'income_info', 'column': 'district'},
+                   {'table': 'income_info', 'column': 'id', 'aggregation': 'COUNT', 'alias': 'count'}],
+        'group_by': ['district'], 'order_by': [{'column': 'count', 'direction': 'DESC'}], 'limit': 50
+    },
+    'govt school girls by college': {
+        'data_source': {'base_table': 'educational_info', 'joins': ['basic_info']},
+        'fields': [{'table': 'educational_info', 'column': 'college_name'},
+                   {'table': 'educational_info', 'column': 'id', 'aggregation': 'COUNT', 'alias': 'count'}],
+        'conditions': [{'table': 'basic_info', 'column': 'gender', 'operator': '=', 'value': 'Female'},
+                       {'table': 'educational_info', 'column': 'eleven_to_12_govt_school', 'operator': '=', 'value': True}],
+        'group_by': ['college_name'], 'order_by': [{'column': 'college_name'}], 'limit': 100
+    },
+    'income by family size': {
+        'data_source': {'base_table': 'family_info', 'joins': ['income_info']},
+        'fields': [{'table': 'family_info', 'column': 'family_members_count'},
+                   {'table': 'income_info', 'column': 'total_family_income_amount', 'aggregation': 'AVG', 'alias': 'avg'},
+                   {'table': 'income_info', 'column': 'total_family_income_amount', 'aggregation': 'MAX', 'alias': 'max'}],
+        'group_by': ['family_members_count'], 'order_by': [{'column': 'family_members_count'}]
+    },
+}
+
+def bench_widget_engine(app, headers, repeat):
+    """Widget queries in SQL vs the analytics snapshot (tests/test_analytics_snapshot.py checks they agree)"""
+    from analytics_snapshot import analytics_snapshot
+    from widget_query_builder import execute_widget_sql_query
+
+    with app.test_request_context():
+        started = time.perf_counter()
+        rows = analytics_snapshot.build()
+        print(f'  analytics snapshot built in {time.perf_counter() - started:.2f}s ({rows} applications)')
+
+        for label, config in WIDGET_CONFIGS.items():
+            sql_ms, _ = time_call(lambda: execute_widget_sql_query(config), repeat)
+            engine_ms, _ = time_call(lambda: analytics_snapshot.execute(config), repeat)
+            answered = analytics_snapshot.execute(config) is not None
+            print(f'  {label}: sql {sql_ms:.2f} ms / snapshot '
+                  f'{f"{engine_ms:.2f} ms" if answered else "fell back to SQL"}')
+
+
+def bench_widget_render(app, headers, repeat):
+    """Python-side cost of a widget render with and without the statement caches"""
+    import widget_query_builder as builder
+    from widget_query_planner import plan_widget_query, build_rows_select
+    from models import db
+
+    def clear_caches():
+        builder._statement_cache.clear()
+        builder._compiled_cache.clear()
+
+    runs = repeat * 100
+    with app.test_request_context():
+        dialect = db.engine.dialect
+        for label, config in WIDGET_CONFIGS.items():
+            def build_and_compile():
+                build_rows_select(plan_widget_query(config)).compile(dialect=dialect)
+
+            def cached_statement():
+                builder._cached_statement(config, lambda: None, 'rows')
+
+            def render_uncached():
+                clear_caches()
+                builder.execute_widget_sql_query(config)
+
+            build_us, _ = time_call(build_and_compile, runs)
+            builder.execute_widget_sql_query(config)  # warm the caches
+            lookup_us, _ = time_call(cached_statement, runs)
+            cold_ms, _ = time_call(render_uncached, repeat * 10)
+            warm_ms, _ = time_call(lambda: builder.execute_widget_sql_query(config), repeat * 10)
+            print(f'  {label}: plan+build+compile {build_us * 1000:.0f} us, cached statement {lookup_us * 1000:.0f} us; '
+                  f'render {cold_ms * 1000:.0f} us uncached / {warm_ms * 1000:.0f} us cached')
+
+
+BENCHMARKS = {
+    'dashboard-stats': bench_dashboard_stats,
+    'facets': bench_facets,
+    'widget-engine': bench_widget_engine,
+    'widget-render': bench_widget_render,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--sizes', default='10000,50000,200000',
+                        help='Comma-separated applicant counts (default: 10000,50000,200000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per size (default: 5)')
+    parser.add_argument('--database-url', default=None,
+                        help='Scratch database to wipe and seed (default: a temporary SQLite file)')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    tmpdir = None
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='vglug_bench_')
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    try:
+        for size in sizes:
+            print(f'{args.benchmark} @ {size} applicants ({database_url.split(":")[0]})')
+            app, headers = prepare_app(database_url, size)
+            BENCHMARKS[args.benchmark](app, headers, args.repeat)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -55,6 +55,18 @@ def make_celery(app=None):
                 'task': 'tasks.cleanup_old_email_records',
                 'schedule': 86400.0,
             },
+            'cleanup-expired-segments': {
+                'task': 'tasks.cleanup_expired_segments_task',
+                'schedule': 3600.0,
+            },
+            'refresh-metric-rollups': {
+                'task': 'tasks.refresh_metric_rollups_task',
+                'schedule': 60.0,
+            },
+            'refresh-widget-snapshots': {
+                'task': 'tasks.refresh_widget_snapshots_task',
+                'schedule': 60.0,
+            },
         },
     )
 
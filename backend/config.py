@@ -13,3 +13,16 @@ class Config:
     FAST2SMS_API_KEY = os.getenv('FAST2SMS_API_KEY')
     FAST2SMS_SENDER_ID = os.getenv('FAST2SMS_SENDER_ID', 'VGLUG')
     FAST2SMS_TEMPLATE_ID = os.getenv('FAST2SMS_TEMPLATE_ID')  # For DLT route
+
+    # Answer widget queries from the in-memory columnar snapshot when possible (analytics_snapshot, needs numpy)
+    WIDGET_ANALYTICS_ENGINE = os.getenv('WIDGET_ANALYTICS_ENGINE', 'false').lower() == 'true'
+
+    # Run batch-loaded widgets that group the same rows as one GROUPING SETS statement (PostgreSQL only)
+    WIDGET_QUERY_FUSION = os.getenv('WIDGET_QUERY_FUSION', 'true').lower() == 'true'
+
+    # Widget SQL queries: seconds before a query is cancelled, and how many may run at once per worker
+    WIDGET_QUERY_TIMEOUT = float(os.getenv('WIDGET_QUERY_TIMEOUT', '15'))
+    WIDGET_QUERY_CONCURRENCY = int(os.getenv('WIDGET_QUERY_CONCURRENCY', '4'))
+
+    # Time limit for the widget queries of the refresh-widget-snapshots task, which exist for expensive widgets
+    WIDGET_SNAPSHOT_QUERY_TIMEOUT = float(os.getenv('WIDGET_SNAPSHOT_QUERY_TIMEOUT', '300'))
@@ -0,0 +1,232 @@
+"""
+Incrementally maintained dashboard rollup (dashboard_counter table)
+
+Every counted column from dashboard_stats has one row per (column, value) with
+the number of applicants holding that value; income amounts are counted per
+INCOME_RANGES index (counter_bucket), so the table stays O(#buckets) in size. Session hooks adjust the rows in
+the same transaction as the ORM flush that changes the underlying data, so the
+dashboard reads O(#buckets) rows instead of scanning the info tables.
+
+Bulk UPDATE/DELETE statements that touch counted columns bypass the per-object
+hooks; they mark the rollup stale so stats fall back to live queries until
+`flask rebuild-dashboard-counters` is run again.
+"""
+import logging
+from collections import Counter
+
+from sqlalchemy import event, select, func, update, delete, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Application, DashboardCounter
+from dashboard_stats import (
+    FLAG_COUNTS, DISTRIBUTIONS, COUNTER_TOTAL, COUNTER_BUILT,
+    counter_dimension, encode_counter_value, counter_bucket, counter_group_expression
+)
+
+logger = logging.getLogger(__name__)
+
+_DELTAS_KEY = 'dashboard_counter_deltas'
+
+
+def _tracked_columns():
+    """{model class: [attribute keys]} for every column the rollup counts"""
+    tracked = {}
+    for column in [c for c, _ in FLAG_COUNTS.values()] + [c for c, _, _ in DISTRIBUTIONS.values()]:
+        keys = tracked.setdefault(column.class_, [])
+        if column.key not in keys:
+            keys.append(column.key)
+    return tracked
+
+
+# Counted attributes per model, e.g. {BasicInfo: ['considered', 'selected', ...]}
+TRACKED_COLUMNS = _tracked_columns()
+
+
+def _dimension(model, key):
+    return counter_dimension(getattr(model, key))
+
+
+def _add_row(deltas, model, values, sign):
+    """Count (or uncount) one row given {attribute key: value}"""
+    for key, value in values.items():
+        bucket = counter_bucket(getattr(model, key), value)
+        deltas[(_dimension(model, key), encode_counter_value(bucket))] += sign
+
+
+def _old_values(session, obj, keys):
+    """Committed values of keys for a persistent object, read from the database if not loaded"""
+    state = inspect(obj)
+    old = {}
+    missing = []
+    for key in keys:
+        history = state.attrs[key].history
+        if history.deleted:
+            old[key] = history.deleted[0]
+        elif history.unchanged:
+            old[key] = history.unchanged[0]
+        else:
+            missing.append(key)
+
+    if missing and state.identity:
+        model = type(obj)
+        mapper = inspect(model)
+        pk_filter = [col == value for col, value in zip(mapper.primary_key, state.identity)]
+        with session.no_autoflush:
+            row = session.execute(
+                select(*[getattr(model, key) for key in missing]).where(*pk_filter)
+            ).one_or_none()
+        if row is not None:
+            old.update(zip(missing, row))
+    return old
+
+
+def _before_flush(session, flush_context, instances):
+    """Record deltas for updated and deleted rows while their old values are known"""
+    deltas = Counter()
+    session.info[_DELTAS_KEY] = deltas
+
+    for obj in session.dirty:
+        model = type(obj)
+        keys = TRACKED_COLUMNS.get(model)
+        if not keys or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        changed = [key for key in keys if state.attrs[key].history.added]
+        if not changed:
+            continue
+        old = _old_values(session, obj, changed)
+        new = {key: getattr(obj, key) for key in changed}
+        changed = [key for key in changed if key in old and old[key] != new[key]]
+        _add_row(deltas, model, {key: old[key] for key in changed}, -1)
+        _add_row(deltas, model, {key: new[key] for key in changed}, +1)
+
+    for obj in session.deleted:
+        model = type(obj)
+        if model is Application:
+            deltas[COUNTER_TOTAL] -= 1
+        keys = TRACKED_COLUMNS.get(model)
+        if keys:
+            _add_row(deltas, model, _old_values(session, obj, keys), -1)
+
+
+def _after_flush(session, flush_context):
+    """Count inserted rows (column defaults are filled in by now) and write all deltas"""
+    deltas = session.info.pop(_DELTAS_KEY, None) or Counter()
+
+    for obj in session.new:
+        model = type(obj)
+        if model is Application:
+            deltas[COUNTER_TOTAL] += 1
+        keys = TRACKED_COLUMNS.get(model)
+        if keys:
+            _add_row(deltas, model, {key: getattr(obj, key) for key in keys}, +1)
+
+    changes = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if changes:
+        apply_counter_deltas(session.connection(), changes)
+
+
+def _upsert_statement(dialect):
+    """INSERT ... ON CONFLICT DO UPDATE adding to the existing count, where supported"""
+    table = DashboardCounter.__table__
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.dimension, table.c.value],
+        set_={'count': table.c.count + stmt.excluded.count}
+    )
+
+
+def apply_counter_deltas(connection, changes):
+    """
+    Add deltas to rollup buckets
+
+    Args:
+        connection: Connection in the transaction making the data change
+        changes: [((dimension, value), delta), ...] sorted by key to keep lock order stable
+    """
+    table = DashboardCounter.__table__
+    upsert = _upsert_statement(connection.dialect.name)
+    if upsert is not None:
+        connection.execute(upsert, [
+            {'dimension': dimension, 'value': value, 'count': delta}
+            for (dimension, value), delta in changes
+        ])
+        return
+
+    for (dimension, value), delta in changes:
+        result = connection.execute(
+            update(table)
+            .where(table.c.dimension == dimension, table.c.value == value)
+            .values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(dimension=dimension, value=value, count=delta))
+
+
+def _on_bulk_execute(orm_execute_state):
+    """Mark the rollup stale when a bulk UPDATE/DELETE changes counted columns"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    model = mapper.class_ if mapper is not None else None
+    if model is not Application and model not in TRACKED_COLUMNS:
+        return
+
+    if orm_execute_state.is_update:
+        keys = set(TRACKED_COLUMNS.get(model, []))
+        values = getattr(orm_execute_state.statement, '_values', None)
+        if values is not None and not any(getattr(col, 'key', col) in keys for col in values):
+            return
+
+    logger.warning(f"Bulk change to {model.__name__} bypasses dashboard counters; marking rollup stale")
+    mark_counters_stale(orm_execute_state.session.connection())
+
+
+def mark_counters_stale(connection):
+    """Stop serving the rollup until the next rebuild"""
+    table = DashboardCounter.__table__
+    connection.execute(delete(table).where(
+        table.c.dimension == COUNTER_BUILT[0], table.c.value == COUNTER_BUILT[1]
+    ))
+
+
+def register_counter_hooks():
+    """Attach the rollup maintenance hooks to all ORM sessions (idempotent)"""
+    for name, fn in (('before_flush', _before_flush),
+                     ('after_flush', _after_flush),
+                     ('do_orm_execute', _on_bulk_execute)):
+        if not event.contains(Session, name, fn):
+            event.listen(Session, name, fn)
+
+
+def rebuild_dashboard_counters():
+    """
+    Recompute every rollup bucket from the info tables, replacing the existing rows
+
+    Returns: number of buckets written
+    """
+    total = db.session.query(func.count(Application.id)).scalar()
+    rows = [
+        {'dimension': COUNTER_TOTAL[0], 'value': COUNTER_TOTAL[1], 'count': total},
+        {'dimension': COUNTER_BUILT[0], 'value': COUNTER_BUILT[1], 'count': 1},
+    ]
+    # One GROUP BY per column: values keep their own type for encode_counter_value
+    dialect = db.session.get_bind().dialect.name
+    for model, keys in TRACKED_COLUMNS.items():
+        for key in keys:
+            bucket = counter_group_expression(getattr(model, key), dialect)
+            for value, count in db.session.query(bucket, func.count()).group_by(bucket):
+                rows.append({'dimension': _dimension(model, key), 'value': encode_counter_value(value), 'count': count})
+
+    table = DashboardCounter.__table__
+    connection = db.session.connection()
+    connection.execute(delete(table))
+    connection.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
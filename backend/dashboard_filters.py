@@ -0,0 +1,226 @@
+"""
+Dashboard chart filters compiled into a single candidate query
+
+Every filter type a dashboard chart can drill into is declared once in
+DASHBOARD_FILTERS as the info table column it reads and how a clicked label
+maps onto it. Filters nest into AND ('all') / OR ('any') groups, any of them
+negated, and compile into one SELECT over the info tables involved, which is
+then paged or saved as a segment instead of being loaded into Python. The
+same declarations drive the in-memory facet index (facet_index).
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from sqlalchemy import and_, or_, not_, func, false
+
+from models import db, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo
+from dashboard_stats import INCOME_RANGES, income_range_index, income_range_condition
+
+# Most filters accepted in one request, and how deeply groups may nest
+MAX_FILTERS = 20
+MAX_FILTER_DEPTH = 4
+
+# Candidate IDs returned per page when not saving a segment
+FILTER_PAGE_SIZE = 1000
+MAX_FILTER_PAGE_SIZE = 5000
+
+MATCH_MODES = ('all', 'any')
+
+# column: info table column the filter reads
+# value: clicked label -> bucket value (raises KeyError/ValueError/TypeError if not understood)
+# condition: bucket value -> SQL condition
+# bucket: stored column value -> bucket value (used by the facet index)
+FilterSpec = namedtuple('FilterSpec', ['column', 'value', 'condition', 'bucket'])
+
+
+def _same(value):
+    return value
+
+
+def _equal_condition(column):
+    return lambda value: column.is_(None) if value is None else column == value
+
+
+def _mapped(column, mapping):
+    """Filter whose labels map to fixed stored values, e.g. 'Selected' -> True"""
+    return FilterSpec(column, mapping.__getitem__, _equal_condition(column), _same)
+
+
+def _equals(column, convert=str):
+    """Filter matching the stored value itself, converted with convert"""
+    def value(label):
+        return None if label is None else convert(label)
+    return FilterSpec(column, value, _equal_condition(column), _same)
+
+
+def _income_range_label(label):
+    if income_range_condition(label) is None:
+        raise ValueError(label)
+    return label
+
+
+def _income_range_bucket(amount):
+    return None if amount is None else INCOME_RANGES[income_range_index(amount)][0]
+
+
+GOVT_SCHOOL = {'Government': True, 'Private': False}
+YES_NO = {'Yes': True, 'No': False}
+
+# filter_type -> FilterSpec
+DASHBOARD_FILTERS = {
+    'review_status': _mapped(BasicInfo.considered, {'Considered': True, 'Not Considered': False, 'Pending': None}),
+    'selection_status': _mapped(BasicInfo.selected, {'Selected': True, 'Not Selected': False}),
+    'gender': _equals(BasicInfo.gender),
+    'laptop': _mapped(BasicInfo.has_laptop, {'Has Laptop': True, 'No Laptop': False}),
+    'differently_abled': _mapped(BasicInfo.differently_abled, YES_NO),
+    'shortlisted': _mapped(BasicInfo.shortlisted, YES_NO),
+    'appeared_for_one_to_one': _mapped(BasicInfo.appeared_for_one_to_one, YES_NO),
+    'preferred_course': _equals(CourseInfo.preferred_course),
+    'heard_about_vglug': _mapped(CourseInfo.heard_about_vglug, YES_NO),
+    'participated_in_vglug_events': _mapped(CourseInfo.participated_in_vglug_events, YES_NO),
+    'govt_school_6_to_8': _mapped(EducationalInfo.six_to_8_govt_school, GOVT_SCHOOL),
+    'govt_school_9_to_10': _mapped(EducationalInfo.nine_to_10_govt_school, GOVT_SCHOOL),
+    'govt_school_11_to_12': _mapped(EducationalInfo.eleven_to_12_govt_school, GOVT_SCHOOL),
+    'college': _equals(EducationalInfo.college_name),
+    'degree': _equals(EducationalInfo.degree),
+    'department': _equals(EducationalInfo.department),
+    'year': _equals(EducationalInfo.year),
+    'scholarship': _mapped(EducationalInfo.received_scholarship, {'Received': True, 'Not Received': False}),
+    'medium': _mapped(EducationalInfo.tamil_medium, {'Tamil Medium': True, 'English Medium': False}),
+    'transport': _equals(EducationalInfo.transport_mode),
+    'applied_before': _equals(EducationalInfo.vglug_applied_before),
+    'family_environment': _equals(FamilyInfo.family_environment),
+    'single_parent': _equals(FamilyInfo.single_parent_info),
+    'family_members': _equals(FamilyInfo.family_members_count, int),
+    'earning_members': _equals(FamilyInfo.earning_members_count, int),
+    'income_range': FilterSpec(IncomeInfo.total_family_income_amount, _income_range_label,
+                               income_range_condition, _income_range_bucket),
+    'own_land': _mapped(IncomeInfo.own_land, YES_NO),
+    'house_ownership': _equals(IncomeInfo.house_ownership),
+    'district': _equals(IncomeInfo.district),
+}
+
+
+def _canonical(node):
+    return json.dumps(node, sort_keys=True, default=str)
+
+
+def _normalize_node(item, depth, leaves):
+    """Validate one filter or group and convert its label to a bucket value"""
+    if not isinstance(item, dict):
+        raise ValueError('Each filter must be an object')
+    negate = bool(item.get('negate', False))
+
+    if 'filters' in item:
+        if depth >= MAX_FILTER_DEPTH:
+            raise ValueError(f'Filter groups can be nested at most {MAX_FILTER_DEPTH} deep')
+        children = item['filters']
+        if not isinstance(children, list) or not children:
+            raise ValueError('filters must be a non-empty list')
+        match = item.get('match', 'all')
+        if match not in MATCH_MODES:
+            raise ValueError(f"match must be one of: {', '.join(MATCH_MODES)}")
+        nodes = {}
+        for child in children:
+            node = _normalize_node(child, depth + 1, leaves)
+            nodes[_canonical(node)] = node
+        # Sorted so the same set in any order shares a cache key
+        return {'match': match, 'negate': negate, 'filters': [nodes[key] for key in sorted(nodes)]}
+
+    filter_type = item.get('filter_type')
+    if filter_type not in DASHBOARD_FILTERS:
+        raise ValueError(f'Unknown filter_type: {filter_type}')
+    label = item.get('filter_value')
+    if isinstance(label, (list, dict)):
+        raise ValueError(f'filter_value for {filter_type} must be a single value')
+    try:
+        value = DASHBOARD_FILTERS[filter_type].value(label)
+    except (KeyError, ValueError, TypeError):
+        raise ValueError(f'Unknown filter_value for {filter_type}: {label}')
+
+    leaves.append(filter_type)
+    if len(leaves) > MAX_FILTERS:
+        raise ValueError(f'At most {MAX_FILTERS} filters can be combined')
+    return {'filter_type': filter_type, 'filter_value': label, 'value': value, 'negate': negate}
+
+
+def normalize_filters(data):
+    """
+    Read the filter expression from a request body
+
+    Accepts a single {"filter_type", "filter_value"} pair, or a group
+    {"filters": [...], "match": "all"|"any"} whose items are filters or nested
+    groups. Any filter or group may carry "negate": true.
+
+    Returns: normalized expression (always a group at the top)
+    Raises ValueError for a missing or malformed expression.
+    """
+    if data.get('filters') is None:
+        if not data.get('filter_type'):
+            raise ValueError('filter_type is required')
+        data = {'filters': [{'filter_type': data['filter_type'], 'filter_value': data.get('filter_value')}]}
+    return _normalize_node({key: data[key] for key in ('filters', 'match', 'negate') if key in data}, 0, [])
+
+
+def iter_filter_leaves(expression):
+    """Yield every single filter in an expression"""
+    if 'filters' in expression:
+        for child in expression['filters']:
+            yield from iter_filter_leaves(child)
+    else:
+        yield expression
+
+
+def _sql_condition(node, negated=False):
+    negated = negated != node['negate']
+    if 'filters' in node:
+        conditions = [_sql_condition(child, negated) for child in node['filters']]
+        condition = and_(*conditions) if node['match'] == 'all' else or_(*conditions)
+    else:
+        condition = DASHBOARD_FILTERS[node['filter_type']].condition(node['value'])
+        if negated:
+            # NOT of a comparison with NULL is NULL; treat a non-match as false
+            condition = func.coalesce(condition, false())
+    return not_(condition) if node['negate'] else condition
+
+
+def build_filter_candidate_query(expression):
+    """
+    Compile a normalized expression into one query of candidate IDs
+
+    Only the info tables the filters touch are read, joined on candidate_id.
+
+    Returns: (query, candidate_id column it selects)
+    """
+    models = []
+    for leaf in iter_filter_leaves(expression):
+        model = DASHBOARD_FILTERS[leaf['filter_type']].column.class_
+        if model not in models:
+            models.append(model)
+
+    base = models[0]
+    query = db.session.query(base.candidate_id)
+    for model in models[1:]:
+        query = query.join(model, model.candidate_id == base.candidate_id)
+
+    return query.filter(_sql_condition(expression), base.candidate_id.isnot(None)), base.candidate_id
+
+
+def filter_cache_key(expression):
+    """Stable key for a normalized expression"""
+    return hashlib.sha1(_canonical(expression).encode('utf-8')).hexdigest()
+
+
+def describe_filters(expression):
+    """Human-readable label for an expression, e.g. 'gender: Female AND NOT district: X'"""
+    if 'filters' in expression:
+        joiner = ' AND ' if expression['match'] == 'all' else ' OR '
+        parts = [describe_filters(child) for child in expression['filters']]
+        text = joiner.join(f'({part})' if 'filters' in child and len(child['filters']) > 1 else part
+                           for part, child in zip(parts, expression['filters']))
+        if expression['negate']:
+            return f'NOT ({text})'
+        return text
+    text = f"{expression['filter_type']}: {expression['filter_value']}"
+    return f'NOT {text}' if expression['negate'] else text
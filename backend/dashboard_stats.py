@@ -0,0 +1,353 @@
+"""
+Admin dashboard statistics computed in two statements
+
+All yes/no counters come from one statement using COUNT(*) FILTER (WHERE ...)
+with a single scan per table, and every categorical distribution comes from one
+GROUP BY GROUPING SETS query. Other databases (SQLite) count with
+COUNT(CASE ...) and, lacking GROUPING SETS, union per-table GROUP BYs into a
+single statement instead.
+
+Once the dashboard_counter rollup has been built (see dashboard_counters), the
+same response is served from it in one read of the bucket rows.
+"""
+import json
+
+from sqlalchemy import select, func, case, literal, null, true, union_all
+from sqlalchemy.dialects import postgresql
+
+from models import db, Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo, DashboardCounter
+
+# Yes/no counters: name -> (column, value counted)
+FLAG_COUNTS = {
+    'considered': (BasicInfo.considered, True),
+    'not_considered': (BasicInfo.considered, False),
+    'pending_review': (BasicInfo.considered, None),
+    'selected': (BasicInfo.selected, True),
+    'not_selected': (BasicInfo.selected, False),
+    'differently_abled': (BasicInfo.differently_abled, True),
+    'not_differently_abled': (BasicInfo.differently_abled, False),
+    'has_laptop': (BasicInfo.has_laptop, True),
+    'no_laptop': (BasicInfo.has_laptop, False),
+    'govt_6_to_8': (EducationalInfo.six_to_8_govt_school, True),
+    'private_6_to_8': (EducationalInfo.six_to_8_govt_school, False),
+    'govt_9_to_10': (EducationalInfo.nine_to_10_govt_school, True),
+    'private_9_to_10': (EducationalInfo.nine_to_10_govt_school, False),
+    'govt_11_to_12': (EducationalInfo.eleven_to_12_govt_school, True),
+    'private_11_to_12': (EducationalInfo.eleven_to_12_govt_school, False),
+    'scholarship_received': (EducationalInfo.received_scholarship, True),
+    'scholarship_not_received': (EducationalInfo.received_scholarship, False),
+    'tamil_medium': (EducationalInfo.tamil_medium, True),
+    'english_medium': (EducationalInfo.tamil_medium, False),
+    'heard_about_vglug': (CourseInfo.heard_about_vglug, True),
+    'not_heard_about_vglug': (CourseInfo.heard_about_vglug, False),
+    'participated': (CourseInfo.participated_in_vglug_events, True),
+    'not_participated': (CourseInfo.participated_in_vglug_events, False),
+}
+
+# Categorical distributions: name -> (column, ordering, limit)
+# ordering is 'count' (most common first) or 'value' (by the grouped value)
+DISTRIBUTIONS = {
+    'college': (EducationalInfo.college_name, 'count', 10),
+    'degree': (EducationalInfo.degree, 'count', None),
+    'department': (EducationalInfo.department, 'count', 10),
+    'year': (EducationalInfo.year, 'value', None),
+    'transport': (EducationalInfo.transport_mode, 'count', None),
+    'vglug_applied_before': (EducationalInfo.vglug_applied_before, 'value', None),
+    'family_environment': (FamilyInfo.family_environment, 'value', None),
+    'single_parent': (FamilyInfo.single_parent_info, 'value', None),
+    'family_members': (FamilyInfo.family_members_count, 'value', None),
+    'earning_members': (FamilyInfo.earning_members_count, 'value', None),
+    'income': (IncomeInfo.total_family_income_amount, 'value', None),  # counted per INCOME_RANGES index
+    'house_ownership': (IncomeInfo.house_ownership, 'value', None),
+    'district': (IncomeInfo.district, 'count', 10),
+    'gender': (BasicInfo.gender, 'value', None),
+    'preferred_course': (CourseInfo.preferred_course, 'count', None),
+}
+
+# Income buckets as (label, upper bound exclusive), in display order
+INCOME_RANGES = [
+    ('< 50,000', 50000),
+    ('50,000 - 1,00,000', 100000),
+    ('1,00,000 - 2,50,000', 250000),
+    ('2,50,000 - 4,00,000', 400000),
+    ('> 4,00,000', None),
+]
+
+INFO_MODELS = [BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo]
+
+# Rollup rows that are not column buckets
+COUNTER_TOTAL = ('application', '*')
+COUNTER_BUILT = ('_meta', 'built')
+
+
+def counter_dimension(column):
+    """Rollup dimension name of a counted column"""
+    return f'{column.table.name}.{column.name}'
+
+
+def encode_counter_value(value):
+    """Rollup key for a bucket value (JSON keeps NULL, booleans and numbers distinct)"""
+    return json.dumps(value)
+
+
+def income_range_index(amount):
+    """Index into INCOME_RANGES for a parsed income amount"""
+    for index, (_, upper) in enumerate(INCOME_RANGES):
+        if upper is None or amount < upper:
+            return index
+
+
+def income_range_condition(label):
+    """Filter on the parsed income amount for an INCOME_RANGES label, or None if unknown"""
+    amount = IncomeInfo.total_family_income_amount
+    lower = None
+    for range_label, upper in INCOME_RANGES:
+        if range_label == label:
+            condition = amount.isnot(None)
+            if lower is not None:
+                condition = condition & (amount >= lower)
+            if upper is not None:
+                condition = condition & (amount < upper)
+            return condition
+        lower = upper
+    return None
+
+
+def _income_range(dialect):
+    """SQL expression giving the INCOME_RANGES index of each income (NULL if unknown)"""
+    amount = IncomeInfo.total_family_income_amount
+    bounds = [upper for _, upper in INCOME_RANGES if upper is not None]
+    if dialect == 'postgresql':
+        # width_bucket(x, thresholds) is the number of thresholds <= x, NULL for NULL
+        return func.width_bucket(amount, postgresql.array(bounds))
+    whens = [(amount.is_(None), null())] + [(amount < upper, index) for index, upper in enumerate(bounds)]
+    return case(*whens, else_=len(bounds))
+
+
+def _group_expression(name, column, dialect):
+    """What a distribution groups by in SQL: its column, or the income range"""
+    if name == 'income':
+        return _income_range(dialect)
+    return column
+
+
+def counter_bucket(column, value):
+    """
+    Rollup bucket of a counted column's value
+
+    Income amounts are counted per INCOME_RANGES index, so the rollup keeps one
+    row per range instead of one per distinct amount; other columns per value.
+    """
+    if value is not None and column is DISTRIBUTIONS['income'][0]:
+        return income_range_index(value)
+    return value
+
+
+def counter_group_expression(column, dialect):
+    """SQL expression a rollup rebuild groups a counted column by (see counter_bucket)"""
+    if column is DISTRIBUTIONS['income'][0]:
+        return _income_range(dialect)
+    return column
+
+
+def _applicant_join():
+    """Application outer-joined to all five info tables (one row per application)"""
+    joined = Application.__table__
+    for model in INFO_MODELS:
+        joined = joined.outerjoin(model.__table__, model.candidate_id == Application.candidate_id)
+    return joined
+
+
+def _count_if(condition, dialect):
+    if dialect == 'postgresql':
+        return func.count().filter(condition)
+    return func.count(case((condition, 1)))
+
+
+def _flag_counts(dialect):
+    """Total applications and every yes/no counter in one statement"""
+    # One aggregate per table, cross-joined: each table is scanned once and
+    # no row join is needed since every counter only looks at its own table
+    per_table = {Application.__table__: [func.count().label('total_applications')]}
+    for name, (column, value) in FLAG_COUNTS.items():
+        condition = column.is_(None) if value is None else column == value
+        per_table.setdefault(column.table, []).append(_count_if(condition, dialect).label(name))
+
+    subqueries = [select(*columns).select_from(table).subquery()
+                  for table, columns in per_table.items()]
+    joined = subqueries[0]
+    for subquery in subqueries[1:]:
+        joined = joined.join(subquery, true())
+    row = db.session.execute(select(*subqueries).select_from(joined)).one()
+    return row._asdict()
+
+
+def _grouped_counts_grouping_sets():
+    """{distribution: [(value, count), ...]} from one GROUPING SETS query"""
+    names = list(DISTRIBUTIONS)
+    columns = [_group_expression(name, DISTRIBUTIONS[name][0], 'postgresql') for name in names]
+    width = len(columns)
+
+    stmt = select(func.grouping(*columns).label('grouping_id'), *columns, func.count().label('n'))\
+        .select_from(_applicant_join())\
+        .group_by(func.grouping_sets(*columns))
+
+    # GROUPING(a, b, ...) sets a bit for every column that is NOT grouped in the row
+    full_mask = (1 << width) - 1
+    index_by_mask = {full_mask ^ (1 << (width - 1 - i)): i for i in range(width)}
+
+    grouped = {name: [] for name in names}
+    for row in db.session.execute(stmt):
+        index = index_by_mask.get(row.grouping_id)
+        if index is None:
+            continue
+        value = row[1 + index]
+        # Every grouped column is NOT NULL except single_parent_info and the income range,
+        # whose NULLs are excluded anyway, so a NULL group here is an application missing the section
+        if value is not None:
+            grouped[names[index]].append((value, row.n))
+    return grouped
+
+
+def _grouped_counts_union(dialect):
+    """{distribution: [(value, count), ...]} from per-table GROUP BYs in one UNION ALL"""
+    selects = []
+    for name, (column, _, _) in DISTRIBUTIONS.items():
+        expression = _group_expression(name, column, dialect)
+        selects.append(
+            select(literal(name).label('dimension'), expression.label('value'), func.count().label('n'))
+            .where(expression.isnot(None))
+            .group_by(expression)
+        )
+
+    grouped = {name: [] for name in DISTRIBUTIONS}
+    for row in db.session.execute(union_all(*selects)):
+        grouped[row.dimension].append((row.value, row.n))
+    return grouped
+
+
+def _load_counters():
+    """All rollup buckets as {(dimension, value): count}, or None if the rollup is not built"""
+    counts = {(row.dimension, row.value): row.count for row in db.session.execute(
+        select(DashboardCounter.dimension, DashboardCounter.value, DashboardCounter.count)
+    )}
+    if COUNTER_BUILT not in counts:
+        return None
+    return counts
+
+
+def _stats_from_counters(counts):
+    """(flags, grouped) in the same shape as the live queries, read from rollup buckets"""
+    flags = {'total_applications': counts.get(COUNTER_TOTAL, 0)}
+    for name, (column, value) in FLAG_COUNTS.items():
+        flags[name] = counts.get((counter_dimension(column), encode_counter_value(value)), 0)
+
+    by_dimension = {}
+    for (dimension, value), count in counts.items():
+        if count > 0:
+            by_dimension.setdefault(dimension, []).append((value, count))
+
+    grouped = {}
+    for name, (column, _, _) in DISTRIBUTIONS.items():
+        pairs = [(json.loads(value), count) for value, count in by_dimension.get(counter_dimension(column), [])]
+        grouped[name] = [(value, count) for value, count in pairs if value is not None]
+    return flags, grouped
+
+
+def _ordered(name, pairs):
+    """Apply a distribution's ordering and limit and convert it to response items"""
+    _, ordering, limit = DISTRIBUTIONS[name]
+    # Sort by value first so ties between equal counts come back in a stable order
+    pairs = sorted(pairs, key=lambda p: p[0])
+    if ordering == 'count':
+        pairs = sorted(pairs, key=lambda p: p[1], reverse=True)
+    if limit:
+        pairs = pairs[:limit]
+    return [{'name': value, 'count': count} for value, count in pairs]
+
+
+def _income_distribution(pairs):
+    """Response items for (INCOME_RANGES index, count) pairs, skipping empty ranges"""
+    counts = dict(pairs)
+    return [{'name': label, 'count': counts[index]}
+            for index, (label, _) in enumerate(INCOME_RANGES) if counts.get(index)]
+
+
+def compute_live_counts():
+    """(flags, grouped) computed from the info tables"""
+    dialect = db.session.get_bind().dialect.name
+    flags = _flag_counts(dialect)
+    if dialect == 'postgresql':
+        grouped = _grouped_counts_grouping_sets()
+    else:
+        grouped = _grouped_counts_union(dialect)
+    return flags, grouped
+
+
+def compute_dashboard_stats(live=False):
+    """
+    Build the /admin/dashboard-stats response
+
+    Args:
+        live: Skip the rollup and compute from the info tables
+
+    Returns: dict with overview, educational, family, income, basic and course sections
+    """
+    counts = None if live else _load_counters()
+    if counts is not None:
+        flags, grouped = _stats_from_counters(counts)
+    else:
+        flags, grouped = compute_live_counts()
+
+    def items(name):
+        return _ordered(name, grouped[name])
+
+    def str_items(name):
+        return [{'name': str(item['name']), 'count': item['count']} for item in items(name)]
+
+    return {
+        'overview': {
+            'total_applications': flags['total_applications'],
+            'considered': flags['considered'],
+            'not_considered': flags['not_considered'],
+            'pending_review': flags['pending_review'],
+            'selected': flags['selected'],
+            'not_selected': flags['not_selected']
+        },
+        'educational': {
+            'govt_school_by_year': {
+                '6_to_8': {'govt': flags['govt_6_to_8'], 'private': flags['private_6_to_8']},
+                '9_to_10': {'govt': flags['govt_9_to_10'], 'private': flags['private_9_to_10']},
+                '11_to_12': {'govt': flags['govt_11_to_12'], 'private': flags['private_11_to_12']}
+            },
+            'college_distribution': items('college'),
+            'degree_distribution': items('degree'),
+            'department_distribution': items('department'),
+            'year_distribution': items('year'),
+            'scholarship': {'received': flags['scholarship_received'], 'not_received': flags['scholarship_not_received']},
+            'medium': {'tamil': flags['tamil_medium'], 'english': flags['english_medium']},
+            'transport_distribution': items('transport'),
+            'vglug_applied_before': items('vglug_applied_before')
+        },
+        'family': {
+            'family_environment': items('family_environment'),
+            'single_parent': items('single_parent'),
+            'family_members': str_items('family_members'),
+            'earning_members': str_items('earning_members')
+        },
+        'income': {
+            'income_distribution': _income_distribution(grouped['income']),
+            'house_ownership': items('house_ownership'),
+            'district_distribution': items('district')
+        },
+        'basic': {
+            'gender': items('gender'),
+            'differently_abled': {'yes': flags['differently_abled'], 'no': flags['not_differently_abled']},
+            'laptop': {'has': flags['has_laptop'], 'no': flags['no_laptop']}
+        },
+        'course': {
+            'preferred_course': items('preferred_course'),
+            'heard_about_vglug': {'yes': flags['heard_about_vglug'], 'no': flags['not_heard_about_vglug']},
+            'participated_in_events': {'yes': flags['participated'], 'no': flags['not_participated']}
+        }
+    }
@@ -0,0 +1,347 @@
+"""
+In-memory bitmap facet index for dashboard cross-filtering
+
+Each worker keeps one bitmap per (filter_type, bucket value) of the
+DASHBOARD_FILTERS registry, with application ids as bit positions. Any
+AND/OR/NOT combination of dashboard filters is then answered with a few
+big-integer AND/OR operations instead of a multi-join query.
+
+Bitmaps are plain Python ints: a dense bitset costs one bit per application
+(25 KB for 200k applicants) and the set operations run in C.
+
+Session hooks patch the bitmaps after each commit made by this process. The
+index also tracks the response_cache data version: it bumps by one for every
+commit touching application data, so a version the index has not seen means
+another worker wrote and the index is rebuilt in the background (at most once
+per REBUILD_INTERVAL). Until the index is current, callers get None and use
+the SQL path.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import reduce
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import event, select, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Application
+from dashboard_stats import INFO_MODELS
+from dashboard_filters import DASHBOARD_FILTERS, iter_filter_leaves
+from pagination import encode_cursor, decode_cursor
+from response_cache import get_data_version
+
+logger = logging.getLogger(__name__)
+
+_OPS_KEY = 'facet_index_ops'
+_CHANGED_KEY = 'facet_index_changed'
+_STALE_KEY = 'facet_index_stale'
+
+# Least seconds between background rebuilds. A rebuild reads every info table,
+# so while other workers keep writing this worker answers from SQL in between
+REBUILD_INTERVAL = 60
+
+# Models whose commits bump the data version (same set passed to track_data_version)
+VERSIONED_MODELS = (Application, *INFO_MODELS)
+
+
+def _facet_filters():
+    """{info model: [(filter_type, column key, FilterSpec)]} for every indexed filter"""
+    facets = {}
+    for filter_type, spec in DASHBOARD_FILTERS.items():
+        facets.setdefault(spec.column.class_, []).append((filter_type, spec.column.key, spec))
+    return facets
+
+
+# Indexed filters per info table
+FACET_FILTERS = _facet_filters()
+
+
+def _bitmap(positions, size):
+    """Bitmap (int) with the given bit positions set"""
+    bits = bytearray((size >> 3) + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bit_positions(bitmap):
+    """Set bit positions of a bitmap in ascending order"""
+    return [match.start() for match in re.finditer('1', bin(bitmap)[:1:-1])]
+
+
+class FacetIndex:
+    """Bitmaps of one worker process; see the module docstring"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._building = False
+        self._last_rebuild = None  # time.monotonic() of the last background rebuild
+        self.version = None  # Data version reflected, None while not built or stale
+        self.universe = 0  # Every application
+        self.present = {}  # {info model: applications with a row}
+        self.bitmaps = {}  # {(filter_type, bucket value): applications in the bucket}
+        self.ordinals = {}  # {candidate_id: application id}
+        self.candidates = []  # candidate_id by application id (None for unused ids)
+
+    # ----- Building -----
+
+    def build(self):
+        """Load every bitmap from the database and make the index current"""
+        version = get_data_version()
+        connection = db.session.connection()
+        ordinals = dict(connection.execute(select(Application.candidate_id, Application.id)).all())
+        size = max(ordinals.values(), default=0) + 1
+
+        present = {}
+        positions = defaultdict(list)
+        for model, facets in FACET_FILTERS.items():
+            rows = connection.execute(
+                select(model.candidate_id, *[getattr(model, key) for _, key, _ in facets])
+            ).all()
+            rows = [(ordinals[row[0]], *row[1:]) for row in rows if row[0] in ordinals]
+            if not rows:
+                present[model] = 0
+                continue
+            columns = list(zip(*rows))
+            present[model] = _bitmap(columns[0], size)
+            for (filter_type, _, spec), values in zip(facets, columns[1:]):
+                # Group by stored value first so bucket() runs once per distinct value
+                by_value = defaultdict(list)
+                for ordinal, value in zip(columns[0], values):
+                    by_value[value].append(ordinal)
+                for value, ordinal_list in by_value.items():
+                    positions[(filter_type, spec.bucket(value))].extend(ordinal_list)
+
+        bitmaps = {key: _bitmap(ordinal_list, size) for key, ordinal_list in positions.items()}
+        with self._lock:
+            self.universe = _bitmap(ordinals.values(), size)
+            self.present = present
+            self.bitmaps = bitmaps
+            self.ordinals = ordinals
+            self.candidates = [None] * size
+            for candidate_id, ordinal in ordinals.items():
+                self.candidates[ordinal] = candidate_id
+            self.version = version
+        return len(bitmaps)
+
+    def _build_in_background(self, app):
+        try:
+            with app.app_context():
+                started = len(self.ordinals)
+                self.build()
+                logger.info(f"Facet index rebuilt ({started} -> {len(self.ordinals)} applications)")
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"Facet index rebuild failed: {str(e)}")
+        finally:
+            self._building = False
+
+    def is_current(self):
+        """Whether the bitmaps reflect the latest data; starts a rebuild if not"""
+        if self.version is not None and self.version == get_data_version():
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self._building or (self._last_rebuild is not None and now - self._last_rebuild < REBUILD_INTERVAL):
+                return False
+            self._building = True
+            self._last_rebuild = now
+        threading.Thread(
+            target=self._build_in_background,
+            args=(current_app._get_current_object(),),
+            daemon=True
+        ).start()
+        return False
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+
+    # ----- Incremental updates -----
+
+    def apply(self, ops):
+        """Apply the changes of one commit made by this process"""
+        with self._lock:
+            if self.version is None:
+                return
+            for op in ops:
+                self._apply_op(op)
+            self.version += 1
+
+    def _apply_op(self, op):
+        kind, candidate_id = op[0], op[1]
+        if kind == 'add':
+            ordinal = op[2]
+            self.ordinals[candidate_id] = ordinal
+            if ordinal >= len(self.candidates):
+                self.candidates.extend([None] * (ordinal + 1 - len(self.candidates)))
+            self.candidates[ordinal] = candidate_id
+            self.universe |= 1 << ordinal
+            return
+
+        ordinal = self.ordinals.get(candidate_id)
+        if ordinal is None:
+            return
+        bit = 1 << ordinal
+
+        if kind == 'remove':
+            self.universe &= ~bit
+            for model in self.present:
+                self._clear(model, bit)
+            del self.ordinals[candidate_id]
+            self.candidates[ordinal] = None
+        elif kind == 'drop':
+            self._clear(op[2], bit)
+        elif kind == 'set':
+            model, buckets = op[2], op[3]
+            self.present[model] = self.present.get(model, 0) | bit
+            for filter_type, bucket in buckets.items():
+                self._clear_filter(filter_type, bit)
+                key = (filter_type, bucket)
+                self.bitmaps[key] = self.bitmaps.get(key, 0) | bit
+
+    def _clear_filter(self, filter_type, bit):
+        for key, bitmap in self.bitmaps.items():
+            if key[0] == filter_type and bitmap & bit:
+                self.bitmaps[key] = bitmap & ~bit
+
+    def _clear(self, model, bit):
+        self.present[model] = self.present.get(model, 0) & ~bit
+        for filter_type, _, _ in FACET_FILTERS.get(model, []):
+            self._clear_filter(filter_type, bit)
+
+    # ----- Queries -----
+
+    def _evaluate(self, node, scope):
+        if 'filters' in node:
+            bitmaps = [self._evaluate(child, scope) for child in node['filters']]
+            combine = (lambda a, b: a & b) if node['match'] == 'all' else (lambda a, b: a | b)
+            bitmap = reduce(combine, bitmaps)
+        else:
+            bitmap = self.bitmaps.get((node['filter_type'], node['value']), 0)
+        return scope & ~bitmap if node['negate'] else bitmap
+
+    def match(self, expression):
+        """
+        Bitmap of applications matching a normalized dashboard filter expression,
+        or None if the index is not current
+
+        Like the SQL query, only applications with a row in every info table
+        the expression reads can match.
+        """
+        if not self.is_current():
+            return None
+        with self._lock:
+            scope = self.universe
+            for leaf in iter_filter_leaves(expression):
+                scope &= self.present.get(DASHBOARD_FILTERS[leaf['filter_type']].column.class_, 0)
+            return self._evaluate(expression, scope) & scope
+
+    def count(self, expression):
+        """Number of matching applications, or None if the index is not current"""
+        bitmap = self.match(expression)
+        return None if bitmap is None else bitmap.bit_count()
+
+    def candidate_ids(self, expression):
+        """Sorted candidate IDs of matching applications, or None if the index is not current"""
+        bitmap = self.match(expression)
+        if bitmap is None:
+            return None
+        candidates = self.candidates
+        return sorted(candidates[ordinal] for ordinal in bit_positions(bitmap))
+
+
+def page_candidate_ids(candidate_ids, cursor=None, per_page=1000):
+    """
+    One page of a sorted candidate ID list, with the same cursors as the SQL path
+    (keyset_paginate on candidate_id ascending)
+
+    Returns: {'items': [...], 'next_cursor': str|None, 'has_more': bool}
+    """
+    start = 0
+    if cursor:
+        _, last = decode_cursor(cursor, 'candidate_id', 'asc')
+        start = bisect.bisect_right(candidate_ids, last)
+    items = candidate_ids[start:start + per_page]
+    has_more = start + per_page < len(candidate_ids)
+    return {
+        'items': items,
+        'next_cursor': encode_cursor('candidate_id', 'asc', items[-1], items[-1]) if has_more and items else None,
+        'has_more': has_more
+    }
+
+
+# Shared by every request in this worker
+facet_index = FacetIndex()
+
+
+def _after_flush(session, flush_context):
+    """Record this flush's facet changes; applied to the index once the transaction commits"""
+    if not any(isinstance(obj, VERSIONED_MODELS) for obj in chain(session.new, session.dirty, session.deleted)):
+        return
+    session.info[_CHANGED_KEY] = True
+    ops = session.info.setdefault(_OPS_KEY, [])
+
+    # Applications first so their info rows in the same flush find an ordinal
+    for obj in session.new:
+        if isinstance(obj, Application):
+            ops.append(('add', obj.candidate_id, obj.id))
+    for obj in session.new:
+        facets = FACET_FILTERS.get(type(obj))
+        if facets:
+            ops.append(('set', obj.candidate_id, type(obj),
+                        {ft: spec.bucket(getattr(obj, key)) for ft, key, spec in facets}))
+
+    for obj in session.dirty:
+        facets = FACET_FILTERS.get(type(obj))
+        if not facets or not session.is_modified(obj):
+            continue
+        attrs = inspect(obj).attrs
+        changed = {ft: spec.bucket(getattr(obj, key)) for ft, key, spec in facets
+                   if attrs[key].history.has_changes()}
+        if changed:
+            ops.append(('set', obj.candidate_id, type(obj), changed))
+
+    for obj in session.deleted:
+        if isinstance(obj, Application):
+            ops.append(('remove', obj.candidate_id))
+        elif type(obj) in FACET_FILTERS:
+            ops.append(('drop', obj.candidate_id, type(obj)))
+
+
+def _on_bulk_execute(orm_execute_state):
+    """Bulk UPDATE/DELETE bypasses the per-object hooks: rebuild after commit"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, VERSIONED_MODELS):
+            orm_execute_state.session.info[_STALE_KEY] = True
+
+
+def _after_commit(session):
+    ops = session.info.pop(_OPS_KEY, [])
+    changed = session.info.pop(_CHANGED_KEY, False)
+    if session.info.pop(_STALE_KEY, False):
+        facet_index.invalidate()
+    elif changed:
+        facet_index.apply(ops)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    # Flushed changes were rolled back (possibly only a savepoint): start over
+    if session.info.pop(_OPS_KEY, None) or session.info.pop(_STALE_KEY, False):
+        facet_index.invalidate()
+
+
+def register_facet_hooks():
+    """Attach the facet index maintenance hooks to all ORM sessions (idempotent)"""
+    for name, fn in (('after_flush', _after_flush),
+                     ('do_orm_execute', _on_bulk_execute),
+                     ('after_commit', _after_commit),
+                     ('after_soft_rollback', _after_soft_rollback)):
+        if not event.contains(Session, name, fn):
+            event.listen(Session, name, fn)
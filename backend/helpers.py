@@ -3,7 +3,70 @@ Helper functions for handling normalized application data
 """
 
 from datetime import datetime
-from models import db, Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo
+from sqlalchemy.orm import aliased
+from models import db, User, Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo
+from response_cache import application_detail_cache
+
+
+# Columns the admin application list can project, keyed by the name used in `fields=`
+APPLICATION_LIST_COLUMNS = {
+    'id': Application.id,
+    'candidate_id': Application.candidate_id,
+    'uuid': Application.uuid,
+    'status': Application.status,
+    'created_at': Application.created_at,
+    'full_name': BasicInfo.full_name,
+    'email': BasicInfo.email,
+    'contact': BasicInfo.contact,
+    'gender': BasicInfo.gender,
+    'dob': BasicInfo.dob,
+    'shortlisted': BasicInfo.shortlisted,
+    'appeared_for_one_to_one': BasicInfo.appeared_for_one_to_one,
+    'selected': BasicInfo.selected,
+    'considered': BasicInfo.considered
+}
+
+# List fields that are returned nested under 'basic_info'
+APPLICATION_LIST_BASIC_FIELDS = {
+    'full_name', 'email', 'contact', 'gender', 'dob', 'shortlisted',
+    'appeared_for_one_to_one', 'selected', 'considered'
+}
+
+
+def resolve_application_list_fields(fields_param):
+    """
+    Parse the comma-separated `fields` parameter of the application list
+
+    id and candidate_id are always included. Unknown names raise ValueError.
+
+    Returns: list of field names in APPLICATION_LIST_COLUMNS order
+    """
+    if not fields_param:
+        return list(APPLICATION_LIST_COLUMNS)
+
+    requested = {f.strip() for f in fields_param.split(',') if f.strip()}
+    unknown = requested - set(APPLICATION_LIST_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    requested.update(('id', 'candidate_id'))
+    return [name for name in APPLICATION_LIST_COLUMNS if name in requested]
+
+
+def serialize_application_list_row(row, fields):
+    """Convert a projected list row (tuple in `fields` order) to the list response shape"""
+    result = {}
+    basic_info = {}
+    for name, value in zip(fields, row):
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        if name in APPLICATION_LIST_BASIC_FIELDS:
+            basic_info[name] = value
+        else:
+            result[name] = value
+    if basic_info:
+        result['basic_info'] = basic_info
+    return result
 
 
 def extract_field_value(section_data, field_name):
@@ -129,6 +192,161 @@ def save_normalized_application(structured_data, candidate_id, uuid, form_config
     return application
 
 
+def load_application_details(candidate_id=None, application_id=None, uuid=None):
+    """
+    Load an application with all child rows and reviewer emails in one statement
+
+    Exactly one of candidate_id, application_id or uuid should be given.
+
+    Returns:
+        Tuple (application, basic_info, educational_info, family_info, income_info,
+        course_info, reviewer_email, shortlister_email), or None if not found
+    """
+    reviewer = aliased(User)
+    shortlister = aliased(User)
+
+    query = db.session.query(
+        Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo,
+        reviewer.email, shortlister.email
+    ).outerjoin(BasicInfo, BasicInfo.candidate_id == Application.candidate_id)\
+        .outerjoin(EducationalInfo, EducationalInfo.candidate_id == Application.candidate_id)\
+        .outerjoin(FamilyInfo, FamilyInfo.candidate_id == Application.candidate_id)\
+        .outerjoin(IncomeInfo, IncomeInfo.candidate_id == Application.candidate_id)\
+        .outerjoin(CourseInfo, CourseInfo.candidate_id == Application.candidate_id)\
+        .outerjoin(reviewer, reviewer.id == BasicInfo.reviewed_by)\
+        .outerjoin(shortlister, shortlister.id == BasicInfo.shortlisted_by)
+
+    if candidate_id is not None:
+        query = query.filter(Application.candidate_id == candidate_id)
+    elif application_id is not None:
+        query = query.filter(Application.id == application_id)
+    else:
+        query = query.filter(Application.uuid == uuid)
+
+    return query.first()
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def serialize_application_details(details):
+    """
+    Serialize a load_application_details() row to the admin detail payload
+
+    Missing child rows are returned as None.
+    """
+    application, basic, edu, family, income, course, reviewer_email, shortlister_email = details
+
+    result = {
+        'id': application.id,
+        'candidate_id': application.candidate_id,
+        'uuid': application.uuid,
+        'status': application.status,
+        'created_at': _isoformat(application.created_at),
+        'updated_at': _isoformat(application.updated_at),
+        'basic_info': None,
+        'educational_info': None,
+        'family_info': None,
+        'income_info': None,
+        'course_info': None
+    }
+
+    if basic:
+        result['basic_info'] = {
+            'full_name': basic.full_name,
+            'dob': _isoformat(basic.dob),
+            'gender': basic.gender,
+            'email': basic.email,
+            'differently_abled': basic.differently_abled,
+            'contact': basic.contact,
+            'contact_as_whatsapp': basic.contact_as_whatsapp,
+            'whatsapp_contact': basic.whatsapp_contact,
+            'has_laptop': basic.has_laptop,
+            'laptop_ram': basic.laptop_ram,
+            'laptop_processor': basic.laptop_processor,
+            # Panel member review fields
+            'considered': basic.considered,
+            'selected': basic.selected,
+            'shortlisted': basic.shortlisted,
+            'shortlisted_by': basic.shortlisted_by,
+            'shortlisted_at': _isoformat(basic.shortlisted_at),
+            'shortlister_email': shortlister_email,
+            'remarks': basic.remarks,
+            'reviewed_by': basic.reviewed_by,
+            'reviewer_email': reviewer_email
+        }
+
+    if edu:
+        result['educational_info'] = {
+            'college_name': edu.college_name,
+            'degree': edu.degree,
+            'department': edu.department,
+            'year': edu.year,
+            'tamil_medium': edu.tamil_medium,
+            'six_to_8_govt_school': edu.six_to_8_govt_school,
+            'six_to_8_school_name': edu.six_to_8_school_name,
+            'nine_to_10_govt_school': edu.nine_to_10_govt_school,
+            'nine_to_10_school_name': edu.nine_to_10_school_name,
+            'eleven_to_12_govt_school': edu.eleven_to_12_govt_school,
+            'eleven_to_12_school_name': edu.eleven_to_12_school_name,
+            'present_work': edu.present_work,
+            'received_scholarship': edu.received_scholarship,
+            'scholarship_details': edu.scholarship_details,
+            'transport_mode': edu.transport_mode,
+            'vglug_applied_before': edu.vglug_applied_before
+        }
+
+    if family:
+        result['family_info'] = {
+            'family_environment': family.family_environment,
+            'single_parent_info': family.single_parent_info,
+            'family_members_count': family.family_members_count,
+            'family_members_details': family.family_members_details,
+            'earning_members_count': family.earning_members_count,
+            'earning_members_details': family.earning_members_details,
+            'guardian_details': family.guardian_details
+        }
+
+    if income:
+        result['income_info'] = {
+            'total_family_income': income.total_family_income,
+            'own_land': income.own_land,
+            'own_land_size': income.own_land_size,
+            'house_ownership': income.house_ownership,
+            'full_address': income.full_address,
+            'pincode': income.pincode,
+            'district': income.district
+        }
+
+    if course:
+        result['course_info'] = {
+            'preferred_course': course.preferred_course,
+            'training_benefit': course.training_benefit,
+            'heard_about_vglug': course.heard_about_vglug,
+            'participated_in_vglug_events': course.participated_in_vglug_events
+        }
+
+    return result
+
+
+# Personal fields exposed by get_application_with_details (review fields are admin-only)
+PUBLIC_BASIC_INFO_FIELDS = [
+    'full_name', 'dob', 'gender', 'email', 'differently_abled', 'contact',
+    'contact_as_whatsapp', 'whatsapp_contact', 'has_laptop', 'laptop_ram', 'laptop_processor'
+]
+
+# Form field names for the schooling columns, which differ from the model attributes
+FORM_EDUCATIONAL_KEYS = {
+    'six_to_8_govt_school': '6_to_8_govt_school',
+    'six_to_8_school_name': '6_to_8_school_name',
+    'nine_to_10_govt_school': '9_to_10_govt_school',
+    'nine_to_10_school_name': '9_to_10_school_name',
+    'eleven_to_12_govt_school': '11_to_12_govt_school',
+    'eleven_to_12_school_name': '11_to_12_school_name'
+}
+
+
 def get_application_with_details(application_id):
     """
     Retrieve complete application with all related data
@@ -142,77 +360,33 @@ def get_application_with_details(application_id):
 
     # Try to find by ID or UUID
     if isinstance(application_id, int):
-        application = Application.query.get(application_id)
+        details = load_application_details(application_id=application_id)
     else:
-        application = Application.query.filter_by(uuid=application_id).first()
+        details = load_application_details(uuid=application_id)
 
-    if not application:
+    if not details:
         return None
 
+    data = serialize_application_details(details)
+    basic_info = data['basic_info']
+    educational_info = data['educational_info']
+
     return {
         'application': {
-            'id': application.id,
-            'uuid': application.uuid,
-            'candidate_id': application.candidate_id,
-            'status': application.status,
-            'created_at': application.created_at.isoformat(),
-            'updated_at': application.updated_at.isoformat()
-        },
-        'basic_info': {
-            'full_name': application.basic_info.full_name,
-            'dob': application.basic_info.dob.isoformat(),
-            'gender': application.basic_info.gender,
-            'email': application.basic_info.email,
-            'differently_abled': application.basic_info.differently_abled,
-            'contact': application.basic_info.contact,
-            'contact_as_whatsapp': application.basic_info.contact_as_whatsapp,
-            'whatsapp_contact': application.basic_info.whatsapp_contact,
-            'has_laptop': application.basic_info.has_laptop,
-            'laptop_ram': application.basic_info.laptop_ram,
-            'laptop_processor': application.basic_info.laptop_processor
+            'id': data['id'],
+            'uuid': data['uuid'],
+            'candidate_id': data['candidate_id'],
+            'status': data['status'],
+            'created_at': data['created_at'],
+            'updated_at': data['updated_at']
         },
+        'basic_info': {k: basic_info[k] for k in PUBLIC_BASIC_INFO_FIELDS} if basic_info else None,
         'educational_info': {
-            'college_name': application.educational_info.college_name,
-            'degree': application.educational_info.degree,
-            'department': application.educational_info.department,
-            'year': application.educational_info.year,
-            'tamil_medium': application.educational_info.tamil_medium,
-            '6_to_8_govt_school': application.educational_info.six_to_8_govt_school,
-            '6_to_8_school_name': application.educational_info.six_to_8_school_name,
-            '9_to_10_govt_school': application.educational_info.nine_to_10_govt_school,
-            '9_to_10_school_name': application.educational_info.nine_to_10_school_name,
-            '11_to_12_govt_school': application.educational_info.eleven_to_12_govt_school,
-            '11_to_12_school_name': application.educational_info.eleven_to_12_school_name,
-            'present_work': application.educational_info.present_work,
-            'received_scholarship': application.educational_info.received_scholarship,
-            'scholarship_details': application.educational_info.scholarship_details,
-            'transport_mode': application.educational_info.transport_mode,
-            'vglug_applied_before': application.educational_info.vglug_applied_before
-        },
-        'family_info': {
-            'family_environment': application.family_info.family_environment,
-            'single_parent_info': application.family_info.single_parent_info,
-            'family_members_count': application.family_info.family_members_count,
-            'family_members_details': application.family_info.family_members_details,
-            'earning_members_count': application.family_info.earning_members_count,
-            'earning_members_details': application.family_info.earning_members_details,
-            'guardian_details': application.family_info.guardian_details
-        },
-        'income_info': {
-            'total_family_income': application.income_info.total_family_income,
-            'own_land': application.income_info.own_land,
-            'own_land_size': application.income_info.own_land_size,
-            'house_ownership': application.income_info.house_ownership,
-            'full_address': application.income_info.full_address,
-            'pincode': application.income_info.pincode,
-            'district': application.income_info.district
-        },
-        'course_info': {
-            'preferred_course': application.course_info.preferred_course,
-            'training_benefit': application.course_info.training_benefit,
-            'heard_about_vglug': application.course_info.heard_about_vglug,
-            'participated_in_vglug_events': application.course_info.participated_in_vglug_events
-        }
+            FORM_EDUCATIONAL_KEYS.get(k, k): v for k, v in educational_info.items()
+        } if educational_info else None,
+        'family_info': data['family_info'],
+        'income_info': data['income_info'],
+        'course_info': data['course_info']
     }
 
 
@@ -359,4 +533,6 @@ def update_normalized_application(candidate_id, structured_data):
 
     db.session.commit()
 
+    application_detail_cache.delete(candidate_id)
+
     return application
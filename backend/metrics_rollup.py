@@ -0,0 +1,255 @@
+"""
+Time-series rollups of applicant activity for surge monitoring
+
+Submissions, OTP sends/verifications and sent emails are counted into
+per-minute buckets with one GROUP BY per metric over a short trailing window,
+then folded into hour and day buckets from the minute/hour rows. The refresh
+runs every minute from Celery beat, so charts read a handful of metric_rollup
+rows instead of scanning application, otp_verifications and email_queue.
+
+Minute buckets are kept for MINUTE_RETENTION and hour buckets for
+HOUR_RETENTION; day buckets are kept indefinitely.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, delete, and_
+
+from models import db, Application, OTPVerification, EmailQueue, MetricRollup
+
+GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+# Minute buckets recomputed on every refresh. Covers late changes such as an
+# OTP verified a few minutes after it was sent (OTPs expire after 10 minutes)
+REFRESH_WINDOW = timedelta(minutes=15)
+
+MINUTE_RETENTION = timedelta(days=7)
+HOUR_RETENTION = timedelta(days=90)
+
+# Most points a single timeseries request may return
+MAX_POINTS = 2000
+
+# Counted metrics: name -> (timestamp column, extra condition, start column or None).
+# With a start column, MetricRollup.total sums the seconds from start to timestamp.
+# otp_verified is bucketed by when the OTP was sent: the table has no verified_at
+SOURCE_METRICS = {
+    'submissions': (Application.created_at, None, None),
+    'otp_sent': (OTPVerification.created_at, None, None),
+    'otp_verified': (OTPVerification.created_at, OTPVerification.verified.is_(True), None),
+    'emails_sent': (EmailQueue.sent_at, EmailQueue.status == 'sent', EmailQueue.created_at),
+}
+
+# Metrics read as total / count of another metric's buckets
+AVERAGE_METRICS = {
+    'email_queue_lag': 'emails_sent',  # Seconds from queueing to sending
+}
+
+METRIC_LABELS = {
+    'submissions': 'Submissions',
+    'otp_sent': 'OTPs Sent',
+    'otp_verified': 'OTPs Verified',
+    'emails_sent': 'Emails Sent',
+    'email_queue_lag': 'Email Queue Lag (seconds)',
+}
+
+
+def floor_time(value, granularity):
+    """Start of the bucket containing value"""
+    if granularity == 'minute':
+        return value.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _minute_expression(column, dialect):
+    """SQL truncating column to the minute, or None to bucket in Python"""
+    if dialect == 'postgresql':
+        return func.date_trunc('minute', column)
+    if dialect == 'sqlite':
+        return func.strftime('%Y-%m-%d %H:%M:00', column)
+    return None
+
+
+def _seconds_between(start, end, dialect):
+    """SQL seconds from start to end, or None to compute in Python"""
+    if dialect == 'postgresql':
+        return func.extract('epoch', end - start)
+    if dialect == 'sqlite':
+        return (func.julianday(end) - func.julianday(start)) * 86400
+    return None
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _minute_buckets(metric, since, until, dialect):
+    """{minute start: (count, total)} for one source metric in [since, until)"""
+    column, condition, start_column = SOURCE_METRICS[metric]
+    filters = [column >= since, column < until]
+    if condition is not None:
+        filters.append(condition)
+
+    bucket = _minute_expression(column, dialect)
+    seconds = _seconds_between(start_column, column, dialect) if start_column is not None else None
+    if bucket is None or (start_column is not None and seconds is None):
+        # No portable minute truncation: fetch timestamps and bucket here
+        columns = [column] + ([start_column] if start_column is not None else [])
+        buckets = {}
+        for row in db.session.execute(select(*columns).where(*filters)):
+            start = floor_time(row[0], 'minute')
+            count, total = buckets.get(start, (0, None))
+            if start_column is not None and row[1] is not None:
+                total = (total or 0) + (row[0] - row[1]).total_seconds()
+            buckets[start] = (count + 1, total)
+        return buckets
+
+    columns = [bucket, func.count()] + ([func.sum(seconds)] if seconds is not None else [])
+    rows = db.session.execute(select(*columns).where(*filters).group_by(bucket))
+    return {
+        _as_datetime(row[0]): (row[1], float(row[2]) if seconds is not None and row[2] is not None else None)
+        for row in rows
+    }
+
+
+def _rollup_buckets(metric, source_granularity, granularity, since):
+    """Fold source_granularity rows from since onwards into granularity buckets"""
+    buckets = {}
+    rows = db.session.execute(
+        select(MetricRollup.bucket_start, MetricRollup.count, MetricRollup.total).where(
+            MetricRollup.metric == metric,
+            MetricRollup.granularity == source_granularity,
+            MetricRollup.bucket_start >= since
+        )
+    )
+    for bucket_start, count, total in rows:
+        start = floor_time(bucket_start, granularity)
+        prev_count, prev_total = buckets.get(start, (0, None))
+        if total is not None:
+            prev_total = (prev_total or 0) + total
+        buckets[start] = (prev_count + count, prev_total)
+    return buckets
+
+
+def _replace_buckets(connection, metric, granularity, since, buckets):
+    """Replace the metric's granularity rows from since onwards with buckets"""
+    table = MetricRollup.__table__
+    connection.execute(delete(table).where(
+        table.c.metric == metric,
+        table.c.granularity == granularity,
+        table.c.bucket_start >= since
+    ))
+    if buckets:
+        connection.execute(table.insert(), [
+            {'metric': metric, 'granularity': granularity, 'bucket_start': start, 'count': count, 'total': total}
+            for start, (count, total) in sorted(buckets.items())
+        ])
+
+
+def refresh_metric_rollups(since=None, now=None):
+    """
+    Recompute minute buckets from since (default: the last REFRESH_WINDOW) and
+    the hour/day buckets containing them, then drop expired minute/hour rows
+
+    Args:
+        since: Oldest time to recount, e.g. a few days back to backfill
+        now: Current UTC time (for tests and backfills)
+
+    Returns: number of buckets written
+    """
+    now = now or datetime.utcnow()
+    since = floor_time(since or now - REFRESH_WINDOW, 'minute')
+    until = floor_time(now, 'minute') + GRANULARITIES['minute']
+    hour_since = floor_time(since, 'hour')
+    day_since = floor_time(since, 'day')
+
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    written = 0
+    for metric in SOURCE_METRICS:
+        minutes = _minute_buckets(metric, since, until, dialect)
+        _replace_buckets(connection, metric, 'minute', since, minutes)
+
+        # An hour bucket is only complete if its earlier minutes still exist
+        hours = _rollup_buckets(metric, 'minute', 'hour', hour_since)
+        _replace_buckets(connection, metric, 'hour', hour_since, hours)
+
+        days = _rollup_buckets(metric, 'hour', 'day', day_since)
+        _replace_buckets(connection, metric, 'day', day_since, days)
+        written += len(minutes) + len(hours) + len(days)
+
+    table = MetricRollup.__table__
+    for granularity, retention in (('minute', MINUTE_RETENTION), ('hour', HOUR_RETENTION)):
+        connection.execute(delete(table).where(
+            table.c.granularity == granularity,
+            table.c.bucket_start < floor_time(now - retention, granularity)
+        ))
+
+    db.session.commit()
+    return written
+
+
+def get_timeseries(metric, granularity='hour', since=None, until=None):
+    """
+    Zero-filled series of one metric
+
+    Args:
+        metric: Name from SOURCE_METRICS or AVERAGE_METRICS
+        granularity: 'minute', 'hour' or 'day'
+        since: First bucket (default: 60 buckets before until)
+        until: Last bucket, inclusive (default: now)
+
+    Returns: [{'bucket': ISO start, 'value': number}, ...] oldest first.
+    Averages are None for buckets without events.
+
+    Raises ValueError for unknown metrics/granularities or too many points.
+    """
+    if metric not in SOURCE_METRICS and metric not in AVERAGE_METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity}")
+
+    step = GRANULARITIES[granularity]
+    until = floor_time(until or datetime.utcnow(), granularity)
+    since = floor_time(since, granularity) if since else until - step * 59
+    if since > until:
+        raise ValueError("since must not be after until")
+    if (until - since) // step + 1 > MAX_POINTS:
+        raise ValueError(f"Too many points; use a coarser granularity (max {MAX_POINTS})")
+
+    source = AVERAGE_METRICS.get(metric, metric)
+    rows = db.session.execute(
+        select(MetricRollup.bucket_start, MetricRollup.count, MetricRollup.total).where(
+            and_(MetricRollup.metric == source,
+                 MetricRollup.granularity == granularity,
+                 MetricRollup.bucket_start >= since,
+                 MetricRollup.bucket_start <= until)
+        )
+    )
+    buckets = {bucket_start: (count, total) for bucket_start, count, total in rows}
+
+    points = []
+    start = since
+    while start <= until:
+        count, total = buckets.get(start, (0, None))
+        if metric in AVERAGE_METRICS:
+            value = round(total / count, 1) if count and total is not None else None
+        else:
+            value = count
+        points.append({'bucket': start.isoformat(), 'value': value})
+        start += step
+    return points
+
+
+def get_timeseries_metadata():
+    """Metrics and granularities offered to the widget builder"""
+    return {
+        'metrics': [{'value': name, 'label': label} for name, label in METRIC_LABELS.items()],
+        'granularities': list(GRANULARITIES),
+    }
@@ -0,0 +1,30 @@
+"""Add dashboard_counter rollup table
+
+Revision ID: add_dashboard_counters
+Revises: add_segments
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_dashboard_counters'
+down_revision = 'add_segments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `flask rebuild-dashboard-counters`; until then stats are computed live
+    op.create_table('dashboard_counter',
+        sa.Column('dimension', sa.String(100), nullable=False),
+        sa.Column('value', sa.String(512), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('dimension', 'value')
+    )
+
+
+def downgrade():
+    op.drop_table('dashboard_counter')
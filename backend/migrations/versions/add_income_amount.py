@@ -0,0 +1,80 @@
+"""Add parsed numeric total_family_income_amount to income_info
+
+Revision ID: add_income_amount
+Revises: add_dashboard_counters
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_income_amount'
+down_revision = 'add_dashboard_counters'
+branch_labels = None
+depends_on = None
+
+# Rows parsed and updated per backfill batch
+BATCH_SIZE = 1000
+
+# Same cap as models.INCOME_AMOUNT_MAX
+INCOME_AMOUNT_MAX = 10 ** 15
+
+
+def parse_income_amount(income_text):
+    # Copy of models.parse_income_amount so the migration does not depend on app code
+    if income_text is None:
+        return None
+    digits = re.sub(r'\D', '', str(income_text))
+    if not digits:
+        return None
+    return min(int(digits), INCOME_AMOUNT_MAX)
+
+
+def upgrade():
+    with op.batch_alter_table('income_info', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_family_income_amount', sa.BigInteger(), nullable=True))
+
+    # Backfill in primary key order, one batch per statement round trip
+    conn = op.get_bind()
+    income_info = sa.table('income_info',
+        sa.column('id', sa.Integer),
+        sa.column('total_family_income', sa.String),
+        sa.column('total_family_income_amount', sa.BigInteger)
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(income_info.c.id, income_info.c.total_family_income)
+            .where(income_info.c.id > last_id)
+            .order_by(income_info.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        updates = [{'row_id': row.id, 'amount': parse_income_amount(row.total_family_income)}
+                   for row in rows]
+        updates = [u for u in updates if u['amount'] is not None]
+        if updates:
+            conn.execute(
+                income_info.update()
+                .where(income_info.c.id == sa.bindparam('row_id'))
+                .values(total_family_income_amount=sa.bindparam('amount')),
+                updates
+            )
+        last_id = rows[-1].id
+
+    op.create_index('ix_income_info_total_family_income_amount', 'income_info',
+                    ['total_family_income_amount'], unique=False)
+
+    # The dashboard rollup now buckets income by amount; serve live stats until it is rebuilt
+    op.execute("DELETE FROM dashboard_counter WHERE dimension = '_meta'")
+
+
+def downgrade():
+    op.drop_index('ix_income_info_total_family_income_amount', table_name='income_info')
+    with op.batch_alter_table('income_info', schema=None) as batch_op:
+        batch_op.drop_column('total_family_income_amount')
@@ -0,0 +1,38 @@
+"""Add updated_at change tracking to the info tables
+
+Revision ID: add_info_updated_at
+Revises: add_metric_rollups
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_info_updated_at'
+down_revision = 'add_metric_rollups'
+branch_labels = None
+depends_on = None
+
+INFO_TABLES = ['basic_info', 'educational_info', 'family_info', 'income_info', 'course_info']
+
+
+def upgrade():
+    for table in INFO_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+        # Existing rows were last touched no later than their application
+        op.execute(
+            f"UPDATE {table} SET updated_at = "
+            f"(SELECT application.updated_at FROM application WHERE application.candidate_id = {table}.candidate_id)"
+        )
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in INFO_TABLES:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
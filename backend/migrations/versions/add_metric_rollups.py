@@ -0,0 +1,33 @@
+"""Add metric_rollup time-series table
+
+Revision ID: add_metric_rollups
+Revises: add_income_amount
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_metric_rollups'
+down_revision = 'add_income_amount'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled every minute by the refresh-metric-rollups beat task;
+    # `flask refresh-metric-rollups --days N` backfills history
+    op.create_table('metric_rollup',
+        sa.Column('metric', sa.String(50), nullable=False),
+        sa.Column('granularity', sa.String(10), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('metric', 'granularity', 'bucket_start')
+    )
+
+
+def downgrade():
+    op.drop_table('metric_rollup')
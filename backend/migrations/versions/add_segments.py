@@ -0,0 +1,48 @@
+"""Add segment tables for server-side saved candidate sets
+
+Revision ID: add_segments
+Revises: add_own_land
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_segments'
+down_revision = 'add_own_land'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('segment',
+        sa.Column('id', sa.String(32), nullable=False),
+        sa.Column('source', sa.String(50), nullable=False),
+        sa.Column('description', sa.String(255), nullable=True),
+        sa.Column('candidate_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['created_by'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_segment_created_by', 'segment', ['created_by'], unique=False)
+    op.create_index('ix_segment_expires_at', 'segment', ['expires_at'], unique=False)
+
+    op.create_table('segment_member',
+        sa.Column('segment_id', sa.String(32), nullable=False),
+        sa.Column('candidate_id', sa.String(20), nullable=False),
+        sa.ForeignKeyConstraint(['segment_id'], ['segment.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('segment_id', 'candidate_id')
+    )
+    op.create_index('idx_segment_member_candidate', 'segment_member', ['candidate_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_segment_member_candidate', table_name='segment_member')
+    op.drop_table('segment_member')
+    op.drop_index('ix_segment_expires_at', table_name='segment')
+    op.drop_index('ix_segment_created_by', table_name='segment')
+    op.drop_table('segment')
@@ -0,0 +1,41 @@
+"""Add widget materialization settings and the widget_snapshot table
+
+Revision ID: add_widget_snapshots
+Revises: add_info_updated_at
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_widget_snapshots'
+down_revision = 'add_info_updated_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('widget', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('materialize', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('refresh_interval', sa.Integer(), nullable=True))
+
+    # Filled by the refresh-widget-snapshots beat task for widgets with materialize set
+    op.create_table('widget_snapshot',
+        sa.Column('widget_id', sa.Integer(), nullable=False),
+        sa.Column('config_hash', sa.String(40), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.Column('duration_ms', sa.Float(), nullable=False),
+        sa.Column('data_version', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['widget_id'], ['widget.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('widget_id')
+    )
+
+
+def downgrade():
+    op.drop_table('widget_snapshot')
+    with op.batch_alter_table('widget', schema=None) as batch_op:
+        batch_op.drop_column('refresh_interval')
+        batch_op.drop_column('materialize')
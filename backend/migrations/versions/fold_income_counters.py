@@ -0,0 +1,63 @@
+"""Fold income amount rollup rows into income range buckets
+
+Revision ID: fold_income_counters
+Revises: add_widget_snapshots
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fold_income_counters'
+down_revision = 'add_widget_snapshots'
+branch_labels = None
+depends_on = None
+
+INCOME_DIMENSION = 'income_info.total_family_income_amount'
+
+# Upper bounds (exclusive) of dashboard_stats.INCOME_RANGES, copied so the
+# migration does not depend on app code
+INCOME_RANGE_BOUNDS = [50000, 100000, 250000, 400000]
+
+dashboard_counter = sa.table('dashboard_counter',
+    sa.column('dimension', sa.String),
+    sa.column('value', sa.String),
+    sa.column('count', sa.Integer)
+)
+
+
+def income_range_index(amount):
+    for index, upper in enumerate(INCOME_RANGE_BOUNDS):
+        if amount < upper:
+            return index
+    return len(INCOME_RANGE_BOUNDS)
+
+
+def upgrade():
+    # The rollup counted one row per distinct amount; it now counts per income range
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(dashboard_counter.c.value, dashboard_counter.c.count)
+        .where(dashboard_counter.c.dimension == INCOME_DIMENSION)
+    ).fetchall()
+    folded = {}
+    for row in rows:
+        amount = json.loads(row.value)
+        bucket = None if amount is None else income_range_index(amount)
+        folded[bucket] = folded.get(bucket, 0) + row.count
+
+    conn.execute(dashboard_counter.delete().where(dashboard_counter.c.dimension == INCOME_DIMENSION))
+    if folded:
+        conn.execute(dashboard_counter.insert(), [
+            {'dimension': INCOME_DIMENSION, 'value': json.dumps(bucket), 'count': count}
+            for bucket, count in folded.items()
+        ])
+
+
+def downgrade():
+    # Amounts cannot be recovered from ranges; serve live stats until the rollup is rebuilt
+    op.execute("DELETE FROM dashboard_counter WHERE dimension = '_meta'")
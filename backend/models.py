@@ -1,4 +1,6 @@
+import re
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -112,6 +114,7 @@ class BasicInfo(db.Model):
     """Personal Details / தனிப்பட்ட விவரங்கள்"""
     id = db.Column(db.Integer, primary_key=True)
     candidate_id = db.Column(db.String(20), db.ForeignKey('application.candidate_id'), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Change tracking for analytics_snapshot
 
     full_name = db.Column(db.String(255), nullable=False, index=True)
     dob = db.Column(db.Date, nullable=False, index=True)
@@ -165,6 +168,7 @@ class EducationalInfo(db.Model):
     """Educational Details / கல்வி விவரங்கள்"""
     id = db.Column(db.Integer, primary_key=True)
     candidate_id = db.Column(db.String(20), db.ForeignKey('application.candidate_id'), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Change tracking for analytics_snapshot
 
     college_name = db.Column(db.String(255), nullable=False, index=True)
     degree = db.Column(db.String(100), nullable=False, index=True)
@@ -202,6 +206,7 @@ class FamilyInfo(db.Model):
     """Family Information / குடும்ப தகவல்"""
     id = db.Column(db.Integer, primary_key=True)
     candidate_id = db.Column(db.String(20), db.ForeignKey('application.candidate_id'), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Change tracking for analytics_snapshot
 
     family_environment = db.Column(db.String(100), nullable=False, index=True)
     single_parent_info = db.Column(db.String(100), nullable=True, index=True)
@@ -221,8 +226,10 @@ class IncomeInfo(db.Model):
     """Income & Housing Information / வருமானம் மற்றும் வீடு தகவல்"""
     id = db.Column(db.Integer, primary_key=True)
     candidate_id = db.Column(db.String(20), db.ForeignKey('application.candidate_id'), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Change tracking for analytics_snapshot
 
     total_family_income = db.Column(db.String(100), nullable=True, index=True)
+    total_family_income_amount = db.Column(db.BigInteger, nullable=True, index=True)  # Parsed from total_family_income on write
     own_land = db.Column(db.Boolean, nullable=True, default=False)
     own_land_size = db.Column(db.String(100), nullable=True)
     house_ownership = db.Column(db.String(100), nullable=False, index=True)
@@ -237,10 +244,36 @@ class IncomeInfo(db.Model):
     )
 
 
+# Parsed amounts are capped so arbitrarily long digit strings still fit a BIGINT
+INCOME_AMOUNT_MAX = 10 ** 15
+
+
+def parse_income_amount(income_text):
+    """
+    Numeric value of a free-text income ("1,20,000", "Rs. 75000")
+
+    All digits are concatenated, matching how the dashboard has always read
+    incomes. Returns None when the text has no digits.
+    """
+    if income_text is None:
+        return None
+    digits = re.sub(r'\D', '', str(income_text))
+    if not digits:
+        return None
+    return min(int(digits), INCOME_AMOUNT_MAX)
+
+
+@event.listens_for(IncomeInfo.total_family_income, 'set')
+def _sync_income_amount(target, value, oldvalue, initiator):
+    """Keep total_family_income_amount in step with the free-text income"""
+    target.total_family_income_amount = parse_income_amount(value)
+
+
 class CourseInfo(db.Model):
     """Course Preference / பயிற்சி விருப்பம்"""
     id = db.Column(db.Integer, primary_key=True)
     candidate_id = db.Column(db.String(20), db.ForeignKey('application.candidate_id'), nullable=False, unique=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Change tracking for analytics_snapshot
 
     preferred_course = db.Column(db.String(100), nullable=False, index=True)
     training_benefit = db.Column(db.Text, nullable=False)
@@ -266,6 +299,8 @@ class Widget(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)
+    materialize = db.Column(db.Boolean, default=False, nullable=False)  # Precompute into widget_snapshot
+    refresh_interval = db.Column(db.Integer, nullable=True)  # Seconds between snapshot refreshes
 
     creator = db.relationship('User', backref='created_widgets', foreign_keys=[created_by])
 
@@ -275,6 +310,18 @@ class Widget(db.Model):
     )
 
 
+class WidgetSnapshot(db.Model):
+    """Precomputed result of a materialized widget, refreshed by widget_snapshots"""
+    __tablename__ = 'widget_snapshot'
+
+    widget_id = db.Column(db.Integer, db.ForeignKey('widget.id', ondelete='CASCADE'), primary_key=True)
+    config_hash = db.Column(db.String(40), nullable=False)  # snapshot_config_hash of the config computed
+    payload = db.Column(db.JSON, nullable=False)  # {'data': [...], 'row_count': int}
+    computed_at = db.Column(db.DateTime, nullable=False)
+    duration_ms = db.Column(db.Float, nullable=False)
+    data_version = db.Column(db.Integer, nullable=True)  # Shared data version computed at, None without Redis
+
+
 class EmailQueue(db.Model):
     """Email queue for background processing with Celery"""
     id = db.Column(db.Integer, primary_key=True)
@@ -346,6 +393,51 @@ class EditToken(db.Model):
     )
 
 
+class Segment(db.Model):
+    """Server-side saved set of candidates (drill-downs, filters) referenced by id"""
+    id = db.Column(db.String(32), primary_key=True)
+    source = db.Column(db.String(50), nullable=False)  # widget, widget_segment, dashboard_filter, candidate_ids
+    description = db.Column(db.String(255), nullable=True)
+    candidate_count = db.Column(db.Integer, nullable=False, default=0)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    members = db.relationship('SegmentMember', backref='segment', cascade='all, delete-orphan', passive_deletes=True)
+
+
+class SegmentMember(db.Model):
+    """Candidate belonging to a saved segment"""
+    __tablename__ = 'segment_member'
+
+    segment_id = db.Column(db.String(32), db.ForeignKey('segment.id', ondelete='CASCADE'), primary_key=True)
+    candidate_id = db.Column(db.String(20), primary_key=True)
+
+    __table_args__ = (
+        db.Index('idx_segment_member_candidate', 'candidate_id'),
+    )
+
+
+class DashboardCounter(db.Model):
+    """Precomputed dashboard bucket count, kept current by dashboard_counters hooks"""
+    __tablename__ = 'dashboard_counter'
+
+    dimension = db.Column(db.String(100), primary_key=True)  # table.column, or application / _meta
+    value = db.Column(db.String(512), primary_key=True)  # JSON-encoded bucket value
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class MetricRollup(db.Model):
+    """Per-minute/hour/day activity bucket, refreshed by metrics_rollup"""
+    __tablename__ = 'metric_rollup'
+
+    metric = db.Column(db.String(50), primary_key=True)  # submissions, otp_sent, otp_verified, emails_sent
+    granularity = db.Column(db.String(10), primary_key=True)  # minute, hour, day
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # UTC start of the bucket
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=True)  # Sum of a per-event value (e.g. email queue lag seconds)
+
+
 # Legacy submission table (for backwards compatibility)
 class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
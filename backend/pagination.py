@@ -0,0 +1,250 @@
+"""
+Keyset (cursor) pagination helpers for admin list endpoints
+
+Pages are addressed by an opaque cursor holding the last row's sort value and
+candidate_id instead of an OFFSET, so deep pages cost the same as the first one
+and rows inserted while paging do not shift later pages. Totals are estimated
+by default (planner stats on PostgreSQL, a short-lived cached count elsewhere)
+and only counted exactly when the caller asks for it.
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime, date
+
+from sqlalchemy import and_, or_, literal
+
+from models import db
+
+# How long a cached COUNT(*) is reused for the estimated total
+COUNT_CACHE_TTL = 60
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+def _encode_value(value):
+    """Serialize a sort value so it survives the JSON round trip with its type"""
+    if isinstance(value, datetime):
+        return {'t': 'dt', 'v': value.isoformat()}
+    if isinstance(value, date):
+        return {'t': 'd', 'v': value.isoformat()}
+    return {'t': 'v', 'v': value}
+
+
+def _decode_value(data):
+    kind = data.get('t')
+    value = data.get('v')
+    if value is None:
+        return None
+    if kind == 'dt':
+        return datetime.fromisoformat(value)
+    if kind == 'd':
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(sort_key, direction, sort_value, tie_value, backward=False):
+    """
+    Build an opaque cursor pointing just after the given row
+
+    A backward cursor points just before it instead (the prev_cursor of a page).
+    """
+    payload = {
+        'k': sort_key,
+        'o': direction,
+        's': _encode_value(sort_value),
+        'c': tie_value
+    }
+    if backward:
+        payload['b'] = 1
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_payload(cursor, sort_key, direction):
+    """(sort_value, tie_value, backward) of a cursor, checked against the sort"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        sort_value = _decode_value(payload['s'])
+        tie_value = payload['c']
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError('Invalid cursor')
+
+    if payload.get('k') != sort_key or payload.get('o') != direction:
+        raise ValueError('Cursor does not match the requested sort order')
+
+    return sort_value, tie_value, bool(payload.get('b'))
+
+
+def decode_cursor(cursor, sort_key, direction):
+    """
+    Decode a forward cursor produced by encode_cursor
+
+    Raises ValueError if the cursor is malformed, points backward, or was
+    issued for a different sort key or direction than the current request.
+
+    Returns: (sort_value, tie_value)
+    """
+    sort_value, tie_value, backward = _decode_payload(cursor, sort_key, direction)
+    if backward:
+        raise ValueError('Invalid cursor')
+    return sort_value, tie_value
+
+
+def _after_clause(sort_column, tie_column, direction, nulls_first, sort_value, tie_value):
+    """WHERE clause selecting rows that come strictly after (sort_value, tie_value)"""
+    # Bind explicitly so boolean sort values compare with < / > like any other
+    tie_value = literal(tie_value, tie_column.type)
+    tie_after = tie_column < tie_value if direction == 'desc' else tie_column > tie_value
+
+    if sort_value is None:
+        # Cursor sits inside the NULL block
+        in_null_block = and_(sort_column.is_(None), tie_after)
+        if nulls_first:
+            return or_(in_null_block, sort_column.isnot(None))
+        return in_null_block
+
+    sort_value = literal(sort_value, sort_column.type)
+    sort_after = sort_column < sort_value if direction == 'desc' else sort_column > sort_value
+
+    after = or_(sort_after, and_(sort_column == sort_value, tie_after))
+    if nulls_first:
+        return after
+    return or_(after, sort_column.is_(None))
+
+
+def order_clauses(sort_column, tie_column, direction='desc', nulls_first=False):
+    """ORDER BY clauses matching the keyset predicate for the given sort"""
+    if direction == 'desc':
+        ordered = sort_column.desc()
+        tie = tie_column.desc()
+    else:
+        ordered = sort_column.asc()
+        tie = tie_column.asc()
+    ordered = ordered.nullsfirst() if nulls_first else ordered.nullslast()
+    return [ordered, tie]
+
+
+def keyset_paginate(query, sort_column, tie_column, sort_key, direction='desc',
+                    cursor=None, per_page=20, nulls_first=False, offset=None):
+    """
+    Fetch one page of a query ordered by (sort_column, tie_column)
+
+    Args:
+        query: Filtered query without ORDER BY / LIMIT
+        sort_column: Column the client sorts on
+        tie_column: Unique column breaking ties (candidate_id)
+        sort_key: Public name of the sort, embedded in cursors
+        direction: 'asc' or 'desc'
+        cursor: next_cursor or prev_cursor of a previous page, or None for the first page
+        per_page: Page size
+        nulls_first: Whether NULL sort values come before non-NULL ones
+        offset: Deprecated page offset, used only when no cursor is given
+
+    Returns: {'items': [...], 'next_cursor': str|None, 'prev_cursor': str|None, 'has_more': bool}
+        items are entities for single-entity queries, otherwise column tuples;
+        prev_cursor is None on the first page
+    """
+    width = len(query.column_descriptions)
+    backward = False
+    if cursor:
+        sort_value, tie_value, backward = _decode_payload(cursor, sort_key, direction)
+
+    # A backward page is the page after the cursor in the reversed order, read back to front
+    if backward:
+        scan_direction = 'asc' if direction == 'desc' else 'desc'
+        scan_nulls_first = not nulls_first
+    else:
+        scan_direction, scan_nulls_first = direction, nulls_first
+    query = query.order_by(*order_clauses(sort_column, tie_column, scan_direction, scan_nulls_first))
+
+    if cursor:
+        query = query.filter(_after_clause(sort_column, tie_column, scan_direction, scan_nulls_first,
+                                           sort_value, tie_value))
+    elif offset:
+        query = query.offset(offset)
+
+    # Fetch one extra row to know whether another page exists
+    query = query.add_columns(sort_column, tie_column)
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backward:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        # Going back, the rows after this page are the ones the cursor came from
+        has_more = True if backward else more
+        has_previous = more if backward else bool(cursor or offset)
+        if has_more:
+            next_cursor = encode_cursor(sort_key, direction, last[-2], last[-1])
+        if has_previous:
+            prev_cursor = encode_cursor(sort_key, direction, first[-2], first[-1], backward=True)
+    else:
+        has_more = False
+
+    return {
+        'items': [row[0] if width == 1 else tuple(row[:width]) for row in rows],
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'has_more': has_more
+    }
+
+
+def _planner_estimate(query):
+    """Row estimate from the PostgreSQL planner for the given query"""
+    statement = query.order_by(None).statement
+    # Savepoint so a failed EXPLAIN does not abort the request's transaction
+    with db.session.begin_nested():
+        connection = db.session.connection()
+        compiled = statement.compile(dialect=connection.dialect)
+        result = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params)
+        plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _cached_count(query):
+    """Exact count reused for COUNT_CACHE_TTL seconds per distinct filtered query"""
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.session.get_bind().dialect)
+    key = (str(compiled), tuple(sorted((k, repr(v)) for k, v in compiled.params.items())))
+
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    total = query.order_by(None).count()
+
+    with _count_cache_lock:
+        # Drop expired entries so the cache stays bounded by the live filter sets
+        for stale_key in [k for k, v in _count_cache.items() if v[1] <= now]:
+            del _count_cache[stale_key]
+        _count_cache[key] = (total, now + COUNT_CACHE_TTL)
+    return total
+
+
+def count_total(query, exact=False):
+    """
+    Total number of rows matched by query
+
+    Returns: (total, is_exact)
+    """
+    if exact:
+        return query.order_by(None).count(), True
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        try:
+            return _planner_estimate(query), False
+        except Exception:
+            pass
+
+    return _cached_count(query), False
@@ -0,0 +1,488 @@
+"""
+Response cache for admin API payloads.
+Uses Redis when it is reachable so every worker shares one cache, and falls
+back to an in-process LRU otherwise.
+
+Versioned entries are keyed by a global data version that is bumped after any
+commit touching application data, so cached dashboards and widgets are
+invalidated by writes rather than waiting for their TTL. Computing a missing
+entry is single-flight: concurrent requests for the same key (the same
+canonical query at the same data version) wait for the one computation and
+share its result instead of all hitting the database - threads of a process
+through an in-flight registry, other workers through a Redis lock.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from itertools import chain
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Seconds to wait before trying Redis again after a connection failure
+REDIS_RETRY_INTERVAL = 30
+
+# Redis counter bumped after every commit that changes application data
+DATA_VERSION_KEY = 'vglug:data_version'
+
+# How long a request waits for another computation before doing it itself, and
+# how long a worker's Redis compute lock lives (caches can set their own)
+SINGLE_FLIGHT_TIMEOUT = 10
+
+# Poll interval while waiting on another worker's computation
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+# Release a single-flight lock only if we still own it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_redis_client = None
+_redis_down_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def get_redis():
+    """Return a connected Redis client, or None while Redis is unavailable"""
+    global _redis_client, _redis_down_until
+
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() < _redis_down_until:
+        return None
+
+    with _redis_lock:
+        if _redis_client is not None:
+            return _redis_client
+        try:
+            import redis
+            client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+            client.ping()
+            _redis_client = client
+        except Exception as e:
+            logger.warning(f"Redis unavailable for response cache, using local cache: {str(e)}")
+            _redis_down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+        return _redis_client
+
+
+def _redis_failed(error):
+    """Drop the Redis client after an error so callers fall back to the local cache"""
+    global _redis_client, _redis_down_until
+    logger.warning(f"Redis error in response cache: {str(error)}")
+    _redis_client = None
+    _redis_down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+
+
+def _json_default(value):
+    # Same conversion Flask's jsonify applies to numeric aggregates
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_local_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def get_data_version() -> int:
+    """
+    Current application data version
+
+    Shared through Redis; while Redis is down each process falls back to its
+    own counter, so writes made by other workers only show up after the TTL.
+    """
+    client = get_redis()
+    if client is not None:
+        try:
+            return int(client.get(DATA_VERSION_KEY) or 0)
+        except Exception as e:
+            _redis_failed(e)
+    return _local_data_version
+
+
+def bump_data_version():
+    """Invalidate every versioned cache entry"""
+    global _local_data_version
+    with _data_version_lock:
+        _local_data_version += 1
+    client = get_redis()
+    if client is not None:
+        try:
+            client.incr(DATA_VERSION_KEY)
+        except Exception as e:
+            _redis_failed(e)
+
+
+# Session listeners installed by track_data_version, by event name
+_tracking_listeners = {}
+
+
+def track_data_version(*models):
+    """
+    Bump the data version after each commit that changed rows of the given models
+
+    ORM flushes and bulk UPDATE/DELETE statements are both tracked. A flag left
+    over from a rolled-back transaction only causes one extra invalidation.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    tracked = tuple(models)
+    flag = 'response_cache_data_changed'
+
+    def after_flush(session, flush_context):
+        if any(isinstance(obj, tracked) for obj in chain(session.new, session.dirty, session.deleted)):
+            session.info[flag] = True
+
+    def do_orm_execute(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and issubclass(mapper.class_, tracked):
+                orm_execute_state.session.info[flag] = True
+
+    def after_commit(session):
+        if session.info.pop(flag, False):
+            bump_data_version()
+
+    # Replace listeners from an earlier call (e.g. create_app run twice in one process)
+    for name, fn in list(_tracking_listeners.items()):
+        if event.contains(Session, name, fn):
+            event.remove(Session, name, fn)
+    _tracking_listeners.clear()
+    for name, fn in (('after_flush', after_flush),
+                     ('do_orm_execute', do_orm_execute),
+                     ('after_commit', after_commit)):
+        event.listen(Session, name, fn)
+        _tracking_listeners[name] = fn
+
+
+class LocalLRU:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Flight:
+    """A computation in progress in this process, for other threads to wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """Namespaced JSON cache for API responses"""
+
+    def __init__(self, namespace: str, ttl: int = 300, max_local_entries: int = 1000,
+                 flight_timeout: int = SINGLE_FLIGHT_TIMEOUT, generational: bool = False):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.flight_timeout = flight_timeout
+        # Generational caches scope keys by a counter that clear_all bumps
+        self.generational = generational
+        self._local_generation = 0
+        self.local = LocalLRU(max_local_entries)
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _key(self, key: str) -> str:
+        return f'vglug:cache:{self.namespace}:{key}'
+
+    def _generation_key(self) -> str:
+        return f'vglug:cache:{self.namespace}:generation'
+
+    def _scoped(self, key: str) -> str:
+        """key within the current generation (unchanged for non-generational caches)"""
+        if not self.generational:
+            return key
+        generation = self._local_generation
+        client = get_redis()
+        if client is not None:
+            try:
+                generation = int(client.get(self._generation_key()) or 0)
+            except Exception as e:
+                _redis_failed(e)
+        return f'g{generation}:{key}'
+
+    def clear_all(self):
+        """
+        Invalidate every entry of a generational cache at once
+
+        Bumps the generation instead of deleting keys, so callers that changed
+        an unknown or large set of rows need not list them.
+        """
+        if not self.generational:
+            raise TypeError(f"Cache '{self.namespace}' is not generational")
+        self._local_generation += 1
+        self.local.clear()
+        client = get_redis()
+        if client is not None:
+            try:
+                client.incr(self._generation_key())
+            except Exception as e:
+                _redis_failed(e)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None"""
+        key = self._scoped(key)
+        client = get_redis()
+        if client is not None:
+            try:
+                raw = client.get(self._key(key))
+                return json.loads(raw) if raw is not None else None
+            except Exception as e:
+                _redis_failed(e)
+        return self.local.get(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Cache a JSON-serializable value"""
+        ttl = ttl or self.ttl
+        key = self._scoped(key)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.setex(self._key(key), ttl, json.dumps(value, default=_json_default))
+                return
+            except Exception as e:
+                _redis_failed(e)
+        self.local.set(key, value, ttl)
+
+    def delete(self, *keys: str):
+        """Invalidate one or more keys"""
+        if not keys:
+            return
+        keys = [self._scoped(key) for key in keys]
+        # Always clear the local copy too, it may hold entries from a Redis outage
+        for key in keys:
+            self.local.delete(key)
+        client = get_redis()
+        if client is not None:
+            try:
+                client.delete(*[self._key(k) for k in keys])
+            except Exception as e:
+                _redis_failed(e)
+
+    def versioned_key(self, key: str, version: Optional[int] = None) -> str:
+        """The key get_or_compute(versioned=True) stores key under at a data version (default: current)"""
+        return f'{key}@v{get_data_version() if version is None else version}'
+
+    def _flight_key(self, key: str) -> str:
+        return f'vglug:flight:{self.namespace}:{key}'
+
+    def _acquire_flight(self, key: str) -> Optional[str]:
+        """
+        Take the cross-worker compute lock for key
+
+        Returns: a token if we hold the lock (or Redis is unavailable), None if
+        another worker is already computing the value
+        """
+        token = uuid.uuid4().hex
+        client = get_redis()
+        if client is None:
+            return token
+        try:
+            if client.set(self._flight_key(key), token, nx=True, px=int(self.flight_timeout * 1000)):
+                return token
+            return None
+        except Exception as e:
+            _redis_failed(e)
+            return token
+
+    def _release_flight(self, key: str, token: str):
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            client.eval(_RELEASE_LOCK_SCRIPT, 1, self._flight_key(key), token)
+        except Exception as e:
+            _redis_failed(e)
+
+    def _flight_running(self, key: str) -> bool:
+        """Whether another worker still holds the compute lock for key"""
+        client = get_redis()
+        if client is None:
+            return False
+        try:
+            return bool(client.exists(self._flight_key(key)))
+        except Exception as e:
+            _redis_failed(e)
+            return False
+
+    def _wait_for(self, key: str, deadline: float) -> Optional[Any]:
+        """
+        Poll for a value another worker is computing
+
+        Returns None once the deadline passes or the worker releases its lock
+        without caching a value (its computation failed).
+        """
+        while time.monotonic() < deadline:
+            time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+            value = self.get(key)
+            if value is not None:
+                return value
+            if not self._flight_running(key):
+                # It may have cached the value just before releasing the lock
+                return self.get(key)
+        return None
+
+    def _compute_once(self, key: str, compute: Callable[[], Any], ttl: Optional[int]) -> Any:
+        """Compute and cache key, or take the value of another worker computing it"""
+        deadline = time.monotonic() + self.flight_timeout
+        token = self._acquire_flight(key)
+        while token is None:
+            value = self._wait_for(key, deadline)
+            if value is not None:
+                self.coalesced += 1
+                return value
+            # The other worker failed or is overdue: take over
+            token = self._acquire_flight(key) if time.monotonic() < deadline else uuid.uuid4().hex
+
+        self.misses += 1
+        try:
+            value = compute()
+            self.set(key, value, ttl)
+        finally:
+            self._release_flight(key, token)
+        return value
+
+    def _join(self, flight: _Flight, key: str, compute: Callable[[], Any], ttl: Optional[int]) -> Any:
+        """Wait for another thread's computation of key and share its outcome"""
+        if not flight.done.wait(self.flight_timeout):
+            # Overdue: compute on our own rather than wait any longer
+            return self._compute_once(key, compute, ttl)
+        if flight.error is None:
+            self.coalesced += 1
+            return flight.value
+        if isinstance(flight.error, Exception) and getattr(flight.error, 'shareable', True):
+            self.coalesced += 1
+            raise flight.error
+        # An error particular to that request (e.g. its query was cancelled): start over
+        return self.get_or_compute(key, compute, ttl, versioned=False)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[int] = None,
+                       versioned: bool = True) -> Any:
+        """
+        Return the cached value for key, computing and caching it on a miss
+
+        Args:
+            key: Cache key within this namespace
+            compute: Zero-argument function producing a JSON-serializable value
+            ttl: Seconds to keep the value (defaults to the cache TTL)
+            versioned: Drop the entry as soon as application data changes
+
+        Concurrent misses for the same key run compute once. Threads in this
+        process wait for the computing thread and share its value, or its
+        exception unless the exception has shareable = False. Other workers
+        wait on a Redis lock for the value to be cached, and take over if the
+        computing worker fails.
+        """
+        if versioned:
+            key = self.versioned_key(key)
+
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leading = flight is None
+            if leading:
+                flight = self._flights[key] = _Flight()
+        if not leading:
+            return self._join(flight, key, compute, ttl)
+
+        try:
+            flight.value = self._compute_once(key, compute, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> dict:
+        """
+        get_or_compute outcomes in this process since it started: cache hits,
+        misses (computed here) and coalesced (shared another computation)
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'namespace': self.namespace,
+            'backend': 'redis' if get_redis() is not None else 'local',
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'local_entries': len(self.local),
+            'max_local_entries': self.local.max_entries,
+        }
+
+
+# Full application detail payloads, keyed by candidate_id. Generational, so
+# writes to a whole segment invalidate them with clear_all
+application_detail_cache = ResponseCache('application_detail', ttl=300, max_local_entries=2000,
+                                         generational=True)
+
+# Widget queries may run for the widget query time limit (15s by default)
+WIDGET_FLIGHT_TIMEOUT = 30
+
+# Dashboard statistics and widget results, versioned by application writes.
+# Widget results are keyed by the normalized config hash (widget_config_hash)
+dashboard_cache = ResponseCache('dashboard', ttl=60, max_local_entries=100)
+widget_data_cache = ResponseCache('widget_data', ttl=300, max_local_entries=500,
+                                  flight_timeout=WIDGET_FLIGHT_TIMEOUT)
+
+# Widget drill-down candidate ID pages, keyed by the page statement
+widget_candidate_cache = ResponseCache('widget_candidates', ttl=60, max_local_entries=200,
+                                       flight_timeout=WIDGET_FLIGHT_TIMEOUT)
+dashboard_filter_cache = ResponseCache('dashboard_filter', ttl=300, max_local_entries=500)
@@ -0,0 +1,128 @@
+"""
+Saved segments - server-side candidate sets referenced by an opaque id
+
+Drill-downs materialize their matching candidate IDs into segment_member with
+a single INSERT ... SELECT, and list, export and bulk endpoints join against
+that table instead of receiving thousands of IDs back from the browser.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, literal, func
+
+from models import db, Segment, SegmentMember
+
+# How long a saved segment stays usable
+SEGMENT_TTL = timedelta(hours=24)
+
+
+class SegmentNotFound(ValueError):
+    """Raised when a segment id is unknown or has expired"""
+
+
+def _new_segment(source, description, created_by):
+    now = datetime.utcnow()
+    segment = Segment(
+        id=uuid.uuid4().hex,
+        source=source,
+        description=(description or '')[:255] or None,
+        created_by=created_by,
+        created_at=now,
+        expires_at=now + SEGMENT_TTL
+    )
+    db.session.add(segment)
+    db.session.flush()
+    return segment
+
+
+def _finish_segment(segment):
+    segment.candidate_count = db.session.query(func.count(SegmentMember.candidate_id))\
+        .filter(SegmentMember.segment_id == segment.id).scalar()
+    db.session.commit()
+    return segment
+
+
+def create_segment_from_query(query, source, description=None, created_by=None):
+    """
+    Materialize the candidate IDs selected by query into a new segment
+
+    Args:
+        query: Query or select() whose first column is candidate_id (duplicates allowed)
+        source: Where the segment came from (widget, dashboard_filter, ...)
+        description: Human-readable label shown in the UI
+        created_by: User id of the admin who created it
+
+    Returns: Segment
+    """
+    segment = _new_segment(source, description, created_by)
+
+    candidates = query.subquery()
+    candidate_col = list(candidates.c)[0]
+    rows = select(literal(segment.id), candidate_col)\
+        .where(candidate_col.isnot(None))\
+        .distinct()
+    db.session.execute(
+        insert(SegmentMember.__table__).from_select(['segment_id', 'candidate_id'], rows)
+    )
+
+    return _finish_segment(segment)
+
+
+def create_segment_from_ids(candidate_ids, source='candidate_ids', description=None, created_by=None):
+    """Save an explicit list of candidate IDs as a segment"""
+    segment = _new_segment(source, description, created_by)
+
+    unique_ids = {str(cid).strip() for cid in candidate_ids if cid and str(cid).strip()}
+    if unique_ids:
+        db.session.execute(
+            insert(SegmentMember.__table__),
+            [{'segment_id': segment.id, 'candidate_id': cid} for cid in unique_ids]
+        )
+
+    return _finish_segment(segment)
+
+
+def get_segment(segment_id):
+    """
+    Look up a live segment
+
+    Raises SegmentNotFound if the segment does not exist or has expired.
+    """
+    segment = db.session.get(Segment, segment_id) if segment_id else None
+    if not segment or segment.expires_at <= datetime.utcnow():
+        raise SegmentNotFound('Segment not found or expired')
+    return segment
+
+
+def segment_candidates(segment_id):
+    """Subquery of candidate IDs in a segment, for IN / JOIN against other tables"""
+    return select(SegmentMember.candidate_id).where(SegmentMember.segment_id == segment_id)
+
+
+def filter_by_segment(query, candidate_column, segment_id):
+    """Restrict a query to the candidates of a live segment by joining segment_member"""
+    get_segment(segment_id)
+    return query.join(
+        SegmentMember,
+        db.and_(SegmentMember.candidate_id == candidate_column, SegmentMember.segment_id == segment_id)
+    )
+
+
+def serialize_segment(segment):
+    return {
+        'segment_id': segment.id,
+        'source': segment.source,
+        'description': segment.description,
+        'count': segment.candidate_count,
+        'created_at': segment.created_at.isoformat() if segment.created_at else None,
+        'expires_at': segment.expires_at.isoformat() if segment.expires_at else None
+    }
+
+
+def cleanup_expired_segments():
+    """Delete expired segments and their members. Returns the number of segments removed."""
+    expired = select(Segment.id).where(Segment.expires_at <= datetime.utcnow())
+    SegmentMember.query.filter(SegmentMember.segment_id.in_(expired)).delete(synchronize_session=False)
+    deleted = Segment.query.filter(Segment.id.in_(expired)).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -22,11 +22,15 @@ def get_flask_app():
     """Get or create Flask app for database access"""
     from flask import Flask
     from config import Config
-    from models import db
+    from models import db, Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo
+    from dashboard_counters import register_counter_hooks
+    from response_cache import track_data_version
 
     app = Flask(__name__)
     app.config.from_object(Config)
     db.init_app(app)
+    register_counter_hooks()
+    track_data_version(Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo)
     return app
 
 
@@ -185,6 +189,77 @@ def cleanup_old_email_records():
         return {'deleted': deleted}
 
 
+@celery_app.task
+def cleanup_expired_segments_task():
+    """
+    Periodic task to delete expired saved segments.
+    Runs hourly via Celery Beat.
+    """
+    from segments import cleanup_expired_segments
+
+    app = get_flask_app()
+    with app.app_context():
+        deleted = cleanup_expired_segments()
+        if deleted:
+            logger.info(f"Cleaned up {deleted} expired segments")
+
+        return {'deleted': deleted}
+
+
+@celery_app.task
+def refresh_metric_rollups_task():
+    """
+    Periodic task to recount the recent submission/OTP/email time-series buckets.
+    Runs every minute via Celery Beat.
+    """
+    from metrics_rollup import refresh_metric_rollups
+
+    app = get_flask_app()
+    with app.app_context():
+        buckets = refresh_metric_rollups()
+        return {'buckets': buckets}
+
+
+def get_widget_snapshot_app():
+    """Flask app for widget snapshot refreshes, with their longer query time limit"""
+    app = get_flask_app()
+    app.config['WIDGET_QUERY_TIMEOUT'] = app.config['WIDGET_SNAPSHOT_QUERY_TIMEOUT']
+    return app
+
+
+@celery_app.task
+def refresh_widget_snapshots_task():
+    """
+    Periodic task to precompute the results of materialized widgets.
+    Runs every minute via Celery Beat; each widget refreshes at most every
+    refresh_interval seconds and only if the data changed.
+    """
+    from widget_snapshots import refresh_widget_snapshots
+
+    app = get_widget_snapshot_app()
+    with app.app_context():
+        counts = refresh_widget_snapshots()
+        if counts['refreshed'] or counts['failed']:
+            logger.info(f"Widget snapshots: {counts}")
+        return counts
+
+
+@celery_app.task
+def refresh_widget_snapshot_task(widget_id: int):
+    """Recompute one materialized widget's snapshot now (queued from the admin UI)"""
+    from models import Widget, WidgetSnapshot
+    from widget_snapshots import refresh_widget_snapshot, shared_data_version
+
+    app = get_widget_snapshot_app()
+    with app.app_context():
+        widget = Widget.query.get(widget_id)
+        if not widget or not widget.is_active or not widget.materialize:
+            return {'refreshed': False}
+        version = shared_data_version()
+        snapshot = refresh_widget_snapshot(widget, WidgetSnapshot.query.get(widget_id), version)
+        return {'refreshed': True, 'duration_ms': snapshot.duration_ms}
+
+
 @celery_app.task
 def send_bulk_emails_task(candidate_ids: list):
     """
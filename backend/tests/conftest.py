@@ -0,0 +1,93 @@
+"""
+Shared fixtures: one Flask app on a throwaway SQLite database, seeded once per session
+
+Config reads DATABASE_URL when it is imported, so the environment is set up
+before anything from the app is imported. Redis points at a closed port, so
+the caches fall back to their in-process stores.
+"""
+import os
+import random
+import tempfile
+import uuid
+
+_db_dir = tempfile.mkdtemp(prefix='vglug-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ['REDIS_URL'] = 'redis://127.0.0.1:1/0'
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from helpers import save_normalized_application
+from models import db, User
+
+# Applications seeded for the session
+SEED_APPLICATIONS = 60
+
+
+def seed_applications(count, seed=1):
+    """Submit `count` random applications through save_normalized_application"""
+    rnd = random.Random(seed)
+    for i in range(count):
+        payload = {
+            'basic_info': [
+                {'full_name': f'Applicant {i}'},
+                {'dob': f'200{rnd.randint(0, 6)}-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}'},
+                {'gender': rnd.choice(['Male', 'Female', 'Other'])},
+                {'email': f'applicant{i}@example.org'},
+                {'contact': f'98{i:08d}'},
+                {'has_laptop': rnd.random() < 0.5},
+                {'differently_abled': rnd.random() < 0.1}
+            ],
+            'educational_info': [
+                {'college_name': rnd.choice(['A College', 'B College', 'C College'])},
+                {'degree': rnd.choice(['B.E', 'B.Sc'])},
+                {'department': rnd.choice(['CSE', 'ECE', 'Maths'])},
+                {'year': rnd.choice(['1st Year', '2nd Year'])},
+                {'tamil_medium': rnd.random() < 0.5},
+                {'transport_mode': rnd.choice(['Bus', 'Bike'])},
+                {'received_scholarship': rnd.random() < 0.3}
+            ],
+            'family_info': [
+                {'family_environment': rnd.choice(['Joint', 'Nuclear'])},
+                {'family_members_count': rnd.randint(2, 6)},
+                {'earning_members_count': rnd.randint(0, 3)}
+            ],
+            'income_info': [
+                {'total_family_income': rnd.choice(['', '30,000', 'Rs. 75000', '1,20,000', '300000', None])},
+                {'house_ownership': rnd.choice(['Own', 'Rent'])},
+                {'district': rnd.choice(['Villupuram', 'Chennai', 'Cuddalore'])},
+                {'pincode': '605602'}
+            ],
+            'course_info': [
+                {'preferred_course': rnd.choice(['Python', 'Linux', 'Web'])},
+                {'heard_about_vglug': rnd.random() < 0.5}
+            ]
+        }
+        save_normalized_application(payload, f'CID2026{1001 + i:04d}', str(uuid.uuid4()))
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        admin = User(email='admin@example.org', role=User.ROLE_ADMIN)
+        admin.set_password('admin')
+        db.session.add(admin)
+        db.session.commit()
+        seed_applications(SEED_APPLICATIONS)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def auth_headers(app):
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@example.org').first()
+        token = create_access_token(identity=str(admin.id))
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,234 @@
+"""
+Differential tests: the analytics snapshot must answer widget configs exactly as SQL does
+
+Every config the snapshot answers is also run through execute_widget_sql_query
+and the results compared; configs it cannot reproduce must fall back (execute
+returns None) and still be answered by execute_widget_query through SQL.
+"""
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from sqlalchemy import select
+
+from analytics_snapshot import analytics_snapshot
+from models import db
+from widget_query_builder import (
+    TABLE_MODELS, ALLOWED_COLUMNS, ALLOWED_AGGREGATIONS, execute_widget_query, execute_widget_sql_query
+)
+
+# Random configs checked by test_random_configs_match_sql
+RANDOM_CONFIGS = 300
+
+# Operators drawn by random_widget_config, weighted towards the common ones
+RANDOM_OPERATORS = ['=', '=', '!=', '<', '>=', 'LIKE', 'NOT LIKE', 'IN', 'NOT IN', 'IS NULL', 'IS NOT NULL']
+
+
+def field(table, column, aggregation=None, alias=None, **options):
+    spec = {'table': table, 'column': column, 'alias': alias or column, **options}
+    if aggregation:
+        spec['aggregation'] = aggregation
+    return spec
+
+
+def count_by(table, column, **extra):
+    """COUNT(*) per value of one column"""
+    return {'data_source': {'base_table': table},
+            'fields': [field(table, column), field(table, 'id', 'COUNT', 'count')],
+            'group_by': [column], **extra}
+
+
+# Configs the snapshot evaluates itself, one per form of the config language
+ANSWERED = {
+    'plain rows': {'fields': [field('basic_info', 'candidate_id'), field('basic_info', 'gender')],
+                   'order_by': [{'column': 'candidate_id'}]},
+    'rows with limit': {'fields': [field('educational_info', 'candidate_id'), field('educational_info', 'college_name')],
+                        'order_by': [{'column': 'candidate_id', 'direction': 'DESC'}], 'limit': 7},
+    'count': {'fields': [field('application', 'id', 'COUNT', 'total')]},
+    'sum avg min max': {'fields': [field('family_info', 'family_members_count', 'SUM', 'total'),
+                                   field('family_info', 'earning_members_count', 'AVG', 'avg'),
+                                   field('family_info', 'family_members_count', 'MIN', 'low'),
+                                   field('family_info', 'family_members_count', 'MAX', 'high')]},
+    'group by string': count_by('basic_info', 'gender', order_by=[{'column': 'gender'}]),
+    'group by boolean': count_by('basic_info', 'has_laptop', order_by=[{'column': 'has_laptop', 'direction': 'DESC'}]),
+    'group by integer': count_by('family_info', 'family_members_count',
+                                 order_by=[{'column': 'family_members_count'}]),
+    'group by with nulls': count_by('income_info', 'total_family_income_amount',
+                                    order_by=[{'column': 'total_family_income_amount'}]),
+    'order by aggregate': count_by('educational_info', 'department',
+                                   order_by=[{'column': 'count', 'direction': 'DESC'}, {'column': 'department'}]),
+    'group by two columns': {
+        'data_source': {'base_table': 'basic_info', 'joins': ['educational_info']},
+        'fields': [field('basic_info', 'gender'), field('educational_info', 'degree'),
+                   field('basic_info', 'id', 'COUNT', 'count')],
+        'group_by': ['gender', 'degree'], 'order_by': [{'column': 'gender'}, {'column': 'degree'}]},
+    'aggregate across tables': {
+        'data_source': {'base_table': 'income_info', 'joins': ['family_info']},
+        'fields': [field('income_info', 'district'), field('family_info', 'family_members_count', 'MAX', 'largest')],
+        'group_by': ['district'], 'order_by': [{'column': 'district'}]},
+    'condition equals': count_by('basic_info', 'gender', conditions=[
+        {'table': 'basic_info', 'column': 'has_laptop', 'operator': '=', 'value': True}], order_by=[{'column': 'gender'}]),
+    'condition across tables': count_by('educational_info', 'college_name', conditions=[
+        {'table': 'basic_info', 'column': 'gender', 'operator': '=', 'value': 'Female'},
+        {'table': 'educational_info', 'column': 'tamil_medium', 'operator': '=', 'value': True}],
+        order_by=[{'column': 'college_name'}]),
+    'condition comparison': count_by('family_info', 'earning_members_count', conditions=[
+        {'table': 'family_info', 'column': 'family_members_count', 'operator': '>=', 'value': 4}],
+        order_by=[{'column': 'earning_members_count'}]),
+    'condition not equals': {'fields': [field('course_info', 'id', 'COUNT', 'n')], 'conditions': [
+        {'table': 'course_info', 'column': 'preferred_course', 'operator': '!=', 'value': 'Python'}]},
+    'condition like': {'fields': [field('educational_info', 'id', 'COUNT', 'n')], 'conditions': [
+        {'table': 'educational_info', 'column': 'college_name', 'operator': 'LIKE', 'value': 'a coll'}]},
+    'condition not like': {'fields': [field('educational_info', 'id', 'COUNT', 'n')], 'conditions': [
+        {'table': 'educational_info', 'column': 'department', 'operator': 'NOT LIKE', 'value': 'E'}]},
+    'condition in': count_by('income_info', 'district', conditions=[
+        {'table': 'income_info', 'column': 'district', 'operator': 'IN', 'value': 'Chennai,Villupuram'}],
+        order_by=[{'column': 'district'}]),
+    'condition not in': count_by('course_info', 'preferred_course', conditions=[
+        {'table': 'course_info', 'column': 'preferred_course', 'operator': 'NOT IN', 'value': ['Web']}],
+        order_by=[{'column': 'preferred_course'}]),
+    'condition is null': {'fields': [field('income_info', 'id', 'COUNT', 'n')], 'conditions': [
+        {'table': 'income_info', 'column': 'total_family_income_amount', 'operator': 'IS NULL'}]},
+    'condition is not null': {'fields': [field('income_info', 'total_family_income_amount', 'AVG', 'avg')], 'conditions': [
+        {'table': 'income_info', 'column': 'total_family_income_amount', 'operator': 'IS NOT NULL'}]},
+    'or conditions': {'fields': [field('basic_info', 'id', 'COUNT', 'n')], 'conditions': [
+        {'table': 'basic_info', 'column': 'gender', 'operator': '=', 'value': 'Male'},
+        {'logic': 'OR', 'table': 'basic_info', 'column': 'differently_abled', 'operator': '=', 'value': True}]},
+    'limit after grouping': count_by('educational_info', 'college_name',
+                                     order_by=[{'column': 'college_name', 'direction': 'DESC'}], limit=2),
+}
+
+# Configs the snapshot must hand back to SQL
+FALLBACK = {
+    'date transform': {
+        'fields': [field('application', 'created_at', alias='day', transform={'type': 'date_trunc', 'unit': 'day'}),
+                   field('application', 'id', 'COUNT', 'n')],
+        'group_by': ['application.created_at'], 'order_by': [{'column': 'day'}]},
+    'histogram transform': {
+        'fields': [field('family_info', 'family_members_count', alias='bucket',
+                         transform={'type': 'width_bucket', 'min': 2, 'max': 6, 'buckets': 2}),
+                   field('family_info', 'id', 'COUNT', 'n')],
+        'group_by': ['bucket'], 'order_by': [{'column': 'bucket'}]},
+    'limit without order by': {'fields': [field('basic_info', 'candidate_id')], 'limit': 3},
+    'time series': {'data_source': {'type': 'timeseries', 'metric': 'submissions', 'granularity': 'day', 'points': 7}},
+}
+
+
+def normalize_result(result, config):
+    """
+    Comparable form of a widget result: the rows as a multiset plus the
+    sequence of ORDER BY values, which both paths must agree on (rows tied on
+    every ORDER BY key may come back in any order)
+    """
+    aliases = {spec.get('alias', spec.get('column')) for spec in config.get('fields', [])}
+    order_aliases = [ob.get('column') for ob in config.get('order_by', []) if ob.get('column') in aliases]
+    rows = sorted(repr(sorted(row.items())) for row in result['data'])
+    ordering = [tuple(row[alias] for alias in order_aliases) for row in result['data']]
+    return result['row_count'], rows, ordering
+
+
+def widget_column_samples(per_column=12):
+    """A few stored values of every whitelisted widget column"""
+    samples = {}
+    for table, model in TABLE_MODELS.items():
+        for column in ALLOWED_COLUMNS[table]:
+            values = db.session.execute(select(getattr(model, column)).distinct().limit(per_column)).scalars().all()
+            samples[(table, column)] = [v for v in values if isinstance(v, (bool, int, str))]
+    return samples
+
+
+def random_widget_config(rnd, samples):
+    """
+    Random widget config over the whitelisted columns
+
+    Args:
+        rnd: random.Random
+        samples: {(table, column): [stored values]} to draw condition values from
+    """
+    columns = list(samples)
+    fields = []
+    aggregated = rnd.random() < 0.6
+    group_by = []
+    for i in range(rnd.randint(1, 3)):
+        table, column = rnd.choice(columns)
+        spec = {'table': table, 'column': column, 'alias': f'f{i}'}
+        if aggregated and i > 0 and (len(group_by) > 1 or rnd.random() < 0.7):
+            spec['aggregation'] = rnd.choice(ALLOWED_AGGREGATIONS)
+        elif aggregated:
+            group_by.append(f'f{i}')
+        fields.append(spec)
+
+    conditions = []
+    for _ in range(rnd.randint(0, 3)):
+        table, column = rnd.choice(columns)
+        operator = rnd.choice(RANDOM_OPERATORS)
+        values = samples[(table, column)] or [None]
+        value = rnd.choice(values)
+        if operator in ('IN', 'NOT IN'):
+            value = rnd.sample(values, min(len(values), rnd.randint(1, 3)))
+        elif operator in ('LIKE', 'NOT LIKE') and isinstance(value, str):
+            start = rnd.randint(0, len(value))
+            value = value[start:start + rnd.randint(1, 4)].upper()
+        conditions.append({'table': table, 'column': column, 'operator': operator, 'value': value})
+
+    order_by = [{'column': rnd.choice(fields)['alias'], 'direction': rnd.choice(['ASC', 'DESC'])}
+                for _ in range(rnd.randint(0, 2))]
+    return {
+        'data_source': {'base_table': fields[0]['table']},
+        'fields': fields,
+        'conditions': conditions,
+        'group_by': group_by,
+        'order_by': order_by,
+        'limit': rnd.choice([5, 50, 1000]),
+    }
+
+
+@pytest.fixture
+def snapshot(app):
+    with app.test_request_context():
+        analytics_snapshot.build()
+        yield analytics_snapshot
+
+
+@pytest.mark.parametrize('config', ANSWERED.values(), ids=ANSWERED.keys())
+def test_snapshot_matches_sql(snapshot, config):
+    result = snapshot.execute(config)
+    assert result is not None, 'the snapshot should answer this config'
+    expected = execute_widget_sql_query(config)
+    assert expected['row_count'] > 0
+    assert normalize_result(result, config) == normalize_result(expected, config)
+
+
+@pytest.mark.parametrize('config', FALLBACK.values(), ids=FALLBACK.keys())
+def test_unsupported_configs_fall_back_to_sql(app, snapshot, config):
+    assert snapshot.execute(config) is None
+    app.config['WIDGET_ANALYTICS_ENGINE'] = True
+    try:
+        assert 'data' in execute_widget_query(config)
+    finally:
+        app.config['WIDGET_ANALYTICS_ENGINE'] = False
+
+
+def test_random_configs_match_sql(snapshot):
+    rnd = random.Random(RANDOM_CONFIGS)
+    samples = widget_column_samples()
+    answered, mismatches = 0, []
+    for _ in range(RANDOM_CONFIGS):
+        config = random_widget_config(rnd, samples)
+        result = snapshot.execute(config)
+        if result is None:
+            continue
+        answered += 1
+        try:
+            expected = execute_widget_sql_query(config)
+        except ValueError:
+            db.session.rollback()
+            mismatches.append(config)
+            continue
+        if normalize_result(result, config) != normalize_result(expected, config):
+            mismatches.append(config)
+    assert not mismatches
+    # Most random configs are within what the snapshot reproduces
+    assert answered > RANDOM_CONFIGS // 2
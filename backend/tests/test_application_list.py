@@ -0,0 +1,86 @@
+"""Statements issued per page of /admin/applications"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+import pagination
+from models import db
+
+
+@contextmanager
+def recorded_statements(app):
+    """Collect the SQL of every statement executed on the app's engine"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _list_statements(statements):
+    """Statements reading the application list (the auth decorator's user lookup excluded)"""
+    return [s for s in statements if 'FROM application' in s]
+
+
+@pytest.fixture(autouse=True)
+def clear_count_cache():
+    pagination._count_cache.clear()
+
+
+@pytest.mark.parametrize('query', [
+    '',
+    '&fields=full_name,status',
+    '&fields=created_at&sort_by=full_name&sort_order=asc',
+])
+def test_one_row_query_per_page_plus_cached_count(app, client, auth_headers, query):
+    with recorded_statements(app) as statements:
+        response = client.get(f'/admin/applications?per_page=20{query}', headers=auth_headers)
+    assert response.status_code == 200
+    first_page = response.get_json()
+    assert len(first_page['applications']) == 20
+
+    # First page: the row query and the COUNT behind the estimated total
+    reads = _list_statements(statements)
+    assert len(reads) == 2
+    assert sum('count(' in s.lower() for s in reads) == 1
+
+    # Later pages reuse the cached count
+    for _ in range(2):
+        with recorded_statements(app) as statements:
+            response = client.get(f"/admin/applications?per_page=20{query}&cursor={first_page['next_cursor']}",
+                                  headers=auth_headers)
+        assert response.status_code == 200
+        reads = _list_statements(statements)
+        assert len(reads) == 1
+        assert 'count(' not in reads[0].lower()
+        # Lookup of the requesting user, then the page
+        assert len(statements) == 2
+
+
+def test_fields_narrow_the_projection(app, client, auth_headers):
+    with recorded_statements(app) as statements:
+        response = client.get('/admin/applications?per_page=5&fields=full_name', headers=auth_headers)
+    assert response.status_code == 200
+    for row in response.get_json()['applications']:
+        assert set(row) == {'id', 'candidate_id', 'basic_info'}
+        assert set(row['basic_info']) == {'full_name'}
+
+    row_query = next(s for s in _list_statements(statements) if 'count(' not in s.lower())
+    select_list = row_query.split(' FROM ')[0]
+    assert 'basic_info.full_name' in select_list
+    assert 'basic_info.email' not in select_list
+    assert 'application.status' not in select_list
+
+
+def test_unknown_fields_are_rejected(client, auth_headers):
+    response = client.get('/admin/applications?fields=full_name,password', headers=auth_headers)
+    assert response.status_code == 400
+    assert 'password' in response.get_json()['msg']
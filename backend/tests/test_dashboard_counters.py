@@ -0,0 +1,45 @@
+"""The dashboard_counter rollup against the live dashboard statistics"""
+import uuid
+
+from sqlalchemy import select, func
+
+from dashboard_counters import rebuild_dashboard_counters
+from dashboard_stats import INCOME_RANGES, compute_dashboard_stats, counter_dimension, DISTRIBUTIONS
+from helpers import save_normalized_application
+from models import db, DashboardCounter, IncomeInfo
+
+
+def _income_buckets():
+    return db.session.scalar(
+        select(func.count()).select_from(DashboardCounter)
+        .where(DashboardCounter.dimension == counter_dimension(DISTRIBUTIONS['income'][0]))
+    )
+
+
+def test_rollup_matches_live_stats_through_writes(app):
+    with app.app_context():
+        for step, income in enumerate(IncomeInfo.query.order_by(IncomeInfo.id).limit(20)):
+            income.total_family_income = str(10000 + step * 23456)
+        db.session.commit()
+
+        rebuild_dashboard_counters()
+        assert compute_dashboard_stats() == compute_dashboard_stats(live=True)
+        # One bucket per income range (plus unknown incomes), however many distinct amounts exist
+        assert db.session.scalar(select(func.count(func.distinct(IncomeInfo.total_family_income_amount)))) > 20
+        assert _income_buckets() <= len(INCOME_RANGES) + 1
+
+        # Move incomes across ranges and within one range
+        rows = IncomeInfo.query.order_by(IncomeInfo.id).limit(3).all()
+        rows[0].total_family_income = '4,50,000'
+        rows[1].total_family_income = '12000'
+        rows[2].total_family_income = str((rows[2].total_family_income_amount or 0) + 1)
+        db.session.commit()
+        # A new application with an amount no one had before
+        save_normalized_application({
+            'basic_info': [{'full_name': 'Counter Test'}, {'dob': '2004-02-02'}, {'gender': 'Female'},
+                           {'email': 'counter@example.org'}, {'contact': '9000000000'}],
+            'income_info': [{'total_family_income': '77,777'}, {'district': 'Chennai'}],
+        }, 'CID20269999', str(uuid.uuid4()))
+
+        assert compute_dashboard_stats() == compute_dashboard_stats(live=True)
+        assert _income_buckets() <= len(INCOME_RANGES) + 1
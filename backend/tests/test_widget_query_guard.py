@@ -0,0 +1,159 @@
+"""The widget query guard: timeout, cancellation and busy reports, statement_timeout handling"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+import widget_query_builder
+import widget_query_guard
+from models import db
+from widget_query_guard import QUERY_ID_HEADER, guarded_query, expensive_parts
+
+RESET = 'SET LOCAL statement_timeout = DEFAULT'
+
+
+class PostgresConnection:
+    """The session's connection, reporting the PostgreSQL dialect and recording driver SQL"""
+
+    class dialect:
+        name = 'postgresql'
+
+    def __init__(self, connection):
+        self.connection = connection.connection
+        self.statements = []
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def pg_connection(app, monkeypatch):
+    with app.test_request_context():
+        connection = PostgresConnection(db.session.connection())
+        monkeypatch.setattr(db.session, 'connection', lambda: connection)
+        yield connection
+        monkeypatch.undo()
+        db.session.rollback()
+
+
+def test_timeout_reset_after_the_query(pg_connection):
+    with guarded_query({}):
+        pass
+    assert pg_connection.statements[0].startswith('SET LOCAL statement_timeout = ')
+    assert pg_connection.statements[-1] == RESET
+
+
+def test_timeout_reset_when_the_caller_raises(pg_connection):
+    with pytest.raises(KeyError):
+        with guarded_query({}):
+            raise KeyError('rows')
+    assert pg_connection.statements[-1] == RESET
+
+
+def test_no_reset_in_a_failed_transaction(pg_connection):
+    with pytest.raises(DBAPIError):
+        with guarded_query({}):
+            raise DBAPIError('SELECT 1', {}, Exception('division by zero'))
+    assert RESET not in pg_connection.statements
+
+
+def count_by(table, column, transform=None):
+    group = {'table': table, 'column': column, 'alias': 'value'}
+    if transform:
+        group['transform'] = transform
+    return {'data_source': {'base_table': table},
+            'fields': [group, {'table': table, 'column': 'id', 'aggregation': 'COUNT', 'alias': 'count'}],
+            'group_by': ['value']}
+
+
+def test_expensive_parts_of_a_grouped_config():
+    # A low-cardinality group is not a reason; with no conditions the whole scan is
+    assert [part['part'] for part in expensive_parts(count_by('basic_info', 'gender'))] == ['query']
+
+
+def test_expensive_parts_names_a_high_cardinality_group():
+    for config in (count_by('basic_info', 'dob'), {**count_by('basic_info', 'dob'), 'group_by': ['basic_info.dob']}):
+        parts = expensive_parts(config)
+        assert parts[0]['part'] == 'group_by'
+        assert parts[0]['column'] == 'basic_info.dob'
+
+
+def test_expensive_parts_of_a_transformed_group():
+    # Ages and days bucket the values, so the group is not one per applicant
+    for config in (count_by('basic_info', 'dob', {'type': 'age'}),
+                   count_by('application', 'created_at', {'type': 'date_trunc', 'unit': 'day'})):
+        assert [part['part'] for part in expensive_parts(config)] == ['query']
+
+
+def test_expensive_parts_lists_like_conditions_and_joins():
+    config = count_by('basic_info', 'dob')
+    config['conditions'] = [
+        {'table': 'educational_info', 'column': 'college_name', 'operator': 'LIKE', 'value': 'coll'},
+        {'table': 'family_info', 'column': 'family_members_count', 'operator': '>', 'value': 2},
+        {'table': 'income_info', 'column': 'district', 'operator': '=', 'value': 'Chennai'},
+    ]
+    parts = expensive_parts(config)
+    assert [part['part'] for part in parts] == ['conditions', 'group_by', 'joins']
+    assert parts[0]['index'] == 0
+    assert parts[2]['tables'] == ['educational_info', 'family_info', 'income_info']
+
+
+# Runs for tens of seconds on SQLite unless the guard interrupts it
+SLOW_QUERY = text('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) '
+                  'SELECT count(*) FROM n')
+
+
+@pytest.fixture
+def slow_widget_query(monkeypatch):
+    """Make every widget statement the slow query"""
+    monkeypatch.setattr(widget_query_builder, 'execute_widget_statement', lambda stmt: db.session.execute(SLOW_QUERY))
+
+
+def preview(client, headers, config, query_id=None):
+    if query_id:
+        headers = {**headers, QUERY_ID_HEADER: query_id}
+    return client.post('/admin/widgets/preview', json={'config_json': config}, headers=headers)
+
+
+def test_timeout_reports_the_expensive_parts(app, client, auth_headers, slow_widget_query, monkeypatch):
+    monkeypatch.setitem(app.config, 'WIDGET_QUERY_TIMEOUT', 0.3)
+    started = time.monotonic()
+    response = preview(client, auth_headers, count_by('basic_info', 'dob'))
+    assert time.monotonic() - started < 5
+    assert response.status_code == 504
+    body = response.get_json()
+    assert body['error'] == 'timeout'
+    assert body['msg'] == 'Query took longer than 0.3 seconds'
+    assert [part['part'] for part in body['expensive']] == ['group_by']
+    assert body['expensive'][0]['column'] == 'basic_info.dob'
+
+
+def test_cancelled_query_reports_409(app, client, auth_headers, slow_widget_query):
+    query_id = 'guard-test-cancel'
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(
+        preview(app.test_client(), auth_headers, count_by('basic_info', 'gender'), query_id)))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while query_id not in widget_query_guard._running and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    cancel = client.post(f'/admin/widgets/queries/{query_id}/cancel', headers=auth_headers)
+    thread.join(5)
+    assert cancel.status_code == 202
+    assert cancel.get_json()['running_here'] is True
+    assert not thread.is_alive()
+    assert responses[0].status_code == 409
+    assert responses[0].get_json()['error'] == 'cancelled'
+
+
+def test_busy_when_no_slot_frees_up(client, auth_headers, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(widget_query_guard, '_slots', slots)
+    monkeypatch.setattr(widget_query_guard, 'QUEUE_TIMEOUT', 0.05)
+    response = preview(client, auth_headers, count_by('basic_info', 'has_laptop'))
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'busy'
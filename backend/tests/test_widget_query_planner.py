@@ -0,0 +1,114 @@
+"""Join pruning, inner-join promotion and segment conditions of the widget planner"""
+import re
+
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db
+from widget_query_builder import execute_widget_sql_query, build_widget_segment_candidate_query
+from widget_query_planner import plan_widget_query, plan_candidate_query, build_rows_select, build_candidate_select
+
+DIALECTS = [pytest.param(sqlite.dialect(), id='sqlite'), pytest.param(postgresql.dialect(), id='postgresql')]
+
+# Every other table listed, so anything the planner keeps is its own decision
+ALL_JOINS = ['application', 'educational_info', 'family_info', 'income_info', 'course_info']
+
+
+def joins(stmt, dialect):
+    """{table: 'INNER' or 'LEFT'} of the joins in a compiled statement"""
+    sql = str(stmt.compile(dialect=dialect))
+    return {table: 'LEFT' if outer else 'INNER' for outer, table in re.findall(r'(LEFT OUTER )?JOIN (\w+) ON', sql)}
+
+
+def widget(conditions=(), group_by=(), fields=None):
+    return {
+        'data_source': {'base_table': 'basic_info', 'joins': ALL_JOINS},
+        'fields': fields or [{'table': 'basic_info', 'column': 'gender'},
+                             {'table': 'basic_info', 'column': 'id', 'aggregation': 'COUNT', 'alias': 'count'}],
+        'conditions': list(conditions),
+        'group_by': list(group_by) or ['gender'],
+    }
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_unused_joins_are_pruned(dialect):
+    config = widget()
+    assert joins(build_rows_select(plan_widget_query(config)), dialect) == {}
+    assert joins(build_candidate_select(plan_candidate_query(config)), dialect) == {}
+    assert joins(build_candidate_select(plan_candidate_query(config, 'gender', 'Male')), dialect) == {}
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_null_rejecting_condition_inner_joins(dialect):
+    config = widget(conditions=[
+        {'table': 'educational_info', 'column': 'degree', 'operator': '=', 'value': 'B.E'},
+        {'table': 'income_info', 'column': 'district', 'operator': 'LIKE', 'value': 'pur'},
+    ])
+    expected = {'educational_info': 'INNER', 'income_info': 'INNER'}
+    assert joins(build_rows_select(plan_widget_query(config)), dialect) == expected
+    assert joins(build_candidate_select(plan_candidate_query(config)), dialect) == expected
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_is_null_condition_keeps_left_join(dialect):
+    config = widget(conditions=[
+        {'table': 'income_info', 'column': 'total_family_income_amount', 'operator': 'IS NULL'},
+        {'table': 'family_info', 'column': 'family_environment', 'operator': '=', 'value': None},
+        {'table': 'course_info', 'column': 'preferred_course', 'operator': 'NOT IN', 'value': []},
+    ])
+    expected = {'family_info': 'LEFT', 'income_info': 'LEFT', 'course_info': 'LEFT'}
+    assert joins(build_rows_select(plan_widget_query(config)), dialect) == expected
+    assert joins(build_candidate_select(plan_candidate_query(config)), dialect) == expected
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_group_by_table_column_keeps_its_join(dialect):
+    config = widget(group_by=['educational_info.degree'],
+                    fields=[{'table': 'basic_info', 'column': 'id', 'aggregation': 'COUNT', 'alias': 'count'}])
+    assert joins(build_rows_select(plan_widget_query(config)), dialect) == {'educational_info': 'LEFT'}
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_segment_candidates_join_only_the_segment_table(dialect):
+    config = widget(conditions=[{'table': 'family_info', 'column': 'family_members_count', 'operator': '>', 'value': 3}])
+    # degree is not a field, so the segment resolves through data_source.joins
+    assert joins(build_candidate_select(plan_candidate_query(config, 'degree', 'B.Sc')), dialect) == {
+        'educational_info': 'INNER', 'family_info': 'INNER'}
+    # The segment of missing values keeps its rows NULL-padded
+    assert joins(build_candidate_select(plan_candidate_query(config, 'degree', None)), dialect) == {
+        'educational_info': 'LEFT', 'family_info': 'INNER'}
+
+
+TRANSFORMED_WIDGETS = {
+    'age': ('basic_info', 'dob', {'type': 'age'}),
+    'width_bucket': ('family_info', 'family_members_count', {'type': 'width_bucket', 'min': 2, 'max': 6, 'buckets': 2}),
+    'date_trunc': ('application', 'created_at', {'type': 'date_trunc', 'unit': 'day'}),
+}
+
+
+@pytest.mark.parametrize('table, column, transform', TRANSFORMED_WIDGETS.values(), ids=TRANSFORMED_WIDGETS.keys())
+def test_segment_of_a_transformed_field(app, table, column, transform):
+    config = {
+        'data_source': {'base_table': table},
+        'fields': [{'table': table, 'column': column, 'alias': 'bucket', 'transform': transform},
+                   {'table': table, 'column': 'id', 'aggregation': 'COUNT', 'alias': 'count'}],
+        'group_by': ['bucket'],
+    }
+    with app.app_context():
+        rows = execute_widget_sql_query(config)['data']
+        assert rows
+        for row in rows:
+            # The chart hands the value back as JSON, or as text from a URL
+            values = [row['bucket'], str(row['bucket'])]
+            if transform['type'] == 'date_trunc':
+                # As PostgreSQL returns it, and any instant within the day
+                values += [row['bucket'] + '+00:00', row['bucket'][:10] + 'T13:45:00']
+            for value in values:
+                candidates = db.session.execute(build_widget_segment_candidate_query(config, 'bucket', value)).all()
+                assert len(candidates) == row['count']
+
+
+def test_invalid_segment_value_of_a_transformed_field():
+    config = {'fields': [{'table': 'basic_info', 'column': 'dob', 'alias': 'age', 'transform': {'type': 'age'}}]}
+    with pytest.raises(ValueError, match='Invalid segment value'):
+        plan_candidate_query(config, 'age', 'twenty')
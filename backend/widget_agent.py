@@ -7,6 +7,8 @@ import json
 import re
 import requests
 
+from widget_bulk import WIDGET_TYPES
+
 # Schema information for the LLM
 SCHEMA_INFO = """
 Available Tables and Columns:
@@ -67,8 +69,16 @@ Available Tables and Columns:
    - heard_about_vglug (boolean): Whether heard about VGLUG
    - participated_in_vglug_events (boolean): Whether participated in VGLUG events before
 
-Allowed Aggregations: COUNT, SUM, AVG, MIN, MAX
+Allowed Aggregations: COUNT, SUM, AVG, MIN, MAX, PERCENTILE
 Allowed Operators: =, !=, <, >, <=, >=, LIKE, NOT LIKE, IN, NOT IN, IS NULL, IS NOT NULL
+
+Field Transforms (optional "transform" on a field, computed in the database):
+   - {"type": "date_trunc", "unit": "hour"|"day"|"week"|"month"}: date/datetime columns, e.g. application.created_at per day
+   - {"type": "age"}: basic_info.dob as age in whole years
+   - {"type": "width_bucket", "min": 0, "max": 10, "buckets": 5}: integer columns as histogram bucket numbers
+     (1 to buckets; 0 below min, buckets + 1 from max)
+PERCENTILE takes a "percentile" fraction on the field (0.5 = median, the default), e.g. the 90th
+percentile of family_info.family_members_count is "aggregation": "PERCENTILE", "percentile": 0.9
 """
 
 SYSTEM_PROMPT = f"""You are a widget configuration generator for a VGLUG application form admin dashboard.
@@ -92,7 +102,9 @@ Widget Configuration Structure:
         "table": "table_name",
         "column": "column_name",
         "alias": "display_name",
-        "aggregation": null|"COUNT"|"SUM"|"AVG"|"MIN"|"MAX"
+        "aggregation": null|"COUNT"|"SUM"|"AVG"|"MIN"|"MAX"|"PERCENTILE",
+        "transform": {{"type": "date_trunc", "unit": "day"}},  // Optional, see Field Transforms
+        "percentile": 0.9  // Only with PERCENTILE
       }}
     ],
     "conditions": [
@@ -137,6 +149,17 @@ Guidelines:
 6. Choose appropriate widget_type based on the query intent
 7. Set appropriate width based on data complexity
 8. The chart_config name_field and value_field must EXACTLY match the aliases in the fields array
+9. For trends over time and histograms, transform the label field and group by it, so the database
+   does the bucketing. Example for submissions per day (line chart):
+   "fields": [
+     {{"table": "application", "column": "created_at", "alias": "day", "aggregation": null,
+       "transform": {{"type": "date_trunc", "unit": "day"}}}},
+     {{"table": "application", "column": "id", "alias": "count", "aggregation": "COUNT"}}
+   ],
+   "group_by": ["application.created_at"],
+   "order_by": [{{"column": "day", "direction": "ASC"}}]
+   For an age distribution use {{"table": "basic_info", "column": "dob", "alias": "age", "transform": {{"type": "age"}}}}
+   grouped by "basic_info.dob"; for the average age use the same field with "aggregation": "AVG"
 
 IMPORTANT: Return ONLY valid JSON, no explanations or markdown code blocks.
 """
@@ -262,11 +285,10 @@ def parse_llm_response(content: str) -> dict:
                 }
 
         # Validate widget_type
-        valid_types = ['pie', 'bar', 'line', 'number', 'table']
-        if config['widget_type'] not in valid_types:
+        if config['widget_type'] not in WIDGET_TYPES:
             return {
                 'success': False,
-                'error': f'Invalid widget_type. Must be one of: {valid_types}'
+                'error': f'Invalid widget_type. Must be one of: {WIDGET_TYPES}'
             }
 
         return {
@@ -0,0 +1,164 @@
+"""
+Bulk widget writes - reorder, create and update many widgets per request
+
+Reordering sets every position with one UPDATE ... SET position = CASE id
+WHEN ... END. Bulk saves validate every item first (config included, through
+the query builder) and only then write them all in one transaction, where the
+session flush batches the INSERTs and UPDATEs into executemany calls.
+"""
+from sqlalchemy import select, update, case, func
+
+from models import db, Widget
+from widget_query_builder import validate_widget_config
+from widget_snapshots import MIN_REFRESH_INTERVAL
+
+# Widget types the dashboard can render; every widget write validates against this list
+WIDGET_TYPES = ['pie', 'bar', 'line', 'number', 'table']
+
+# Most widgets one bulk request may reorder, create or update
+MAX_BULK_WIDGETS = 100
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def reorder_widget_positions(positions):
+    """
+    Set many widget positions with a single UPDATE
+
+    Args:
+        positions: [{'id': int, 'position': int}]; a repeated id takes its last position
+
+    Returns: one {'id', 'position', 'status'} per entry, in order, with 'msg'
+    for entries that were not applied (status 400 or 404)
+    """
+    wanted = {}
+    for item in positions:
+        if isinstance(item, dict) and _is_int(item.get('id')) and _is_int(item.get('position')):
+            wanted[item['id']] = item['position']
+
+    existing = set(db.session.scalars(select(Widget.id).where(Widget.id.in_(list(wanted))))) if wanted else set()
+    if existing:
+        db.session.execute(
+            update(Widget)
+            .where(Widget.id.in_(existing))
+            .values(position=case({widget_id: wanted[widget_id] for widget_id in existing}, value=Widget.id)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+    results = []
+    for item in positions:
+        widget_id = item.get('id') if isinstance(item, dict) else None
+        position = item.get('position') if isinstance(item, dict) else None
+        if not (_is_int(widget_id) and _is_int(position)):
+            results.append({'id': widget_id, 'position': position, 'status': 400,
+                            'msg': 'id and position must be integers'})
+        elif widget_id not in existing:
+            results.append({'id': widget_id, 'position': position, 'status': 404, 'msg': 'Widget not found'})
+        else:
+            results.append({'id': widget_id, 'position': position, 'status': 200})
+    return results
+
+
+def _widget_fields(item, creating):
+    """
+    Validated widget columns set by one bulk item
+
+    Raises ValueError naming the first invalid field.
+    """
+    if creating:
+        for field in ('title', 'widget_type', 'config_json'):
+            if field not in item:
+                raise ValueError(f'{field} is required')
+
+    fields = {}
+    if 'title' in item:
+        if not isinstance(item['title'], str) or not item['title'].strip():
+            raise ValueError('title must be a non-empty string')
+        fields['title'] = item['title']
+    if 'description' in item:
+        fields['description'] = item['description']
+    if 'widget_type' in item:
+        if item['widget_type'] not in WIDGET_TYPES:
+            raise ValueError(f'Invalid widget_type. Must be one of: {WIDGET_TYPES}')
+        fields['widget_type'] = item['widget_type']
+    if 'config_json' in item:
+        validate_widget_config(item['config_json'])
+        fields['config_json'] = item['config_json']
+    if 'position' in item:
+        if not _is_int(item['position']):
+            raise ValueError('position must be an integer')
+        fields['position'] = item['position']
+    if 'width' in item:
+        fields['width'] = item['width']
+    for flag in ('is_active', 'materialize'):
+        if flag in item:
+            fields[flag] = bool(item[flag])
+    if 'refresh_interval' in item:
+        interval = item['refresh_interval']
+        if interval is not None and (not _is_int(interval) or interval < MIN_REFRESH_INTERVAL):
+            raise ValueError(f'refresh_interval must be at least {MIN_REFRESH_INTERVAL} seconds')
+        fields['refresh_interval'] = interval
+    return fields
+
+
+def save_widgets(items, user_id):
+    """
+    Create (items without id) or update (items with id) many widgets in one transaction
+
+    Every item is validated before anything is written; if any item is
+    invalid or names an unknown widget, nothing is saved. New widgets without
+    a position go after the last active widget, in list order.
+
+    Args:
+        items: [{'id'?, 'title', 'widget_type', 'config_json', ...}]
+        user_id: Admin creating the new widgets
+
+    Returns: (results, saved) with one {'index', 'id', 'status'} per item, in
+    order: status 201 created, 200 updated, or 400/404 with 'msg'
+    """
+    ids = [item['id'] for item in items if isinstance(item, dict) and _is_int(item.get('id'))]
+    existing = {w.id: w for w in Widget.query.filter(Widget.id.in_(ids)).all()} if ids else {}
+
+    results = []
+    changes = []
+    for index, item in enumerate(items):
+        widget_id = item.get('id') if isinstance(item, dict) else None
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Each widget must be an object')
+            if widget_id is not None and not _is_int(widget_id):
+                raise ValueError('id must be an integer')
+            widget = existing.get(widget_id) if widget_id is not None else None
+            if widget_id is not None and widget is None:
+                results.append({'index': index, 'id': widget_id, 'status': 404, 'msg': 'Widget not found'})
+                continue
+            changes.append((index, widget, _widget_fields(item, creating=widget is None)))
+            results.append({'index': index, 'id': widget_id, 'status': 200 if widget else 201})
+        except ValueError as e:
+            results.append({'index': index, 'id': widget_id, 'status': 400, 'msg': str(e)})
+
+    if any(result['status'] >= 400 for result in results):
+        return results, False
+
+    next_position = (db.session.query(func.max(Widget.position)).filter_by(is_active=True).scalar() or 0) + 1
+    created = []
+    for index, widget, fields in changes:
+        if widget is None:
+            if 'position' not in fields:
+                fields['position'] = next_position
+                next_position += 1
+            widget = Widget(created_by=user_id, **fields)
+            db.session.add(widget)
+            created.append((index, widget))
+        else:
+            for name, value in fields.items():
+                setattr(widget, name, value)
+
+    db.session.flush()
+    for index, widget in created:
+        results[index]['id'] = widget.id
+    db.session.commit()
+    return results, True
@@ -0,0 +1,168 @@
+"""
+Widget query profiling - which widget makes the dashboard slow
+
+Every widget query execution (execute_widget_query) is recorded in a bounded
+ring buffer: the engine that answered it, the generated SQL and parameters,
+the time spent planning/building the statement and executing it, the row
+count and any error. EXPLAIN output is captured on demand by
+explain_widget_statement (ANALYZE, BUFFERS on PostgreSQL).
+
+The buffer is a Redis list shared by every worker when Redis is reachable,
+and an in-process deque otherwise. Entries carry the widget_config_hash of the
+config they ran, which is how they are matched to saved widgets.
+"""
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from models import db
+from response_cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Most recent executions kept
+PROFILE_BUFFER_SIZE = 500
+
+PROFILE_KEY = 'vglug:widget_profile'
+
+_local_buffer = deque(maxlen=PROFILE_BUFFER_SIZE)
+_local_lock = threading.Lock()
+
+
+def statement_sql(stmt):
+    """SQL text and JSON-safe parameters of a statement in the session's dialect"""
+    compiled = stmt.compile(dialect=db.session.get_bind().dialect, compile_kwargs={'render_postcompile': True})
+    params = json.loads(json.dumps(compiled.params, default=str))
+    return str(compiled), params
+
+
+def record_widget_execution(config_hash, engine, total_ms, row_count=None, sql=None, params=None,
+                            build_ms=None, execute_ms=None, error=None, explain=None):
+    """
+    Add one widget query execution to the profile buffer
+
+    Args:
+        config_hash: widget_config_hash of the config run (None if it could not be hashed)
+        engine: 'sql', 'fused' (one GROUPING SETS statement for several widgets),
+            'snapshot' (analytics_snapshot) or 'timeseries'
+        total_ms: Wall time of the whole execution
+        row_count: Rows returned
+        sql, params: Generated SQL and its parameters (SQL engine)
+        build_ms: Time planning and building the statement
+        execute_ms: Time executing it and fetching the rows
+        error: Error message if the query failed
+        explain: EXPLAIN output lines, when captured
+
+    Returns: the recorded entry
+    """
+    entry = {
+        'config_hash': config_hash,
+        'engine': engine,
+        'total_ms': round(total_ms, 2),
+        'build_ms': round(build_ms, 2) if build_ms is not None else None,
+        'execute_ms': round(execute_ms, 2) if execute_ms is not None else None,
+        'row_count': row_count,
+        'sql': sql,
+        'params': params,
+        'error': error,
+        'explain': explain,
+        'recorded_at': datetime.utcnow().isoformat()
+    }
+    client = get_redis()
+    if client is not None:
+        try:
+            raw = json.dumps(entry, default=str)
+            client.pipeline().lpush(PROFILE_KEY, raw).ltrim(PROFILE_KEY, 0, PROFILE_BUFFER_SIZE - 1).execute()
+            return entry
+        except Exception as e:
+            logger.warning(f"Could not record widget profile: {str(e)}")
+    with _local_lock:
+        _local_buffer.appendleft(entry)
+    return entry
+
+
+def recent_executions(config_hash=None, limit=PROFILE_BUFFER_SIZE):
+    """
+    Recorded executions, newest first
+
+    Args:
+        config_hash: Only executions of this config
+        limit: Most entries returned
+    """
+    entries = None
+    client = get_redis()
+    if client is not None:
+        try:
+            entries = [json.loads(raw) for raw in client.lrange(PROFILE_KEY, 0, -1)]
+        except Exception as e:
+            logger.warning(f"Could not read widget profiles: {str(e)}")
+    if entries is None:
+        with _local_lock:
+            entries = list(_local_buffer)
+    if config_hash is not None:
+        entries = [entry for entry in entries if entry['config_hash'] == config_hash]
+    return entries[:limit]
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize_executions(entries):
+    """
+    Timing statistics per config over a list of executions
+
+    Returns: {config_hash: {'executions', 'errors', 'total_ms', 'avg_ms',
+    'p95_ms', 'max_ms', 'avg_rows', 'last_at', 'engines'}}
+    """
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry['config_hash'], []).append(entry)
+
+    summary = {}
+    for config_hash, group in groups.items():
+        times = sorted(entry['total_ms'] for entry in group)
+        rows = [entry['row_count'] for entry in group if entry['row_count'] is not None]
+        summary[config_hash] = {
+            'executions': len(group),
+            'errors': sum(1 for entry in group if entry['error']),
+            'total_ms': round(sum(times), 2),
+            'avg_ms': round(sum(times) / len(times), 2),
+            'p95_ms': _percentile(times, 0.95),
+            'max_ms': times[-1],
+            'avg_rows': round(sum(rows) / len(rows), 1) if rows else None,
+            'last_at': max(entry['recorded_at'] for entry in group),
+            'engines': sorted({entry['engine'] for entry in group})
+        }
+    return summary
+
+
+def explain_widget_statement(stmt):
+    """
+    EXPLAIN output of a widget statement, one line per item
+
+    PostgreSQL runs EXPLAIN (ANALYZE, BUFFERS), which executes the query;
+    SQLite reports EXPLAIN QUERY PLAN. Run it inside guarded_query.
+    """
+    connection = db.session.connection()
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+    elif dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+
+    # compiled.positiontup orders the parameters for positional paramstyles (sqlite's qmark)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    rows = connection.exec_driver_sql(prefix + str(compiled), params).all()
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [' '.join(str(value) for value in row) for row in rows]
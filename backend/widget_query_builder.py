@@ -1,40 +1,60 @@
 """
 Widget Query Builder - Safe dynamic query generation for custom widgets
 """
-from sqlalchemy import func, desc, asc, and_, or_
-from models import db, Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo
-
-# Mapping of table names to model classes
-TABLE_MODELS = {
-    'application': Application,
-    'basic_info': BasicInfo,
-    'educational_info': EducationalInfo,
-    'family_info': FamilyInfo,
-    'income_info': IncomeInfo,
-    'course_info': CourseInfo
-}
-
-# Allowed columns per table (whitelist for security)
-ALLOWED_COLUMNS = {
-    'application': ['id', 'candidate_id', 'status', 'created_at', 'updated_at'],
-    'basic_info': ['id', 'candidate_id', 'full_name', 'gender', 'dob', 'email', 'contact',
-                   'differently_abled', 'has_laptop', 'laptop_ram', 'laptop_processor',
-                   'considered', 'selected', 'shortlisted', 'contact_as_whatsapp',
-                   'appeared_for_one_to_one'],
-    'educational_info': ['id', 'candidate_id', 'college_name', 'degree', 'department', 'year',
-                        'tamil_medium', 'six_to_8_govt_school', 'nine_to_10_govt_school',
-                        'eleven_to_12_govt_school', 'received_scholarship', 'transport_mode',
-                        'vglug_applied_before', 'present_work'],
-    'family_info': ['id', 'candidate_id', 'family_environment', 'single_parent_info',
-                   'family_members_count', 'earning_members_count'],
-    'income_info': ['id', 'candidate_id', 'total_family_income', 'house_ownership',
-                   'district', 'pincode', 'own_land_size'],
-    'course_info': ['id', 'candidate_id', 'preferred_course', 'heard_about_vglug',
-                   'participated_in_vglug_events']
-}
-
-ALLOWED_AGGREGATIONS = ['COUNT', 'SUM', 'AVG', 'MIN', 'MAX']
-ALLOWED_OPERATORS = ['=', '!=', '<', '>', '<=', '>=', 'LIKE', 'NOT LIKE', 'IN', 'NOT IN', 'IS NULL', 'IS NOT NULL']
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, func
+from sqlalchemy.util import LRUCache
+
+from models import db
+from metrics_rollup import GRANULARITIES, SOURCE_METRICS, AVERAGE_METRICS, MAX_POINTS, get_timeseries, get_timeseries_metadata
+from pagination import encode_cursor, decode_cursor
+from response_cache import get_data_version, widget_data_cache, widget_candidate_cache
+from segments import create_segment_from_query
+from widget_profiler import statement_sql, record_widget_execution, explain_widget_statement
+from widget_query_guard import WidgetQueryError, guarded_query
+from widget_transforms import TRANSFORMS
+from widget_query_planner import (
+    TABLE_MODELS, ALLOWED_COLUMNS, ALLOWED_AGGREGATIONS, ALLOWED_OPERATORS, validate_column,
+    plan_widget_query, plan_candidate_query, build_rows_select, build_candidate_select,
+    FusedPlan, fusable, fusion_key, build_fused_select, split_fused_rows
+)
+
+logger = logging.getLogger(__name__)
+
+# Threads running the widget queries of batch requests. Shared by every request
+# in the worker, so at most this many widget queries (and DB connections) run at once
+WIDGET_BATCH_WORKERS = 4
+
+# Most widgets one batch request may ask for
+MAX_BATCH_WIDGETS = 50
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+# Widget statements by normalized config, and SQLAlchemy's compiled forms of
+# them. Literal values are bound parameters, so statements differing only in
+# values share one compiled form
+WIDGET_STATEMENT_CACHE_SIZE = 500
+_statement_cache = LRUCache(WIDGET_STATEMENT_CACHE_SIZE)
+_compiled_cache = LRUCache(WIDGET_STATEMENT_CACHE_SIZE)
+
+# Candidate IDs per page of the drill-down endpoints, and the most a client may ask for
+WIDGET_CANDIDATE_PAGE_SIZE = 1000
+MAX_WIDGET_CANDIDATE_PAGE_SIZE = 5000
+
+# Rows per server-side cursor fetch when streaming all candidate IDs
+CANDIDATE_STREAM_CHUNK = 5000
+
+# Sort key of drill-down cursors, so cursors of other paged endpoints are rejected
+CANDIDATE_CURSOR_KEY = 'widget_candidates'
 
 
 def get_widget_metadata():
@@ -101,6 +121,7 @@ def get_widget_metadata():
                 'join_column': 'candidate_id',
                 'fields': [
                     {'name': 'total_family_income', 'type': 'string', 'display': 'Total Family Income'},
+                    {'name': 'total_family_income_amount', 'type': 'integer', 'display': 'Total Family Income (Amount)'},
                     {'name': 'house_ownership', 'type': 'string', 'display': 'House Ownership'},
                     {'name': 'district', 'type': 'string', 'display': 'District'},
                     {'name': 'pincode', 'type': 'string', 'display': 'Pincode'},
@@ -122,8 +143,10 @@ def get_widget_metadata():
             {'value': 'SUM', 'label': 'Sum'},
             {'value': 'AVG', 'label': 'Average'},
             {'value': 'MIN', 'label': 'Minimum'},
-            {'value': 'MAX', 'label': 'Maximum'}
+            {'value': 'MAX', 'label': 'Maximum'},
+            {'value': 'PERCENTILE', 'label': 'Percentile (median by default)'}
         ],
+        'transforms': TRANSFORMS,
         'operators': [
             {'value': '=', 'label': 'Equals'},
             {'value': '!=', 'label': 'Not Equals'},
@@ -138,6 +161,7 @@ def get_widget_metadata():
             {'value': 'IS NULL', 'label': 'Is Empty'},
             {'value': 'IS NOT NULL', 'label': 'Is Not Empty'}
         ],
+        'timeseries': get_timeseries_metadata(),
         'widget_types': [
             {'value': 'pie', 'label': 'Pie Chart'},
             {'value': 'bar', 'label': 'Bar Chart'},
@@ -148,511 +172,568 @@ def get_widget_metadata():
     }
 
 
-def validate_column(table, column):
-    """Validate that a column is allowed for the given table"""
-    if table not in ALLOWED_COLUMNS:
-        raise ValueError(f"Invalid table: {table}")
-    if column not in ALLOWED_COLUMNS[table]:
-        raise ValueError(f"Invalid column '{column}' for table '{table}'")
-    return True
+def is_timeseries_config(config):
+    """Whether a widget reads from the metric_rollup time series instead of the applicant tables"""
+    return (config.get('data_source') or {}).get('type') == 'timeseries'
 
 
-def execute_widget_query(config):
+def reads_clock(config):
+    """Whether a widget's result moves with the date even when the data does not (time series, ages)"""
+    if is_timeseries_config(config):
+        return True
+    return any(isinstance(field.get('transform'), dict) and field['transform'].get('type') == 'age'
+               for field in config.get('fields', []) if isinstance(field, dict))
+
+
+def execute_timeseries_query(config):
     """
-    Execute a widget query based on the configuration
+    Read a widget's series from metric_rollup
+
+    data_source: {'type': 'timeseries', 'metric': 'submissions', 'granularity': 'hour', 'points': 48}
+    Rows are {'bucket': ISO start, 'value': number}, oldest first.
 
     Returns: {'data': [...], 'row_count': int}
     """
     data_source = config.get('data_source', {})
-    fields = config.get('fields', [])
-    conditions = config.get('conditions', [])
-    group_by = config.get('group_by', [])
-    order_by = config.get('order_by', [])
-    limit = min(config.get('limit', 100), 1000)  # Max 1000 rows
+    granularity = data_source.get('granularity', 'hour')
+    try:
+        points = int(data_source.get('points', 60))
+    except (TypeError, ValueError):
+        raise ValueError("points must be an integer")
+    if points < 1:
+        raise ValueError("points must be at least 1")
+
+    until = datetime.utcnow()
+    step = GRANULARITIES.get(granularity)
+    since = until - step * (points - 1) if step else None
+    data = get_timeseries(data_source.get('metric'), granularity, since, until)
+    return {
+        'data': data,
+        'row_count': len(data)
+    }
+
+
+def validate_widget_config(config):
+    """
+    Check that a widget config can be run, without running it
+
+    Plans and builds the statement (kept in the statement cache for the
+    first real query); time series configs are checked against the rollup
+    metrics and granularities.
 
-    if not fields:
-        raise ValueError("At least one field is required")
+    Raises ValueError describing what is wrong.
+    """
+    if not isinstance(config, dict):
+        raise ValueError("config_json must be an object")
+    if not is_timeseries_config(config):
+        try:
+            _cached_statement(config, lambda: build_rows_select(plan_widget_query(config)), 'rows')
+        except (TypeError, AttributeError, KeyError):
+            raise ValueError("Malformed widget config")
+        return
+
+    data_source = config['data_source']
+    metric = data_source.get('metric')
+    if metric not in SOURCE_METRICS and metric not in AVERAGE_METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    granularity = data_source.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    try:
+        points = int(data_source.get('points', 60))
+    except (TypeError, ValueError):
+        raise ValueError("points must be an integer")
+    if not 1 <= points <= MAX_POINTS:
+        raise ValueError(f"points must be from 1 to {MAX_POINTS}")
 
-    # Validate base table
+
+def normalize_widget_config(config):
+    """
+    Canonical form of the parts of a config that decide its query result
+
+    Presentation keys (chart_config etc.) are dropped and defaults made explicit:
+    base table, field/condition tables, field aliases, the clamped limit and
+    order direction. Joins are replaced by the set of tables the query joins,
+    conditions are sorted since they are ANDed, and conditions
+    execute_widget_query would skip are dropped. Configs with the same
+    canonical form return the same rows.
+
+    Raises TypeError/AttributeError/ValueError for configs too malformed to normalize.
+    """
+    data_source = config.get('data_source', {})
     base_table = data_source.get('base_table', 'application')
-    if base_table not in TABLE_MODELS:
-        raise ValueError(f"Invalid base table: {base_table}")
-
-    # Collect all required tables
-    required_tables = {base_table}
-    joins = data_source.get('joins', [])
-    for join_table in joins:
-        if join_table in TABLE_MODELS:
-            required_tables.add(join_table)
-
-    # Add tables from fields
-    for field in fields:
-        table = field.get('table', base_table)
-        if table in TABLE_MODELS:
-            required_tables.add(table)
-
-    # Add tables from conditions
-    for condition in conditions:
-        table = condition.get('table', base_table)
-        if table in TABLE_MODELS:
-            required_tables.add(table)
 
-    # Build SELECT clause
-    select_columns = []
-    column_aliases = {}
+    # Same tables execute_widget_query joins, including those of skipped conditions
+    tables = {base_table}
+    tables.update(t for t in data_source.get('joins', []) if t in TABLE_MODELS)
+    tables.update(f.get('table', base_table) for f in config.get('fields', []) if f.get('table', base_table) in TABLE_MODELS)
+    tables.update(c.get('table', base_table) for c in config.get('conditions', []) if c.get('table', base_table) in TABLE_MODELS)
 
-    for field in fields:
-        table = field.get('table', base_table)
+    fields = []
+    for field in config.get('fields', []):
         column = field.get('column')
-        alias = field.get('alias', column)
         aggregation = field.get('aggregation')
-
-        validate_column(table, column)
-
-        model = TABLE_MODELS[table]
-        col = getattr(model, column)
-
-        if aggregation and aggregation in ALLOWED_AGGREGATIONS:
-            if aggregation == 'COUNT':
-                col = func.count(col)
-            elif aggregation == 'SUM':
-                col = func.sum(col)
-            elif aggregation == 'AVG':
-                col = func.avg(col)
-            elif aggregation == 'MIN':
-                col = func.min(col)
-            elif aggregation == 'MAX':
-                col = func.max(col)
-
-        labeled_col = col.label(alias)
-        select_columns.append(labeled_col)
-        column_aliases[alias] = labeled_col
-
-    # Determine the primary table for the query (first table in fields or base_table)
-    primary_table = fields[0].get('table', base_table) if fields else base_table
-    primary_model = TABLE_MODELS[primary_table]
-
-    # Start building query - select from primary model
-    query = db.session.query(*select_columns).select_from(primary_model)
-
-    # Track which tables have been joined
-    joined_tables = {primary_table}
-
-    # Add joins for all other required tables
-    for table_name in required_tables:
-        if table_name not in joined_tables and table_name in TABLE_MODELS:
-            join_model = TABLE_MODELS[table_name]
-            # All info tables have candidate_id, so join on that
-            query = query.outerjoin(join_model, primary_model.candidate_id == join_model.candidate_id)
-            joined_tables.add(table_name)
-
-    # Add WHERE conditions
-    filter_clauses = []
-    for condition in conditions:
+        normalized = {
+            'table': field.get('table', base_table),
+            'column': column,
+            'alias': field.get('alias', column),
+            'aggregation': aggregation if aggregation and aggregation in ALLOWED_AGGREGATIONS else None,
+        }
+        # Only when set, so configs without them keep their hashes
+        for option in ('transform', 'percentile'):
+            if field.get(option) is not None:
+                normalized[option] = field[option]
+        fields.append(normalized)
+
+    conditions = []
+    for condition in config.get('conditions', []):
         table = condition.get('table', base_table)
         column = condition.get('column')
         operator = condition.get('operator')
-        value = condition.get('value')
-
         if not column or operator not in ALLOWED_OPERATORS:
             continue
-
         try:
             validate_column(table, column)
         except ValueError:
             continue
+        conditions.append({'table': table, 'column': column, 'operator': operator, 'value': condition.get('value')})
 
-        model = TABLE_MODELS[table]
-        col = getattr(model, column)
-
-        if operator == '=':
-            filter_clauses.append(col == value)
-        elif operator == '!=':
-            filter_clauses.append(col != value)
-        elif operator == '<':
-            filter_clauses.append(col < value)
-        elif operator == '>':
-            filter_clauses.append(col > value)
-        elif operator == '<=':
-            filter_clauses.append(col <= value)
-        elif operator == '>=':
-            filter_clauses.append(col >= value)
-        elif operator == 'LIKE':
-            filter_clauses.append(col.ilike(f'%{value}%'))
-        elif operator == 'NOT LIKE':
-            filter_clauses.append(~col.ilike(f'%{value}%'))
-        elif operator == 'IN':
-            if isinstance(value, list):
-                filter_clauses.append(col.in_(value))
-            elif isinstance(value, str):
-                values = [v.strip() for v in value.split(',')]
-                filter_clauses.append(col.in_(values))
-        elif operator == 'NOT IN':
-            if isinstance(value, list):
-                filter_clauses.append(~col.in_(value))
-            elif isinstance(value, str):
-                values = [v.strip() for v in value.split(',')]
-                filter_clauses.append(~col.in_(values))
-        elif operator == 'IS NULL':
-            filter_clauses.append(col.is_(None))
-        elif operator == 'IS NOT NULL':
-            filter_clauses.append(col.isnot(None))
-
-    if filter_clauses:
-        query = query.filter(and_(*filter_clauses))
-
-    # Add GROUP BY
-    group_by_columns = []
-    for gb in group_by:
-        if '.' in gb:
-            parts = gb.split('.')
-            if len(parts) == 2:
-                table, column = parts
-                try:
-                    validate_column(table, column)
-                    model = TABLE_MODELS[table]
-                    group_by_columns.append(getattr(model, column))
-                except ValueError:
-                    continue
-        else:
-            # Assume it's an alias
-            for field in fields:
-                if field.get('alias') == gb or field.get('column') == gb:
-                    table = field.get('table', base_table)
-                    column = field.get('column')
-                    try:
-                        validate_column(table, column)
-                        model = TABLE_MODELS[table]
-                        group_by_columns.append(getattr(model, column))
-                    except ValueError:
-                        continue
-                    break
-
-    if group_by_columns:
-        query = query.group_by(*group_by_columns)
-
-    # Add ORDER BY
-    for ob in order_by:
-        col_name = ob.get('column')
-        direction = ob.get('direction', 'ASC')
-
-        # Check if it's an alias
-        if col_name in column_aliases:
-            if direction.upper() == 'DESC':
-                query = query.order_by(desc(column_aliases[col_name]))
-            else:
-                query = query.order_by(asc(column_aliases[col_name]))
-        else:
-            # Try to find it in fields
-            for field in fields:
-                if field.get('column') == col_name or field.get('alias') == col_name:
-                    table = field.get('table', base_table)
-                    try:
-                        validate_column(table, col_name if field.get('column') == col_name else field.get('column'))
-                        model = TABLE_MODELS[table]
-                        col = getattr(model, field.get('column'))
-                        if direction.upper() == 'DESC':
-                            query = query.order_by(desc(col))
-                        else:
-                            query = query.order_by(asc(col))
-                    except ValueError:
-                        continue
-                    break
-
-    # Apply limit
-    if limit and limit > 0:
-        query = query.limit(limit)
+    return {
+        'base_table': base_table,
+        'tables': sorted(tables),
+        'fields': fields,
+        'conditions': sorted(conditions, key=lambda c: json.dumps(c, sort_keys=True, default=str)),
+        'group_by': list(config.get('group_by', [])),
+        'order_by': [{'column': ob.get('column'), 'direction': ob.get('direction', 'ASC').upper()}
+                     for ob in config.get('order_by', [])],
+        'limit': min(config.get('limit', 100), 1000),
+    }
 
-    # Execute and format results
+
+def widget_config_hash(config):
+    """Stable hash of normalize_widget_config(config)"""
+    canonical = json.dumps(normalize_widget_config(config), sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def execute_widget_query_cached(config):
+    """
+    execute_widget_query through widget_data_cache, shared by every widget and
+    preview with the same normalized config until application data changes
+
+    Time series read their own rollup table and are never cached here.
+
+    Returns: {'data': [...], 'row_count': int}
+    """
+    if is_timeseries_config(config):
+        return execute_widget_query(config)
     try:
-        results = query.all()
-    except Exception as e:
-        raise ValueError(f"Query execution failed: {str(e)}")
+        key = widget_config_hash(config)
+    except (TypeError, AttributeError, ValueError):
+        # Let execute_widget_query report what is wrong with the config
+        return execute_widget_query(config)
+    return widget_data_cache.get_or_compute(key, lambda: execute_widget_query(config))
 
-    # Convert to list of dicts
-    data = []
-    for row in results:
-        row_dict = {}
-        for i, field in enumerate(fields):
-            alias = field.get('alias', field.get('column'))
-            value = row[i]
-            # Handle special types
-            if hasattr(value, 'isoformat'):
-                value = value.isoformat()
-            elif value is None:
-                value = None
-            row_dict[alias] = value
-        data.append(row_dict)
 
-    return {
-        'data': data,
-        'row_count': len(data)
-    }
+def _cached_statement(config, build, *key):
+    """
+    The select() build() makes for config, built once per normalized config
+
+    Args:
+        config: Widget configuration
+        build: Zero-argument function planning and building the statement
+        key: Anything else the statement depends on (hashable)
+    """
+    try:
+        cache_key = (widget_config_hash(config), *key)
+        hash(cache_key)
+    except (TypeError, AttributeError, ValueError):
+        # Let build() report what is wrong with the config
+        return build()
+    stmt = _statement_cache.get(cache_key)
+    if stmt is None:
+        stmt = _statement_cache[cache_key] = build()
+    return stmt
+
+
+def execute_widget_statement(stmt):
+    """Execute a widget statement, reusing its compiled form from _compiled_cache"""
+    return db.session.execute(stmt, execution_options={'compiled_cache': _compiled_cache})
+
+
+def _get_batch_executor():
+    # Created on first use so forked workers never inherit the pool threads
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(max_workers=WIDGET_BATCH_WORKERS, thread_name_prefix='widget-query')
+        return _batch_executor
+
+
+def _run_batch_query(app, config):
+    """One widget of a batch, in its own app context and therefore its own DB session"""
+    started = time.perf_counter()
+    with app.app_context():
+        try:
+            outcome = execute_widget_query_cached(config)
+        except WidgetQueryError as e:
+            outcome = {**e.to_dict(), 'status': e.status}
+        except ValueError as e:
+            outcome = {'msg': str(e), 'status': 400}
+        except Exception as e:
+            outcome = {'msg': f'Query execution failed: {str(e)}', 'status': 500}
+    return {**outcome, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
 
 
-def get_widget_candidate_ids(config, limit=1000):
+def execute_widget_queries(configs):
     """
-    Get candidate IDs matching the widget query conditions
-    This is used to navigate to submissions filtered by widget results
+    Run several widget configs concurrently on the shared batch thread pool
 
-    Returns: list of candidate_ids
+    On PostgreSQL, uncached widgets with the same conditions that group by
+    at most one column are fused into one GROUPING SETS statement (see
+    FusedPlan), so a dashboard of COUNT-by-X widgets scans its tables once.
+    Fused widgets whose statement fails then run on their own. A failing
+    config does not affect the others.
+
+    Returns: one dict per config, in order: {'data', 'row_count', 'elapsed_ms'}
+    on success, {'msg', 'status', 'elapsed_ms'} on failure (plus 'error' and
+    'expensive' when the widget query guard stopped it)
     """
-    data_source = config.get('data_source', {})
-    conditions = config.get('conditions', [])
+    app = current_app._get_current_object()
+    executor = _get_batch_executor()
+    hashes = [_config_hash_or_none(config) for config in configs]
+    groups = _fusable_groups(configs, hashes) if _fusion_enabled() else []
+    fusing = {config_hash for members in groups for config_hash, _ in members}
+
+    # Fused statements first, they answer several widgets each
+    fused_futures = [executor.submit(_run_fused_batch, app, members) for members in groups]
+    futures = {index: executor.submit(_run_batch_query, app, config)
+               for index, config in enumerate(configs) if hashes[index] not in fusing}
+    fused = {}
+    for future in fused_futures:
+        fused.update(future.result())
+    for index, config in enumerate(configs):
+        if index not in futures and hashes[index] not in fused:
+            futures[index] = executor.submit(_run_batch_query, app, config)
+    return [futures[index].result() if index in futures else fused[hashes[index]]
+            for index in range(len(configs))]
+
+
+def _config_hash_or_none(config):
+    try:
+        return widget_config_hash(config)
+    except (TypeError, AttributeError, ValueError):
+        return None
 
-    # Validate base table
-    base_table = data_source.get('base_table', 'application')
-    if base_table not in TABLE_MODELS:
-        raise ValueError(f"Invalid base table: {base_table}")
 
-    # Collect all required tables from conditions
-    required_tables = {base_table}
-    joins = data_source.get('joins', [])
-    for join_table in joins:
-        if join_table in TABLE_MODELS:
-            required_tables.add(join_table)
+def _fusion_enabled():
+    # GROUPING SETS needs PostgreSQL; the analytics snapshot answers without SQL at all
+    return (current_app.config.get('WIDGET_QUERY_FUSION', True)
+            and not current_app.config.get('WIDGET_ANALYTICS_ENGINE')
+            and db.session.get_bind().dialect.name == 'postgresql')
 
-    for condition in conditions:
-        table = condition.get('table', base_table)
-        if table in TABLE_MODELS:
-            required_tables.add(table)
-
-    # Determine primary model - prefer one that has candidate_id
-    # If base_table is 'application', use Application.candidate_id
-    # Otherwise use the base_table's candidate_id
-    primary_model = TABLE_MODELS[base_table]
-
-    # Select distinct candidate_ids
-    query = db.session.query(primary_model.candidate_id.distinct()).select_from(primary_model)
-
-    # Track joined tables
-    joined_tables = {base_table}
-
-    # Add joins for all required tables
-    for table_name in required_tables:
-        if table_name not in joined_tables and table_name in TABLE_MODELS:
-            join_model = TABLE_MODELS[table_name]
-            query = query.outerjoin(join_model, primary_model.candidate_id == join_model.candidate_id)
-            joined_tables.add(table_name)
-
-    # Apply WHERE conditions
-    filter_clauses = []
-    for condition in conditions:
-        table = condition.get('table', base_table)
-        column = condition.get('column')
-        operator = condition.get('operator')
-        value = condition.get('value')
 
-        if not column or operator not in ALLOWED_OPERATORS:
-            continue
+def _fusable_groups(configs, hashes):
+    """
+    The configs of a batch to fuse: fusable, not cached yet, and sharing their
+    rows with at least one other distinct config
 
+    Returns: [[(config_hash, (config, plan))]], one list per fused statement
+    """
+    version = get_data_version()
+    groups = {}
+    for config, config_hash in zip(configs, hashes):
+        if config_hash is None or is_timeseries_config(config):
+            continue
         try:
-            validate_column(table, column)
+            plan = plan_widget_query(config)
         except ValueError:
             continue
+        if fusable(plan) and widget_data_cache.get(widget_data_cache.versioned_key(config_hash, version)) is None:
+            groups.setdefault(fusion_key(plan), {}).setdefault(config_hash, (config, plan))
+    return [list(members.items()) for members in groups.values() if len(members) > 1]
+
+
+def _run_fused_batch(app, members):
+    """_run_fused_queries in its own app context, like _run_batch_query"""
+    with app.app_context():
+        return _run_fused_queries(members)
 
-        model = TABLE_MODELS[table]
-        col = getattr(model, column)
-
-        if operator == '=':
-            filter_clauses.append(col == value)
-        elif operator == '!=':
-            filter_clauses.append(col != value)
-        elif operator == '<':
-            filter_clauses.append(col < value)
-        elif operator == '>':
-            filter_clauses.append(col > value)
-        elif operator == '<=':
-            filter_clauses.append(col <= value)
-        elif operator == '>=':
-            filter_clauses.append(col >= value)
-        elif operator == 'LIKE':
-            filter_clauses.append(col.ilike(f'%{value}%'))
-        elif operator == 'NOT LIKE':
-            filter_clauses.append(~col.ilike(f'%{value}%'))
-        elif operator == 'IN':
-            if isinstance(value, list):
-                filter_clauses.append(col.in_(value))
-            elif isinstance(value, str):
-                values = [v.strip() for v in value.split(',')]
-                filter_clauses.append(col.in_(values))
-        elif operator == 'NOT IN':
-            if isinstance(value, list):
-                filter_clauses.append(~col.in_(value))
-            elif isinstance(value, str):
-                values = [v.strip() for v in value.split(',')]
-                filter_clauses.append(~col.in_(values))
-        elif operator == 'IS NULL':
-            filter_clauses.append(col.is_(None))
-        elif operator == 'IS NOT NULL':
-            filter_clauses.append(col.isnot(None))
-
-    if filter_clauses:
-        query = query.filter(and_(*filter_clauses))
-
-    # Apply limit
-    if limit and limit > 0:
-        query = query.limit(limit)
-
-    # Execute and extract candidate IDs
+
+def _run_fused_queries(members):
+    """
+    Answer several widget configs with one GROUPING SETS statement, caching
+    each result as execute_widget_query_cached would
+
+    Returns: {config_hash: {'data', 'row_count', 'elapsed_ms'}}, empty if the
+    statement failed
+    """
+    started = time.perf_counter()
+    version = get_data_version()
+    fused = FusedPlan([plan for _, (_, plan) in members])
+    stmt = build_fused_select(fused)
     try:
-        results = query.all()
-        return [row[0] for row in results if row[0]]
+        # Guarded (and explained on timeout) as the first widget of the set
+        with guarded_query(members[0][1][0]):
+            rows = execute_widget_statement(stmt).all()
     except Exception as e:
+        logger.warning(f"Fused widget query failed, running {len(members)} widgets separately: {str(e)}")
+        return {}
+    execute_ms = (time.perf_counter() - started) * 1000
+
+    outcomes = {}
+    for (config_hash, (config, plan)), values in zip(members, split_fused_rows(fused, rows)):
+        aliases = [output.alias for output in plan.outputs]
+        data = [_row_dict(aliases, row) for row in values]
+        result = {'data': data, 'row_count': len(data)}
+        widget_data_cache.set(widget_data_cache.versioned_key(config_hash, version), result)
+        _record_execution(config, 'fused', started, stmt, execute_ms=execute_ms, row_count=len(data))
+        outcomes[config_hash] = {**result, 'elapsed_ms': round(execute_ms, 1)}
+    return outcomes
+
+
+def _record_execution(config, engine, started, stmt=None, **details):
+    """Add an execution to the widget profile buffer; profiling never fails the query"""
+    try:
+        try:
+            config_hash = widget_config_hash(config)
+        except (TypeError, AttributeError, ValueError):
+            config_hash = None
+        sql = params = None
+        if stmt is not None:
+            sql, params = statement_sql(stmt)
+        return record_widget_execution(config_hash, engine, (time.perf_counter() - started) * 1000,
+                                       sql=sql, params=params, **details)
+    except Exception as e:
+        logger.warning(f"Could not profile widget query: {str(e)}")
+        return None
+
+
+def execute_widget_query(config):
+    """
+    Execute a widget query based on the configuration
+
+    With WIDGET_ANALYTICS_ENGINE on, the in-memory analytics snapshot answers
+    whatever it can reproduce exactly; everything else runs in SQL. Every
+    execution is recorded by widget_profiler.
+
+    Returns: {'data': [...], 'row_count': int}
+    """
+    started = time.perf_counter()
+    if is_timeseries_config(config):
+        result = execute_timeseries_query(config)
+        _record_execution(config, 'timeseries', started, row_count=result['row_count'])
+        return result
+
+    if current_app.config.get('WIDGET_ANALYTICS_ENGINE'):
+        from analytics_snapshot import analytics_snapshot
+        result = analytics_snapshot.execute(config)
+        if result is not None:
+            _record_execution(config, 'snapshot', started, row_count=result['row_count'])
+            return result
+
+    return execute_widget_sql_query(config)
+
+
+def execute_widget_sql_query(config):
+    """
+    Execute a (non time series) widget query in the database
+
+    Returns: {'data': [...], 'row_count': int}
+    Raises WidgetQueryError if the query guard stops the query.
+    """
+    result, _ = _run_widget_sql(config)
+    return result
+
+
+def profile_widget_query(config):
+    """
+    Run a (non time series) widget query in the database with its EXPLAIN
+    output captured (EXPLAIN ANALYZE on PostgreSQL, so the query runs twice)
+
+    Returns: the widget_profiler entry recorded for the run
+    """
+    if is_timeseries_config(config):
+        raise ValueError("Time-series widgets read metric_rollup and have no query to explain")
+    _, entry = _run_widget_sql(config, explain=True)
+    return entry
+
+
+def _run_widget_sql(config, explain=False):
+    """Run a widget config in SQL and profile it. Returns: (result, profile entry)"""
+    started = time.perf_counter()
+    fields = config.get('fields', [])
+    stmt = _cached_statement(config, lambda: build_rows_select(plan_widget_query(config)), 'rows')
+    build_ms = (time.perf_counter() - started) * 1000
+
+    # Execute and format results
+    explain_lines = None
+    execute_started = time.perf_counter()
+    try:
+        with guarded_query(config):
+            if explain:
+                explain_lines = explain_widget_statement(stmt)
+                execute_started = time.perf_counter()
+            results = execute_widget_statement(stmt).all()
+    except WidgetQueryError as e:
+        _record_execution(config, 'sql', started, stmt, build_ms=build_ms, error=str(e))
+        raise
+    except Exception as e:
+        _record_execution(config, 'sql', started, stmt, build_ms=build_ms, error=str(e))
         raise ValueError(f"Query execution failed: {str(e)}")
+    execute_ms = (time.perf_counter() - execute_started) * 1000
+
+    # Convert to list of dicts
+    aliases = [field.get('alias', field.get('column')) for field in fields]
+    data = [_row_dict(aliases, row) for row in results]
+
+    entry = _record_execution(config, 'sql', started, stmt, build_ms=build_ms, execute_ms=execute_ms,
+                              row_count=len(data), explain=explain_lines)
+    return {
+        'data': data,
+        'row_count': len(data)
+    }, entry
+
+
+def _row_dict(aliases, row):
+    """One result row as {alias: value}, dates and times as ISO strings"""
+    return {alias: value.isoformat() if hasattr(value, 'isoformat') else value
+            for alias, value in zip(aliases, row)}
+
+
+def build_widget_candidate_query(config):
+    """
+    Build the query selecting distinct candidate IDs matching the widget conditions
+
+    Returns: select() with a single candidate_id column
+    """
+    if is_timeseries_config(config):
+        raise ValueError("Time-series widgets have no candidate drill-down")
+
+    return _cached_statement(config, lambda: build_candidate_select(plan_candidate_query(config)), 'candidates')
 
 
-def get_widget_segment_candidate_ids(config, segment_field, segment_value, limit=1000):
+def build_widget_segment_candidate_query(config, segment_field, segment_value):
     """
-    Get candidate IDs matching the widget query conditions PLUS an additional filter
-    for a specific segment (e.g., clicking on a pie chart segment)
+    Build the query selecting distinct candidate IDs matching the widget conditions
+    PLUS an additional filter for a specific segment (e.g., clicking on a pie chart segment)
 
     Args:
         config: The widget configuration
         segment_field: The field to filter on (e.g., 'gender')
         segment_value: The value to filter for (e.g., 'Male')
-        limit: Maximum number of results
 
-    Returns: list of candidate_ids
+    Returns: select() with a single candidate_id column
     """
-    data_source = config.get('data_source', {})
-    conditions = config.get('conditions', [])
-    fields = config.get('fields', [])
+    if is_timeseries_config(config):
+        raise ValueError("Time-series widgets have no candidate drill-down")
 
-    # Validate base table
-    base_table = data_source.get('base_table', 'application')
-    if base_table not in TABLE_MODELS:
-        raise ValueError(f"Invalid base table: {base_table}")
+    return _cached_statement(
+        config,
+        lambda: build_candidate_select(plan_candidate_query(config, segment_field, segment_value)),
+        'segment', segment_field, type(segment_value).__name__, repr(segment_value)
+    )
 
-    # Collect all required tables from conditions and fields
-    required_tables = {base_table}
-    joins = data_source.get('joins', [])
-    for join_table in joins:
-        if join_table in TABLE_MODELS:
-            required_tables.add(join_table)
 
-    for condition in conditions:
-        table = condition.get('table', base_table)
-        if table in TABLE_MODELS:
-            required_tables.add(table)
-
-    # Find the table for the segment field from the widget's fields config
-    segment_table = None
-    for field in fields:
-        if field.get('column') == segment_field or field.get('alias') == segment_field:
-            segment_table = field.get('table', base_table)
-            # Use the actual column name, not alias
-            if field.get('alias') == segment_field:
-                segment_field = field.get('column')
-            break
-
-    # If not found in fields, check if it's a valid column in any joined table
-    if not segment_table:
-        for table_name in required_tables:
-            if segment_field in ALLOWED_COLUMNS.get(table_name, []):
-                segment_table = table_name
-                break
-
-    if not segment_table:
-        raise ValueError(f"Segment field '{segment_field}' not found in widget configuration")
-
-    required_tables.add(segment_table)
-
-    # Determine primary model
-    primary_model = TABLE_MODELS[base_table]
-
-    # Select distinct candidate_ids
-    query = db.session.query(primary_model.candidate_id.distinct()).select_from(primary_model)
-
-    # Track joined tables
-    joined_tables = {base_table}
-
-    # Add joins for all required tables
-    for table_name in required_tables:
-        if table_name not in joined_tables and table_name in TABLE_MODELS:
-            join_model = TABLE_MODELS[table_name]
-            query = query.outerjoin(join_model, primary_model.candidate_id == join_model.candidate_id)
-            joined_tables.add(table_name)
-
-    # Apply original WHERE conditions from widget config
-    filter_clauses = []
-    for condition in conditions:
-        table = condition.get('table', base_table)
-        column = condition.get('column')
-        operator = condition.get('operator')
-        value = condition.get('value')
+def _candidate_column(stmt):
+    """The candidate_id column of a candidate select() wrapped as a subquery"""
+    return list(stmt.subquery().c)[0]
 
-        if not column or operator not in ALLOWED_OPERATORS:
-            continue
 
-        try:
-            validate_column(table, column)
-        except ValueError:
-            continue
+def page_widget_candidate_ids(config, stmt, cursor=None, per_page=WIDGET_CANDIDATE_PAGE_SIZE):
+    """
+    One page of the distinct candidate IDs a candidate select() matches, in
+    candidate_id order
 
-        model = TABLE_MODELS[table]
-        col = getattr(model, column)
-
-        if operator == '=':
-            filter_clauses.append(col == value)
-        elif operator == '!=':
-            filter_clauses.append(col != value)
-        elif operator == '<':
-            filter_clauses.append(col < value)
-        elif operator == '>':
-            filter_clauses.append(col > value)
-        elif operator == '<=':
-            filter_clauses.append(col <= value)
-        elif operator == '>=':
-            filter_clauses.append(col >= value)
-        elif operator == 'LIKE':
-            filter_clauses.append(col.ilike(f'%{value}%'))
-        elif operator == 'NOT LIKE':
-            filter_clauses.append(~col.ilike(f'%{value}%'))
-        elif operator == 'IN':
-            if isinstance(value, list):
-                filter_clauses.append(col.in_(value))
-            elif isinstance(value, str):
-                values = [v.strip() for v in value.split(',')]
-                filter_clauses.append(col.in_(values))
-        elif operator == 'NOT IN':
-            if isinstance(value, list):
-                filter_clauses.append(~col.in_(value))
-            elif isinstance(value, str):
-                values = [v.strip() for v in value.split(',')]
-                filter_clauses.append(~col.in_(values))
-        elif operator == 'IS NULL':
-            filter_clauses.append(col.is_(None))
-        elif operator == 'IS NOT NULL':
-            filter_clauses.append(col.isnot(None))
-
-    # Add the segment filter condition
-    try:
-        validate_column(segment_table, segment_field)
-        segment_model = TABLE_MODELS[segment_table]
-        segment_col = getattr(segment_model, segment_field)
-
-        # Handle different value types
-        if segment_value is None or segment_value == 'null' or segment_value == 'None':
-            filter_clauses.append(segment_col.is_(None))
-        elif isinstance(segment_value, bool) or segment_value in ['true', 'false', 'True', 'False']:
-            bool_val = segment_value if isinstance(segment_value, bool) else segment_value.lower() == 'true'
-            filter_clauses.append(segment_col == bool_val)
-        else:
-            filter_clauses.append(segment_col == segment_value)
-    except ValueError as e:
-        raise ValueError(f"Invalid segment field: {e}")
-
-    if filter_clauses:
-        query = query.filter(and_(*filter_clauses))
-
-    # Apply limit
-    if limit and limit > 0:
-        query = query.limit(limit)
-
-    # Execute and extract candidate IDs
+    Pages are keyset-paged on candidate_id, so every page costs the same. The
+    first page counts all matches with COUNT(*) OVER () in the same statement;
+    its cursors carry that exact total to the later pages. Pages go through
+    widget_candidate_cache, keyed by the page statement's SQL and parameters,
+    so concurrent requests for the same page run one query.
+
+    Args:
+        config: Widget configuration the statement was built from
+        stmt: select() from build_widget_candidate_query / build_widget_segment_candidate_query
+        cursor: next_cursor of the previous page, or None for the first page
+        per_page: Page size
+
+    Returns: {'items': [...], 'count': int, 'next_cursor': str|None, 'has_more': bool}
+    Raises ValueError for an invalid cursor, WidgetQueryError if the query guard stops the query.
+    """
+    candidate_id = _candidate_column(stmt)
+    page = select(candidate_id).where(candidate_id.isnot(None))
+    if cursor:
+        total, last = decode_cursor(cursor, CANDIDATE_CURSOR_KEY, 'asc')
+        page = page.where(candidate_id > last)
+    else:
+        total = None
+        page = page.add_columns(func.count().over())
+    page = page.order_by(candidate_id).limit(per_page + 1)
+
+    sql, params = statement_sql(page)
+    key = hashlib.sha1(json.dumps([sql, params, total], sort_keys=True).encode('utf-8')).hexdigest()
+    return widget_candidate_cache.get_or_compute(key, lambda: _fetch_candidate_page(config, page, total, per_page))
+
+
+def _fetch_candidate_page(config, page, total, per_page):
+    """Run a page_widget_candidate_ids statement; total is None on the first page (read from the rows)"""
     try:
-        results = query.all()
-        return [row[0] for row in results if row[0]]
+        with guarded_query(config):
+            rows = execute_widget_statement(page).all()
+    except WidgetQueryError:
+        raise
     except Exception as e:
         raise ValueError(f"Query execution failed: {str(e)}")
+
+    if total is None:
+        total = rows[0][1] if rows else 0
+    has_more = len(rows) > per_page
+    items = [row[0] for row in rows[:per_page]]
+    return {
+        'items': items,
+        'count': total,
+        # The cursor's sort value slot carries the total, its tie value the last ID
+        'next_cursor': encode_cursor(CANDIDATE_CURSOR_KEY, 'asc', total, items[-1]) if has_more else None,
+        'has_more': has_more
+    }
+
+
+def stream_widget_candidate_ids(config, stmt):
+    """
+    Yield every distinct candidate ID a candidate select() matches, in
+    candidate_id order, as lists of up to CANDIDATE_STREAM_CHUNK IDs read from
+    a server-side cursor
+
+    Holds a widget query slot until the generator is exhausted or closed;
+    closing it (e.g. when the client disconnects) closes the cursor.
+    """
+    candidate_id = _candidate_column(stmt)
+    ordered = select(candidate_id).where(candidate_id.isnot(None)).order_by(candidate_id)
+    with guarded_query(config):
+        result = db.session.execute(ordered, execution_options={
+            'compiled_cache': _compiled_cache,
+            'yield_per': CANDIDATE_STREAM_CHUNK
+        })
+        try:
+            for partition in result.partitions():
+                yield [row[0] for row in partition]
+        finally:
+            result.close()
+
+
+def iter_widget_candidate_csv(config, stmt):
+    """Yield every candidate ID of stream_widget_candidate_ids as one-column CSV text chunks"""
+    yield 'candidate_id\n'
+    for chunk in stream_widget_candidate_ids(config, stmt):
+        yield ''.join(f'{candidate_id}\n' for candidate_id in chunk)
+
+
+def save_widget_candidate_segment(config, stmt, source, description=None, created_by=None):
+    """
+    Save every candidate ID a candidate select() matches as a segment, with one
+    INSERT ... SELECT under the query guard (no IDs pass through this process)
+
+    Returns: Segment
+    """
+    with guarded_query(config):
+        return create_segment_from_query(stmt, source=source, description=description, created_by=created_by)
@@ -0,0 +1,317 @@
+"""
+Widget Query Guard - time limit, cancellation and concurrency cap for widget SQL
+
+Widget configs, hand-built or generated by the widget agent, can describe
+multi-join GROUP BY queries over LIKE conditions that take minutes. Every
+widget statement therefore runs inside guarded_query(), which
+
+- waits for one of WIDGET_QUERY_CONCURRENCY slots, so a burst of previews
+  cannot take every DB connection of the worker;
+- limits the statement to WIDGET_QUERY_TIMEOUT seconds: SET LOCAL
+  statement_timeout on PostgreSQL, elsewhere a watchdog thread that interrupts
+  the connection (sqlite3 interrupt(), or the driver's cancel()) at the deadline;
+- lets the client cancel a running query: requests carrying an
+  X-Widget-Query-Id header can be cancelled by id from any worker (the flag is
+  shared through Redis) and the watchdog cancels the statement;
+- reports timeouts as a WidgetQueryError naming the parts of the config that
+  make the query expensive, for the builder UI to point at.
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, has_request_context, request
+from sqlalchemy.exc import DBAPIError
+
+from models import db
+from response_cache import get_redis
+from widget_query_planner import plan_widget_query, plan_candidate_query
+
+logger = logging.getLogger(__name__)
+
+# Used when the app config does not set WIDGET_QUERY_TIMEOUT / WIDGET_QUERY_CONCURRENCY
+DEFAULT_QUERY_TIMEOUT = 15
+DEFAULT_QUERY_CONCURRENCY = 4
+
+# Seconds a query waits for a free slot before giving up as busy
+QUEUE_TIMEOUT = 10
+
+# How often the watchdog checks the deadline and cancellation flags
+WATCH_INTERVAL = 0.1
+
+# Cancellation flags live this long in Redis, long enough for a late-starting query to see them
+CANCEL_FLAG_TTL = 60
+CANCEL_KEY_PREFIX = 'vglug:widget_query_cancel:'
+
+QUERY_ID_HEADER = 'X-Widget-Query-Id'
+_QUERY_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# PostgreSQL SQLSTATE of a statement cancelled by statement_timeout or a cancel request
+PG_QUERY_CANCELED = '57014'
+
+# Columns with (nearly) one value per applicant: grouping on them yields a group per row
+HIGH_CARDINALITY_COLUMNS = {'id', 'candidate_id', 'full_name', 'email', 'contact', 'dob',
+                            'created_at', 'updated_at', 'pincode'}
+
+# Joining this many tables besides the FROM table is reported as expensive
+MANY_JOINS = 3
+
+_slots = None
+_slots_lock = threading.Lock()
+
+# {query id: _Watchdog} of queries running in this worker
+_running = {}
+_running_lock = threading.Lock()
+
+
+class WidgetQueryError(ValueError):
+    """
+    A widget query that was not run to completion
+
+    Attributes:
+        code: 'timeout', 'cancelled' or 'busy'
+        status: HTTP status for the response
+        expensive: [{'part', 'reason', ...}] parts of the config to simplify (timeouts only)
+    """
+
+    STATUS = {'timeout': 504, 'cancelled': 409, 'busy': 503}
+
+    def __init__(self, code, message, expensive=None):
+        super().__init__(message)
+        self.code = code
+        self.status = self.STATUS[code]
+        self.expensive = expensive or []
+
+    @property
+    def shareable(self):
+        # A cancellation stops one request; others coalesced onto it rerun the query
+        return self.code != 'cancelled'
+
+    def to_dict(self):
+        return {'msg': str(self), 'error': self.code, 'expensive': self.expensive}
+
+
+def _get_slots():
+    # Created on first use so the size comes from the app config
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            size = current_app.config.get('WIDGET_QUERY_CONCURRENCY', DEFAULT_QUERY_CONCURRENCY)
+            _slots = threading.BoundedSemaphore(max(1, size))
+        return _slots
+
+
+def current_query_id():
+    """The X-Widget-Query-Id of the current request, if valid"""
+    if not has_request_context():
+        return None
+    query_id = request.headers.get(QUERY_ID_HEADER)
+    return query_id if query_id and _QUERY_ID_PATTERN.match(query_id) else None
+
+
+def _cancel_flagged(query_id):
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(CANCEL_KEY_PREFIX + query_id))
+    except Exception as e:
+        logger.warning(f"Could not read widget query cancel flag: {str(e)}")
+        return False
+
+
+def cancel_widget_query(query_id):
+    """
+    Ask the query running under query_id to stop, in whichever worker it runs
+
+    Returns: True if the query was running in this worker
+    """
+    if not _QUERY_ID_PATTERN.match(query_id or ''):
+        raise ValueError("Invalid query id")
+    client = get_redis()
+    if client is not None:
+        try:
+            client.set(CANCEL_KEY_PREFIX + query_id, 1, ex=CANCEL_FLAG_TTL)
+        except Exception as e:
+            logger.warning(f"Could not set widget query cancel flag: {str(e)}")
+    with _running_lock:
+        watchdog = _running.get(query_id)
+    if watchdog is None:
+        return False
+    watchdog.cancel()
+    return True
+
+
+def _interrupt(dbapi_connection):
+    """Abort the statement running on a DBAPI connection from another thread"""
+    for name in ('interrupt', 'cancel'):  # sqlite3, psycopg2 / psycopg
+        method = getattr(dbapi_connection, name, None)
+        if callable(method):
+            method()
+            return True
+    return False
+
+
+class _Watchdog:
+    """Thread interrupting one query at its deadline or when it is cancelled"""
+
+    def __init__(self, dbapi_connection, deadline, query_id):
+        self.dbapi_connection = dbapi_connection
+        self.deadline = deadline  # time.monotonic() limit, None when the database enforces it
+        self.query_id = query_id
+        self.reason = None  # 'timeout' or 'cancelled' once the watchdog interrupted the query
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.deadline is None and self.query_id is None:
+            return
+        if self.query_id is not None:
+            with _running_lock:
+                _running[self.query_id] = self
+        self._thread = threading.Thread(target=self._watch, name='widget-query-watchdog', daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def stop(self):
+        self._done.set()
+        if self._thread is None:
+            return
+        self._thread.join()
+        if self.query_id is not None:
+            with _running_lock:
+                if _running.get(self.query_id) is self:
+                    del _running[self.query_id]
+
+    def _watch(self):
+        last_flag_check = 0.0
+        while not self._done.wait(WATCH_INTERVAL):
+            now = time.monotonic()
+            reason = None
+            if self._cancelled.is_set():
+                reason = 'cancelled'
+            elif self.deadline is not None and now >= self.deadline:
+                reason = 'timeout'
+            elif self.query_id is not None and now - last_flag_check >= 5 * WATCH_INTERVAL:
+                last_flag_check = now
+                if _cancel_flagged(self.query_id):
+                    reason = 'cancelled'
+            if reason is not None:
+                self.reason = reason
+                try:
+                    _interrupt(self.dbapi_connection)
+                except Exception as e:
+                    logger.warning(f"Could not interrupt widget query: {str(e)}")
+                return
+
+
+def expensive_parts(config):
+    """
+    Parts of a widget config that make its query expensive, most likely first
+
+    Returns: [{'part': 'conditions'|'group_by'|'joins'|'query', 'reason': str, ...}]
+    """
+    parts = []
+    for index, condition in enumerate(config.get('conditions', [])):
+        if isinstance(condition, dict) and condition.get('operator') in ('LIKE', 'NOT LIKE'):
+            parts.append({
+                'part': 'conditions',
+                'index': index,
+                'column': f"{condition.get('table', 'application')}.{condition.get('column')}",
+                'reason': f"{condition['operator']} matches '%value%', which cannot use an index and reads every row"
+            })
+
+    try:
+        plan = plan_widget_query(config)
+    except (ValueError, TypeError, AttributeError):
+        try:
+            plan = plan_candidate_query(config)
+        except (ValueError, TypeError, AttributeError):
+            plan = None
+
+    if plan is not None:
+        for expression in plan.group_by:
+            # A transform buckets the values (days, ages, histogram bins), so it groups far fewer rows
+            if expression.column in HIGH_CARDINALITY_COLUMNS and expression.transform is None:
+                parts.append({
+                    'part': 'group_by',
+                    'column': f'{expression.table}.{expression.column}',
+                    'reason': 'Has a different value for almost every applicant, so the query builds one group per row'
+                })
+        if len(plan.joins) >= MANY_JOINS:
+            parts.append({
+                'part': 'joins',
+                'tables': [table for table, _ in plan.joins],
+                'reason': f'Joins {len(plan.joins) + 1} tables; use fewer fields or conditions from other tables'
+            })
+        if not plan.conditions and not parts:
+            parts.append({
+                'part': 'query',
+                'reason': 'Reads every application; add conditions to narrow it down'
+            })
+    return parts
+
+
+def _pg_cancelled(error):
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == PG_QUERY_CANCELED
+
+
+@contextmanager
+def guarded_query(config):
+    """
+    Run the widget statement(s) executed in the with block under the query guard
+
+    Args:
+        config: Widget configuration, used to explain timeouts
+
+    Raises WidgetQueryError when no slot frees up, the time limit passes or
+    the query is cancelled; the session is rolled back in the last two cases.
+    """
+    timeout = current_app.config.get('WIDGET_QUERY_TIMEOUT', DEFAULT_QUERY_TIMEOUT)
+    query_id = current_query_id()
+    slots = _get_slots()
+    if not slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise WidgetQueryError('busy', 'Too many widget queries are running; try again shortly')
+
+    try:
+        connection = db.session.connection()
+        native_timeout = connection.dialect.name == 'postgresql'
+        if native_timeout:
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout * 1000)}')
+        watchdog = _Watchdog(
+            connection.connection.driver_connection,
+            None if native_timeout else time.monotonic() + timeout,
+            query_id
+        )
+        watchdog.start()
+        # Set once the transaction, and the SET LOCAL with it, is gone
+        discarded = False
+        try:
+            yield
+        except DBAPIError as e:
+            watchdog.stop()
+            # A failed statement aborts the transaction; it accepts no more statements
+            discarded = True
+            reason = watchdog.reason or ('timeout' if native_timeout and _pg_cancelled(e) else None)
+            if reason is None:
+                raise
+            db.session.rollback()
+            if reason == 'cancelled':
+                raise WidgetQueryError('cancelled', 'Query cancelled') from e
+            raise WidgetQueryError(
+                'timeout',
+                f'Query took longer than {timeout:g} seconds',
+                expensive_parts(config)
+            ) from e
+        finally:
+            watchdog.stop()
+            # Whatever the caller raised, later statements in this transaction run without the limit
+            if native_timeout and not discarded:
+                connection.exec_driver_sql('SET LOCAL statement_timeout = DEFAULT')
+    finally:
+        slots.release()
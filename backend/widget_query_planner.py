@@ -0,0 +1,533 @@
+"""
+Widget Query Planner - one logical plan per widget config, emitted as SQL
+
+The widget query, its candidate drill-down and its segment drill-down all read
+the same config language. plan_widget_query validates a config into a
+WidgetPlan (tables and how they are joined, WHERE conditions, SELECT, GROUP BY,
+ORDER BY, LIMIT) and build_rows_select / build_candidate_select emit it as a
+Core select() whose literal values are all bound parameters.
+
+Two rewrites keep the SQL lean without changing results:
+
+- Join pruning: every table is joined on candidate_id, which is unique in each
+  of them, so a LEFT JOIN never changes the row count. Tables no output,
+  condition, grouping or ordering reads are not joined at all, whatever
+  data_source.joins lists.
+- Inner-join promotion: a condition that cannot be true for NULL (anything but
+  IS NULL) already discards the NULL-padded rows a LEFT JOIN adds, so that
+  table is INNER JOINed instead, which lets the database pick the join order.
+
+Widgets with the same conditions that group by at most one column each can
+also be fused: FusedPlan runs them as one GROUP BY GROUPING SETS statement,
+scanning the joined tables once, and split_fused_rows hands every widget its
+own rows back.
+"""
+import json
+from collections import namedtuple
+
+from sqlalchemy import select, func, desc, asc, and_, tuple_
+
+from models import Application, BasicInfo, EducationalInfo, FamilyInfo, IncomeInfo, CourseInfo
+from widget_transforms import (
+    parse_transform, parse_percentile, apply_transform, percentile_of, coerce_value, transformed_literal
+)
+
+# Mapping of table names to model classes
+TABLE_MODELS = {
+    'application': Application,
+    'basic_info': BasicInfo,
+    'educational_info': EducationalInfo,
+    'family_info': FamilyInfo,
+    'income_info': IncomeInfo,
+    'course_info': CourseInfo
+}
+
+# Allowed columns per table (whitelist for security)
+ALLOWED_COLUMNS = {
+    'application': ['id', 'candidate_id', 'status', 'created_at', 'updated_at'],
+    'basic_info': ['id', 'candidate_id', 'full_name', 'gender', 'dob', 'email', 'contact',
+                   'differently_abled', 'has_laptop', 'laptop_ram', 'laptop_processor',
+                   'considered', 'selected', 'shortlisted', 'contact_as_whatsapp',
+                   'appeared_for_one_to_one'],
+    'educational_info': ['id', 'candidate_id', 'college_name', 'degree', 'department', 'year',
+                        'tamil_medium', 'six_to_8_govt_school', 'nine_to_10_govt_school',
+                        'eleven_to_12_govt_school', 'received_scholarship', 'transport_mode',
+                        'vglug_applied_before', 'present_work'],
+    'family_info': ['id', 'candidate_id', 'family_environment', 'single_parent_info',
+                   'family_members_count', 'earning_members_count'],
+    'income_info': ['id', 'candidate_id', 'total_family_income', 'total_family_income_amount', 'house_ownership',
+                   'district', 'pincode', 'own_land_size'],
+    'course_info': ['id', 'candidate_id', 'preferred_course', 'heard_about_vglug',
+                   'participated_in_vglug_events']
+}
+
+ALLOWED_AGGREGATIONS = ['COUNT', 'SUM', 'AVG', 'MIN', 'MAX', 'PERCENTILE']
+ALLOWED_OPERATORS = ['=', '!=', '<', '>', '<=', '>=', 'LIKE', 'NOT LIKE', 'IN', 'NOT IN', 'IS NULL', 'IS NOT NULL']
+
+# table, column, operator and value of one WHERE condition (value already
+# split for comma-separated IN lists); transform as in Expression
+Condition = namedtuple('Condition', ['table', 'column', 'operator', 'value', 'transform'], defaults=(None,))
+
+# A column, under a widget_transforms.parse_transform result (None for the column itself)
+Expression = namedtuple('Expression', ['table', 'column', 'transform'])
+
+# alias, table, column, aggregation (None for plain columns), transform and
+# PERCENTILE fraction of one SELECT item
+Output = namedtuple('Output', ['alias', 'table', 'column', 'aggregation', 'transform', 'percentile'],
+                    defaults=(None, None))
+
+# key is an output alias or an Expression
+OrderKey = namedtuple('OrderKey', ['key', 'descending'])
+
+
+class WidgetPlan:
+    """Logical query of one widget config"""
+
+    def __init__(self, primary_table):
+        self.primary_table = primary_table  # FROM table
+        self.joins = []  # [(table, inner)] in TABLE_MODELS order
+        self.conditions = []  # [Condition] ANDed together
+        self.outputs = []  # [Output], empty for candidate plans
+        self.group_by = []  # [Expression]
+        self.order_by = []  # [OrderKey]
+        self.limit = None
+
+
+def validate_column(table, column):
+    """Validate that a column is allowed for the given table"""
+    if table not in ALLOWED_COLUMNS:
+        raise ValueError(f"Invalid table: {table}")
+    if column not in ALLOWED_COLUMNS[table]:
+        raise ValueError(f"Invalid column '{column}' for table '{table}'")
+    return True
+
+
+def _read_conditions(config, base_table):
+    """The config's conditions that produce a WHERE clause; the rest are ignored"""
+    conditions = []
+    for condition in config.get('conditions', []):
+        table = condition.get('table', base_table)
+        column = condition.get('column')
+        operator = condition.get('operator')
+        value = condition.get('value')
+
+        if not column or operator not in ALLOWED_OPERATORS:
+            continue
+
+        try:
+            validate_column(table, column)
+        except ValueError:
+            continue
+
+        if operator in ('IN', 'NOT IN'):
+            if isinstance(value, str):
+                value = [v.strip() for v in value.split(',')]
+            elif not isinstance(value, list):
+                continue
+        conditions.append(Condition(table, column, operator, value))
+    return conditions
+
+
+def rejects_null(condition):
+    """Whether a condition is never true when its column is NULL"""
+    if condition.operator == 'IS NULL' or (condition.operator == '=' and condition.value is None):
+        return False
+    # An empty NOT IN list is true for every row
+    return not (condition.operator == 'NOT IN' and not condition.value)
+
+
+def expression_column(table, column, transform=None):
+    """SQL expression of a column, transformed"""
+    return apply_transform(getattr(TABLE_MODELS[table], column), transform)
+
+
+def condition_clause(condition):
+    """SQL clause of one Condition"""
+    col = expression_column(condition.table, condition.column, condition.transform)
+    operator, value = condition.operator, condition.value
+    if condition.transform is not None and operator in ('=', '!=', '<', '>', '<=', '>='):
+        value = transformed_literal(condition.transform, value)
+
+    if operator == '=':
+        return col == value
+    elif operator == '!=':
+        return col != value
+    elif operator == '<':
+        return col < value
+    elif operator == '>':
+        return col > value
+    elif operator == '<=':
+        return col <= value
+    elif operator == '>=':
+        return col >= value
+    elif operator == 'LIKE':
+        return col.ilike(f'%{value}%')
+    elif operator == 'NOT LIKE':
+        return ~col.ilike(f'%{value}%')
+    elif operator == 'IN':
+        return col.in_(value)
+    elif operator == 'NOT IN':
+        return ~col.in_(value)
+    elif operator == 'IS NULL':
+        return col.is_(None)
+    return col.isnot(None)
+
+
+def _plan_joins(plan):
+    """Join every table the plan reads; INNER where a condition rejects its NULL rows"""
+    used = {expression.table for expression in plan.group_by}
+    used.update(c.table for c in plan.conditions)
+    used.update(o.table for o in plan.outputs)
+    used.update(key.key[0] for key in plan.order_by if isinstance(key.key, tuple))
+    inner = {c.table for c in plan.conditions if rejects_null(c)}
+    plan.joins = [(table, table in inner) for table in TABLE_MODELS
+                  if table in used and table != plan.primary_table]
+
+
+def _base_table(config):
+    base_table = config.get('data_source', {}).get('base_table', 'application')
+    if base_table not in TABLE_MODELS:
+        raise ValueError(f"Invalid base table: {base_table}")
+    return base_table
+
+
+def plan_widget_query(config):
+    """
+    Plan the rows a widget displays
+
+    The first field's table is the FROM table; fields, conditions, group_by
+    and order_by resolve exactly as the widget builder documents them.
+
+    Returns: WidgetPlan
+    Raises ValueError for configs without fields or with invalid tables/columns.
+    """
+    fields = config.get('fields', [])
+    if not fields:
+        raise ValueError("At least one field is required")
+    base_table = _base_table(config)
+
+    outputs = []
+    for field in fields:
+        table = field.get('table', base_table)
+        column = field.get('column')
+        validate_column(table, column)
+        aggregation = field.get('aggregation')
+        aggregation = aggregation if aggregation and aggregation in ALLOWED_AGGREGATIONS else None
+        model_column = getattr(TABLE_MODELS[table], column)
+        transform = parse_transform(model_column, field.get('transform'))
+        percentile = parse_percentile(model_column, transform, field.get('percentile')) if aggregation == 'PERCENTILE' else None
+        outputs.append(Output(field.get('alias', column), table, column, aggregation, transform, percentile))
+
+    plan = WidgetPlan(outputs[0].table)
+    plan.outputs = outputs
+    plan.conditions = _read_conditions(config, base_table)
+
+    for gb in config.get('group_by', []):
+        if '.' in gb:
+            parts = gb.split('.')
+            if len(parts) == 2:
+                try:
+                    validate_column(*parts)
+                except ValueError:
+                    continue
+                # Grouping by a column a plain field transforms groups by the transformed values
+                transform = next((output.transform for output in outputs
+                                  if not output.aggregation and (output.table, output.column) == tuple(parts)), None)
+                plan.group_by.append(Expression(parts[0], parts[1], transform))
+        else:
+            # Assume it's an alias
+            for field, output in zip(fields, outputs):
+                if field.get('alias') == gb or field.get('column') == gb:
+                    table = field.get('table', base_table)
+                    try:
+                        validate_column(table, field.get('column'))
+                        plan.group_by.append(Expression(table, field.get('column'), output.transform))
+                    except ValueError:
+                        continue
+                    break
+
+    aliases = {output.alias for output in outputs}
+    for ob in config.get('order_by', []):
+        col_name = ob.get('column')
+        descending = ob.get('direction', 'ASC').upper() == 'DESC'
+        if col_name in aliases:
+            plan.order_by.append(OrderKey(col_name, descending))
+            continue
+        # Try to find it in fields
+        for field, output in zip(fields, outputs):
+            if field.get('column') == col_name or field.get('alias') == col_name:
+                table = field.get('table', base_table)
+                try:
+                    validate_column(table, col_name if field.get('column') == col_name else field.get('column'))
+                    plan.order_by.append(OrderKey(Expression(table, field.get('column'), output.transform), descending))
+                except ValueError:
+                    continue
+                break
+
+    limit = min(config.get('limit', 100), 1000)  # Max 1000 rows
+    plan.limit = limit if limit and limit > 0 else None
+    _plan_joins(plan)
+    return plan
+
+
+def _segment_condition(config, base_table, segment_field, segment_value):
+    """Condition selecting one chart segment, e.g. gender = 'Male' for a pie slice"""
+    # Find the table for the segment field from the widget's fields config
+    segment_table = None
+    transform_spec = None
+    for field in config.get('fields', []):
+        if field.get('column') == segment_field or field.get('alias') == segment_field:
+            segment_table = field.get('table', base_table)
+            # Use the actual column name, not alias
+            if field.get('alias') == segment_field:
+                segment_field = field.get('column')
+            # A segment of a transformed field, e.g. one day of a per-day chart
+            transform_spec = field.get('transform')
+            break
+
+    # If not found in fields, check the tables the widget joins
+    if not segment_table:
+        data_source = config.get('data_source', {})
+        candidates = {base_table, *data_source.get('joins', []), *(c.get('table', base_table) for c in config.get('conditions', []))}
+        for table_name in TABLE_MODELS:
+            if table_name in candidates and segment_field in ALLOWED_COLUMNS[table_name]:
+                segment_table = table_name
+                break
+
+    if not segment_table:
+        raise ValueError(f"Segment field '{segment_field}' not found in widget configuration")
+
+    try:
+        validate_column(segment_table, segment_field)
+        transform = parse_transform(getattr(TABLE_MODELS[segment_table], segment_field), transform_spec)
+    except ValueError as e:
+        raise ValueError(f"Invalid segment field: {e}")
+
+    # Handle different value types
+    if segment_value is None or segment_value == 'null' or segment_value == 'None':
+        return Condition(segment_table, segment_field, 'IS NULL', None, transform)
+    if transform is not None:
+        # Chart values arrive as JSON or text, e.g. '20' for an age or '2026-10-19T00:00:00' for a day
+        try:
+            return Condition(segment_table, segment_field, '=', coerce_value(transform, segment_value), transform)
+        except ValueError as e:
+            raise ValueError(f"Invalid segment value: {e}")
+    if isinstance(segment_value, bool) or segment_value in ['true', 'false', 'True', 'False']:
+        bool_val = segment_value if isinstance(segment_value, bool) else segment_value.lower() == 'true'
+        return Condition(segment_table, segment_field, '=', bool_val, transform)
+    return Condition(segment_table, segment_field, '=', segment_value, transform)
+
+
+def plan_candidate_query(config, segment_field=None, segment_value=None):
+    """
+    Plan the distinct candidate IDs matching a widget's conditions, optionally
+    narrowed to one segment (segment_field = segment_value)
+
+    Returns: WidgetPlan without outputs
+    Raises ValueError for an invalid base table or segment field.
+    """
+    base_table = _base_table(config)
+    plan = WidgetPlan(base_table)
+    plan.conditions = _read_conditions(config, base_table)
+    if segment_field is not None:
+        plan.conditions.append(_segment_condition(config, base_table, segment_field, segment_value))
+    _plan_joins(plan)
+    return plan
+
+
+def _apply_joins_and_conditions(stmt, plan):
+    primary_model = TABLE_MODELS[plan.primary_table]
+    stmt = stmt.select_from(primary_model)
+    for table, inner in plan.joins:
+        join_model = TABLE_MODELS[table]
+        # All info tables have candidate_id, so join on that
+        stmt = stmt.join(join_model, primary_model.candidate_id == join_model.candidate_id, isouter=not inner)
+    if plan.conditions:
+        stmt = stmt.where(and_(*[condition_clause(c) for c in plan.conditions]))
+    return stmt
+
+
+def _aggregate(aggregation, col, percentile=None):
+    if aggregation == 'COUNT':
+        return func.count(col)
+    elif aggregation == 'SUM':
+        return func.sum(col)
+    elif aggregation == 'AVG':
+        return func.avg(col)
+    elif aggregation == 'MIN':
+        return func.min(col)
+    elif aggregation == 'MAX':
+        return func.max(col)
+    elif aggregation == 'PERCENTILE':
+        return percentile_of(col, percentile)
+    return col
+
+
+def _output_column(output):
+    col = expression_column(output.table, output.column, output.transform)
+    return _aggregate(output.aggregation, col, output.percentile).label(output.alias)
+
+
+def build_rows_select(plan):
+    """select() for a plan from plan_widget_query; rows hold the outputs in order"""
+    select_columns = [_output_column(output) for output in plan.outputs]
+    labeled = {output.alias: col for output, col in zip(plan.outputs, select_columns)}
+
+    stmt = _apply_joins_and_conditions(select(*select_columns), plan)
+
+    if plan.group_by:
+        stmt = stmt.group_by(*[expression_column(*expression) for expression in plan.group_by])
+
+    for key in plan.order_by:
+        col = expression_column(*key.key) if isinstance(key.key, tuple) else labeled[key.key]
+        stmt = stmt.order_by(desc(col) if key.descending else asc(col))
+
+    if plan.limit:
+        stmt = stmt.limit(plan.limit)
+    return stmt
+
+
+def build_candidate_select(plan):
+    """select() of distinct candidate IDs for a plan from plan_candidate_query"""
+    primary_model = TABLE_MODELS[plan.primary_table]
+    return _apply_joins_and_conditions(select(primary_model.candidate_id).distinct(), plan)
+
+
+def fusable(plan):
+    """
+    Whether a plan from plan_widget_query can be answered by a FusedPlan:
+    at most one GROUP BY column, every output an aggregate or that column,
+    and ORDER BY on aggregates only (group values sorted outside the
+    database would not follow its collation)
+    """
+    if len(plan.group_by) > 1:
+        return False
+    group = plan.group_by[0] if plan.group_by else None
+    aggregates = set()
+    for output in plan.outputs:
+        if output.aggregation:
+            aggregates.add(output.alias)
+        elif Expression(output.table, output.column, output.transform) != group:
+            return False
+    return all(key.key in aggregates for key in plan.order_by)
+
+
+def fusion_key(plan):
+    """Plans with equal keys filter their rows with the same conditions"""
+    return tuple(sorted(json.dumps(list(condition), default=str) for condition in plan.conditions))
+
+
+class FusedPlan:
+    """
+    Several fusable plans with the same fusion_key, run as one GROUPING SETS
+    statement
+
+    Plans reading the same FROM table keep it. Otherwise the statement reads
+    application, whose candidate_id every other table references, joined to
+    the tables the plans read; each plan's aggregates then only count rows
+    its FROM table has (FILTER (WHERE table.candidate_id IS NOT NULL)), and
+    a presence count per such table drops the groups it has no rows in.
+    """
+
+    def __init__(self, plans):
+        self.plans = plans
+        primaries = {plan.primary_table for plan in plans}
+        self.primary_table = primaries.pop() if len(primaries) == 1 else 'application'
+        self.groups = []  # [Expression], one grouping set each
+        self.grand_total = False  # whether a plan without GROUP BY needs the () grouping set
+        self.filtered = []  # [table] FROM tables of plans other than primary_table
+        self.aggregates = []  # [(Output without its alias, FROM table or None)]
+        for plan in plans:
+            if plan.group_by:
+                if plan.group_by[0] not in self.groups:
+                    self.groups.append(plan.group_by[0])
+            else:
+                self.grand_total = True
+            within = self.within(plan)
+            if within and within not in self.filtered:
+                self.filtered.append(within)
+            for output in plan.outputs:
+                aggregate = (output[1:], within)
+                if output.aggregation and aggregate not in self.aggregates:
+                    self.aggregates.append(aggregate)
+
+        # Joining every table any plan reads leaves each plan's rows unchanged (see join pruning)
+        self.base = WidgetPlan(self.primary_table)
+        self.base.conditions = plans[0].conditions
+        self.base.outputs = [output for plan in plans for output in plan.outputs]
+        self.base.group_by = list(self.groups)
+        _plan_joins(self.base)
+
+    def within(self, plan):
+        """The table a plan's rows must exist in, or None for all rows of the statement"""
+        return plan.primary_table if plan.primary_table != self.primary_table else None
+
+
+def _present(table):
+    return TABLE_MODELS[table].candidate_id.isnot(None)
+
+
+def build_fused_select(fused):
+    """
+    select() of a FusedPlan: the group columns, GROUPING() of each, the
+    presence counts and the aggregates, grouped by GROUPING SETS
+    ((group), ..., ())
+
+    GROUPING SETS is not available on SQLite.
+    """
+    group_columns = [expression_column(*expression) for expression in fused.groups]
+    columns = [col.label(f'g{i}') for i, col in enumerate(group_columns)]
+    columns += [func.grouping(col).label(f'grouping_{i}') for i, col in enumerate(group_columns)]
+    columns += [func.count().filter(_present(table)).label(f'p{i}') for i, table in enumerate(fused.filtered)]
+    for i, ((table, column, aggregation, transform, percentile), within) in enumerate(fused.aggregates):
+        col = _aggregate(aggregation, expression_column(table, column, transform), percentile)
+        columns.append((col.filter(_present(within)) if within else col).label(f'a{i}'))
+
+    sets = [tuple_(col) for col in group_columns]
+    if fused.grand_total:
+        sets.append(tuple_())
+    return _apply_joins_and_conditions(select(*columns), fused.base).group_by(func.grouping_sets(*sets))
+
+
+def _sort_key(index):
+    # NULLs sort as on PostgreSQL: last ascending, first descending
+    return lambda values: (values[index] is None, values[index] if values[index] is not None else 0)
+
+
+def split_fused_rows(fused, rows):
+    """
+    Each plan's rows, from the rows of build_fused_select
+
+    Returns: one list per plan of fused.plans, of value lists holding the
+    plan's outputs in order, with the plan's ORDER BY and LIMIT applied
+    """
+    width = len(fused.groups)
+    first_aggregate = 2 * width + len(fused.filtered)
+    by_set = {}
+    for row in rows:
+        grouped = [i for i in range(width) if not row[width + i]]
+        by_set.setdefault(grouped[0] if grouped else None, []).append(row)
+
+    results = []
+    for plan in fused.plans:
+        within = fused.within(plan)
+        group_index = fused.groups.index(plan.group_by[0]) if plan.group_by else None
+        positions = [
+            first_aggregate + fused.aggregates.index((output[1:], within))
+            if output.aggregation else group_index
+            for output in plan.outputs
+        ]
+        set_rows = by_set.get(group_index, [])
+        if within and group_index is not None:
+            # Groups made only of rows the plan's FROM table lacks
+            presence = 2 * width + fused.filtered.index(within)
+            set_rows = [row for row in set_rows if row[presence]]
+        values = [[row[position] for position in positions] for row in set_rows]
+
+        # Stable sorts from the last ORDER BY key to the first; an alias names its last output
+        aliases = [output.alias for output in plan.outputs]
+        for key in reversed(plan.order_by):
+            index = len(aliases) - 1 - aliases[::-1].index(key.key)
+            values.sort(key=_sort_key(index), reverse=key.descending)
+        results.append(values[:plan.limit] if plan.limit else values)
+    return results
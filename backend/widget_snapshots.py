@@ -0,0 +1,158 @@
+"""
+Materialized widgets - precomputed results for expensive, read-mostly widgets
+
+Widgets with materialize set are computed into widget_snapshot by the
+refresh-widget-snapshots beat task, at most every refresh_interval seconds,
+and the widget data endpoints serve the stored payload with a freshness
+indicator instead of running the query per request.
+
+A due snapshot is only recomputed if the data version (see response_cache)
+moved since it was computed: otherwise the stored result is still exact.
+Without Redis the data version is per process and says nothing about other
+workers' writes, so every due snapshot is recomputed. A snapshot whose config
+no longer matches the widget is ignored and recomputed on the next run.
+"""
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+from models import db, Widget, WidgetSnapshot
+from response_cache import get_data_version, get_redis
+from widget_query_builder import execute_widget_query, reads_clock
+
+logger = logging.getLogger(__name__)
+
+# Used when a materialized widget has no refresh_interval
+DEFAULT_REFRESH_INTERVAL = 900
+
+# The beat task runs every minute, so shorter intervals would not be honoured
+MIN_REFRESH_INTERVAL = 60
+
+
+def snapshot_config_hash(config):
+    """SHA-1 of a widget config as stored, to tell whether a snapshot matches it"""
+    canonical = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def shared_data_version():
+    """Data version shared by every process, or None while Redis is unavailable"""
+    return get_data_version() if get_redis() is not None else None
+
+
+def refresh_interval(widget):
+    """Seconds between refreshes of a materialized widget"""
+    return max(widget.refresh_interval or DEFAULT_REFRESH_INTERVAL, MIN_REFRESH_INTERVAL)
+
+
+def refresh_widget_snapshot(widget, snapshot=None, version=None):
+    """
+    Run a widget's query and store the result as its snapshot
+
+    Args:
+        widget: Widget to compute
+        snapshot: Its current WidgetSnapshot, if any
+        version: shared_data_version() read before the query started
+
+    Returns: WidgetSnapshot
+    Raises ValueError (or WidgetQueryError) if the query fails.
+    """
+    started = time.perf_counter()
+    result = execute_widget_query(widget.config_json)
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    if snapshot is None:
+        snapshot = WidgetSnapshot(widget_id=widget.id)
+        db.session.add(snapshot)
+    snapshot.config_hash = snapshot_config_hash(widget.config_json)
+    # Numeric aggregates come back as Decimal on PostgreSQL; store them the way jsonify sends them
+    snapshot.payload = json.loads(json.dumps(result, default=str))
+    snapshot.computed_at = datetime.utcnow()
+    snapshot.duration_ms = duration_ms
+    snapshot.data_version = version
+    db.session.commit()
+    return snapshot
+
+
+def refresh_widget_snapshots(now=None):
+    """
+    Recompute the due snapshots of every active materialized widget
+
+    A snapshot is due once refresh_interval has passed since it was computed,
+    and is skipped if the data version has not changed since. New widgets and
+    widgets whose config changed are computed right away.
+
+    Returns: {'refreshed': n, 'unchanged': n, 'failed': n}
+    """
+    now = now or datetime.utcnow()
+    # Read before any query runs, so writes made meanwhile leave the snapshots stale
+    version = shared_data_version()
+
+    widgets = Widget.query.filter_by(is_active=True, materialize=True).all()
+    snapshots = {
+        snapshot.widget_id: snapshot
+        for snapshot in WidgetSnapshot.query.filter(WidgetSnapshot.widget_id.in_([w.id for w in widgets]))
+    } if widgets else {}
+
+    counts = {'refreshed': 0, 'unchanged': 0, 'failed': 0}
+    for widget in widgets:
+        snapshot = snapshots.get(widget.id)
+        if snapshot is not None and snapshot.config_hash == snapshot_config_hash(widget.config_json):
+            if now < snapshot.computed_at + timedelta(seconds=refresh_interval(widget)):
+                continue
+            # Time series and ages move with the clock, not with the data version
+            if (version is not None and snapshot.data_version == version
+                    and not reads_clock(widget.config_json)):
+                counts['unchanged'] += 1
+                continue
+        try:
+            refresh_widget_snapshot(widget, snapshot, version)
+            counts['refreshed'] += 1
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Widget {widget.id} snapshot refresh failed: {str(e)}")
+            counts['failed'] += 1
+    return counts
+
+
+def load_widget_snapshots(widgets):
+    """
+    Snapshots to serve for the given widgets: materialized ones whose snapshot
+    matches their current config
+
+    Returns: {widget_id: WidgetSnapshot}
+    """
+    materialized = {w.id: w for w in widgets if w.materialize}
+    if not materialized:
+        return {}
+    snapshots = WidgetSnapshot.query.filter(WidgetSnapshot.widget_id.in_(list(materialized))).all()
+    return {
+        snapshot.widget_id: snapshot for snapshot in snapshots
+        if snapshot.config_hash == snapshot_config_hash(materialized[snapshot.widget_id].config_json)
+    }
+
+
+def snapshot_freshness(snapshot, version=None, now=None):
+    """
+    Freshness indicator sent along with a served snapshot
+
+    Args:
+        snapshot: WidgetSnapshot being served
+        version: shared_data_version(), read once per request
+        now: Current UTC time
+
+    Returns: {'computed_at', 'age_seconds', 'duration_ms', 'up_to_date'} where
+    up_to_date tells whether the data changed since, or is None when unknown
+    """
+    now = now or datetime.utcnow()
+    up_to_date = None
+    if version is not None and snapshot.data_version is not None:
+        up_to_date = snapshot.data_version == version
+    return {
+        'computed_at': snapshot.computed_at.isoformat(),
+        'age_seconds': max(int((now - snapshot.computed_at).total_seconds()), 0),
+        'duration_ms': snapshot.duration_ms,
+        'up_to_date': up_to_date
+    }
@@ -0,0 +1,272 @@
+"""
+Widget field transforms - values computed in SQL before they are grouped or aggregated
+
+A widget field may carry a transform, so time-bucketed charts and histograms
+aggregate in the database instead of pulling raw rows to the client:
+
+    {"table": "application", "column": "created_at", "alias": "day",
+     "transform": {"type": "date_trunc", "unit": "day"}}
+    {"table": "basic_info", "column": "dob", "alias": "age", "transform": {"type": "age"}}
+    {"table": "income_info", "column": "total_family_income_amount", "alias": "band",
+     "transform": {"type": "width_bucket", "min": 0, "max": 500000, "buckets": 10}}
+
+and the PERCENTILE aggregation takes a "percentile" fraction (default 0.5, the
+median), computed as percentile_cont(p) WITHIN GROUP (ORDER BY value).
+
+parse_transform / parse_percentile validate a field into hashable options and
+apply_transform / percentile_of emit them. coerce_value / transformed_literal
+turn a value read off a chart (a segment) back into something comparable with
+the transformed column. The SQL is written per dialect:
+PostgreSQL natively, SQLite (development) with strftime and CASE; PERCENTILE
+needs PostgreSQL. Options are validated constants rendered inline, so the
+SELECT and GROUP BY copies of an expression compile to the same text.
+"""
+import math
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import DateTime, Float, Integer, literal, literal_column
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+DATE_TRUNC_UNITS = ['hour', 'day', 'week', 'month']
+
+# Most buckets a width_bucket histogram may have
+MAX_BUCKETS = 100
+
+# Transforms offered by get_widget_metadata, with the column types they apply to
+TRANSFORMS = [
+    {'value': 'date_trunc', 'label': 'Truncate to hour/day/week/month', 'types': ['date', 'datetime'],
+     'units': DATE_TRUNC_UNITS},
+    {'value': 'age', 'label': 'Age in years', 'types': ['date']},
+    {'value': 'width_bucket', 'label': 'Histogram bucket (1 to buckets, 0 below min, buckets + 1 from max)',
+     'types': ['integer'], 'options': ['min', 'max', 'buckets']},
+]
+
+# SQLite strftime format and modifiers per date_trunc unit; weeks start on Monday as on PostgreSQL
+_SQLITE_TRUNC = {
+    'hour': ('%Y-%m-%dT%H:00:00', ()),
+    'day': ('%Y-%m-%dT00:00:00', ()),
+    'week': ('%Y-%m-%dT00:00:00', ('weekday 0', '-6 days')),
+    'month': ('%Y-%m-01T00:00:00', ()),
+}
+
+
+def _is_number(value):
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value))
+
+
+def _column_kind(column):
+    """'date', 'datetime', 'number', 'boolean' or None for a model column"""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    if issubclass(python_type, datetime):
+        return 'datetime'
+    if issubclass(python_type, date):
+        return 'date'
+    if issubclass(python_type, bool):
+        return 'boolean'
+    if issubclass(python_type, (int, float, Decimal)):
+        return 'number'
+    return None
+
+
+def parse_transform(column, spec):
+    """
+    Validate a field's transform against its column
+
+    Args:
+        column: Model column the field reads
+        spec: The field's "transform" object, or None
+
+    Returns: ('date_trunc', unit), ('age',), ('width_bucket', min, max, buckets) or None
+    Raises ValueError describing what is wrong.
+    """
+    if spec is None:
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError("transform must be an object")
+
+    kind = spec.get('type')
+    column_kind = _column_kind(column)
+    if kind == 'date_trunc':
+        if column_kind not in ('date', 'datetime'):
+            raise ValueError(f"date_trunc needs a date or datetime column, not '{column.key}'")
+        unit = spec.get('unit', 'day')
+        if unit not in DATE_TRUNC_UNITS:
+            raise ValueError(f"Invalid date_trunc unit. Must be one of: {DATE_TRUNC_UNITS}")
+        return ('date_trunc', unit)
+    if kind == 'age':
+        if column_kind != 'date':
+            raise ValueError(f"age needs a date column, not '{column.key}'")
+        return ('age',)
+    if kind == 'width_bucket':
+        if column_kind != 'number':
+            raise ValueError(f"width_bucket needs a numeric column, not '{column.key}'")
+        low, high, buckets = spec.get('min'), spec.get('max'), spec.get('buckets')
+        if not (_is_number(low) and _is_number(high) and low < high):
+            raise ValueError("width_bucket needs numbers min < max")
+        if not (isinstance(buckets, int) and not isinstance(buckets, bool) and 1 <= buckets <= MAX_BUCKETS):
+            raise ValueError(f"width_bucket buckets must be an integer from 1 to {MAX_BUCKETS}")
+        return ('width_bucket', low, high, buckets)
+    raise ValueError(f"Invalid transform. Must be one of: {[t['value'] for t in TRANSFORMS]}")
+
+
+def parse_percentile(column, transform, fraction):
+    """
+    Validate the "percentile" of a PERCENTILE field
+
+    Returns: the fraction (0.5 when not given)
+    Raises ValueError unless it is a number from 0 to 1 over a numeric value.
+    """
+    if transform is None:
+        kind = _column_kind(column)
+    else:
+        kind = 'datetime' if transform[0] == 'date_trunc' else 'number'
+    if kind != 'number':
+        raise ValueError(f"PERCENTILE needs a numeric column, not '{column.key}'")
+    fraction = 0.5 if fraction is None else fraction
+    if not (_is_number(fraction) and 0 <= fraction <= 1):
+        raise ValueError("percentile must be a number from 0 to 1")
+    return fraction
+
+
+class _DateTrunc(FunctionElement):
+    """date_trunc(unit, value); clauses are the quoted unit and the value"""
+    inherit_cache = True
+
+
+class _Age(FunctionElement):
+    """Whole years from a date to today"""
+    type = Integer()
+    inherit_cache = True
+
+
+class _WidthBucket(FunctionElement):
+    """width_bucket(value, min, max, buckets); the bounds are inline literals"""
+    type = Integer()
+    inherit_cache = True
+
+
+class _Percentile(FunctionElement):
+    """percentile_cont(fraction) WITHIN GROUP (ORDER BY value)"""
+    type = Float()
+    inherit_cache = True
+
+
+def apply_transform(col, transform):
+    """The SQL expression of col under a parse_transform result"""
+    if transform is None:
+        return col
+    if transform[0] == 'date_trunc':
+        return _DateTrunc(literal_column(f"'{transform[1]}'"), col)
+    if transform[0] == 'age':
+        return _Age(col)
+    _, low, high, buckets = transform
+    return _WidthBucket(col, literal_column(repr(low)), literal_column(repr(high)), literal_column(str(buckets)))
+
+
+def coerce_value(transform, value):
+    """
+    A value compared with a transformed column, e.g. a chart segment, in the
+    transform's result type
+
+    Returns: a datetime for date_trunc, an int for age and width_bucket
+    Raises ValueError when the value is not one.
+    """
+    if transform[0] == 'date_trunc':
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                pass
+        raise ValueError(f"{transform[0]} values are ISO dates, not {value!r}")
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError(f"{transform[0]} values are integers, not {value!r}")
+
+
+def transformed_literal(transform, value):
+    """
+    SQL operand for a coerce_value result: date_trunc values go through the
+    same bucketing as the column, so any instant in a bucket names that bucket
+    """
+    if transform[0] == 'date_trunc':
+        return apply_transform(literal(value, DateTime()), transform)
+    return literal(value, Integer())
+
+
+def percentile_of(col, fraction):
+    """PERCENTILE aggregate of col"""
+    return _Percentile(literal_column(repr(float(fraction))), col)
+
+
+def _args(element, compiler, **kw):
+    return [compiler.process(clause, **kw) for clause in element.clauses]
+
+
+@compiles(_DateTrunc)
+def _compile_date_trunc(element, compiler, **kw):
+    unit, value = _args(element, compiler, **kw)
+    return f"date_trunc({unit}, {value})"
+
+
+@compiles(_DateTrunc, 'sqlite')
+def _compile_date_trunc_sqlite(element, compiler, **kw):
+    unit, value = _args(element, compiler, **kw)
+    fmt, modifiers = _SQLITE_TRUNC[unit.strip("'")]
+    return f"strftime('{fmt}', {value}{''.join(f', {m!r}' for m in modifiers)})"
+
+
+@compiles(_Age)
+def _compile_age(element, compiler, **kw):
+    value, = _args(element, compiler, **kw)
+    return f"CAST(date_part('year', age(CURRENT_DATE, {value})) AS INTEGER)"
+
+
+@compiles(_Age, 'sqlite')
+def _compile_age_sqlite(element, compiler, **kw):
+    value, = _args(element, compiler, **kw)
+    return (f"(CAST(strftime('%Y', 'now') AS INTEGER) - CAST(strftime('%Y', {value}) AS INTEGER)"
+            f" - (strftime('%m-%d', 'now') < strftime('%m-%d', {value})))")
+
+
+@compiles(_WidthBucket)
+def _compile_width_bucket(element, compiler, **kw):
+    value, low, high, buckets = _args(element, compiler, **kw)
+    # Integer columns use the numeric variant, with exact bucket edges
+    return f"width_bucket(CAST({value} AS NUMERIC), {low}, {high}, {buckets})"
+
+
+@compiles(_WidthBucket, 'sqlite')
+def _compile_width_bucket_sqlite(element, compiler, **kw):
+    value, low, high, buckets = _args(element, compiler, **kw)
+    return (f"CASE WHEN {value} IS NULL THEN NULL WHEN {value} < {low} THEN 0"
+            f" WHEN {value} >= {high} THEN {int(buckets) + 1}"
+            f" ELSE CAST(({value} - {low}) * {buckets} * 1.0 / ({high} - {low}) AS INTEGER) + 1 END")
+
+
+@compiles(_Percentile)
+def _compile_percentile(element, compiler, **kw):
+    fraction, value = _args(element, compiler, **kw)
+    return f"percentile_cont({fraction}) WITHIN GROUP (ORDER BY {value})"
+
+
+@compiles(_Percentile, 'sqlite')
+def _compile_percentile_sqlite(element, compiler, **kw):
+    raise CompileError("PERCENTILE needs PostgreSQL")
@@ -197,7 +197,8 @@ export default function AgentWidgetBuilder({ token, onSave, onCancel }: Props) {
         width: currentConfig.width || 'col-md-6'
       }
 
-      const res = await adminApi.createWidget(token, widgetData)
+      // The bulk endpoint validates the generated config before saving it
+      const res = await adminApi.saveWidgets(token, [widgetData])
       if (res.ok) {
         setMessages(prev => [...prev, {
           role: 'system',
@@ -207,9 +208,10 @@ export default function AgentWidgetBuilder({ token, onSave, onCancel }: Props) {
         setTimeout(() => onSave(), 1500)
       } else {
         const error = await res.json()
+        const itemError = error.results?.find((r: any) => r.msg)?.msg
         setMessages(prev => [...prev, {
           role: 'system',
-          content: `Failed to save widget: ${error.msg || 'Unknown error'}`,
+          content: `Failed to save widget: ${itemError || error.msg || 'Unknown error'}`,
           timestamp: new Date()
         }])
       }
@@ -1,17 +1,25 @@
 import React, { useState, useEffect } from 'react'
-import { Widget } from '../../types/widget'
+import { Widget, WidgetSnapshotInfo } from '../../types/widget'
 import * as adminApi from '../../services/adminApi'
 import WidgetPreview from './WidgetPreview'
 
 interface Props {
   token: string
-  onNavigateToSubmissions?: (candidateIds: string[], widgetTitle: string) => void
+  onNavigateToSubmissions?: (segmentId: string, count: number, widgetTitle: string) => void
 }
 
 interface WidgetWithData extends Widget {
   data?: any[]
   loading?: boolean
   error?: string
+  snapshot?: WidgetSnapshotInfo | null
+}
+
+function formatAge(seconds: number) {
+  if (seconds < 60) return 'just now'
+  if (seconds < 3600) return `${Math.floor(seconds / 60)} min ago`
+  if (seconds < 86400) return `${Math.floor(seconds / 3600)} h ago`
+  return `${Math.floor(seconds / 86400)} d ago`
 }
 
 export default function CustomDashboard({ token, onNavigateToSubmissions }: Props) {
@@ -37,29 +45,26 @@ export default function CustomDashboard({ token, onNavigateToSubmissions }: Prop
         }))
         setWidgets(widgetsWithLoading)
 
-        // Load data for each widget
-        widgetsList.forEach(async (widget: Widget, index: number) => {
-          if (!widget.id) return
-
-          try {
-            const dataRes = await adminApi.getWidgetData(token, widget.id)
-            if (dataRes.ok) {
-              const data = await dataRes.json()
-              setWidgets(prev => prev.map((w, i) =>
-                i === index ? { ...w, data: data.data, loading: false } : w
-              ))
-            } else {
-              const error = await dataRes.json()
-              setWidgets(prev => prev.map((w, i) =>
-                i === index ? { ...w, loading: false, error: error.msg } : w
-              ))
-            }
-          } catch (err: any) {
-            setWidgets(prev => prev.map((w, i) =>
-              i === index ? { ...w, loading: false, error: err.message } : w
-            ))
+        // Load data for all widgets in one batch request
+        const ids = widgetsList.map((w: Widget) => w.id).filter(Boolean) as number[]
+        try {
+          const dataRes = await adminApi.getWidgetsData(token, ids)
+          const body = await dataRes.json()
+          if (dataRes.ok) {
+            const results = new Map<number, any>(body.widgets.map((r: any) => [r.widget_id, r]))
+            setWidgets(prev => prev.map(w => {
+              const result = w.id ? results.get(w.id) : undefined
+              if (!result) return { ...w, loading: false }
+              return result.msg
+                ? { ...w, loading: false, error: result.msg }
+                : { ...w, data: result.data, snapshot: result.snapshot, loading: false }
+            }))
+          } else {
+            setWidgets(prev => prev.map(w => ({ ...w, loading: false, error: body.msg })))
           }
-        })
+        } catch (err: any) {
+          setWidgets(prev => prev.map(w => ({ ...w, loading: false, error: err.message })))
+        }
       }
     } catch (err) {
       console.error('Failed to load dashboard:', err)
@@ -78,7 +83,7 @@ export default function CustomDashboard({ token, onNavigateToSubmissions }: Prop
       if (dataRes.ok) {
         const data = await dataRes.json()
         setWidgets(prev => prev.map((w, i) =>
-          i === index ? { ...w, data: data.data, loading: false } : w
+          i === index ? { ...w, data: data.data, snapshot: data.snapshot, loading: false } : w
         ))
       } else {
         const error = await dataRes.json()
@@ -100,8 +105,8 @@ export default function CustomDashboard({ token, onNavigateToSubmissions }: Prop
       const res = await adminApi.getWidgetCandidates(token, widget.id)
       if (res.ok) {
         const data = await res.json()
-        if (data.candidate_ids && data.candidate_ids.length > 0) {
-          onNavigateToSubmissions(data.candidate_ids, widget.title)
+        if (data.segment_id && data.count > 0) {
+          onNavigateToSubmissions(data.segment_id, data.count, widget.title)
         } else {
           alert('No matching records found for this widget.')
         }
@@ -126,9 +131,9 @@ export default function CustomDashboard({ token, onNavigateToSubmissions }: Prop
       )
       if (res.ok) {
         const data = await res.json()
-        if (data.candidate_ids && data.candidate_ids.length > 0) {
+        if (data.segment_id && data.count > 0) {
           const filterTitle = `${widget.title} - ${segmentData.name}`
-          onNavigateToSubmissions(data.candidate_ids, filterTitle)
+          onNavigateToSubmissions(data.segment_id, data.count, filterTitle)
         } else {
           alert(`No records found for "${segmentData.name}".`)
         }
@@ -219,6 +224,16 @@ export default function CustomDashboard({ token, onNavigateToSubmissions }: Prop
                       {widget.description}
                     </small>
                   )}
+                  {widget.snapshot && (
+                    <small
+                      className="d-block"
+                      style={{ opacity: 0.9, fontSize: '11px' }}
+                      title={`Computed at ${new Date(widget.snapshot.computed_at + 'Z').toLocaleString()} in ${widget.snapshot.duration_ms} ms`}
+                    >
+                      Updated {formatAge(widget.snapshot.age_seconds)}
+                      {widget.snapshot.up_to_date === false && ' · data changed since'}
+                    </small>
+                  )}
                 </div>
                 <button
                   className="btn btn-sm"
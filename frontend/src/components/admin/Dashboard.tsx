@@ -18,7 +18,7 @@ import {
 
 interface DashboardProps {
   token: string
-  onNavigateToSubmissions?: (candidateIds: string[], filterTitle: string) => void
+  onNavigateToSubmissions?: (segmentId: string, count: number, filterTitle: string) => void
 }
 
 interface DashboardStats {
@@ -90,8 +90,8 @@ export default function Dashboard({ token, onNavigateToSubmissions }: DashboardP
       const res = await adminApi.getDashboardFilterCandidates(token, filterType, filterValue)
       if (res.ok) {
         const data = await res.json()
-        if (data.candidate_ids && data.candidate_ids.length > 0) {
-          onNavigateToSubmissions(data.candidate_ids, filterTitle)
+        if (data.segment_id && data.count > 0) {
+          onNavigateToSubmissions(data.segment_id, data.count, filterTitle)
         } else {
           alert(`No records found for "${filterTitle}".`)
         }
@@ -23,7 +23,8 @@ interface Application {
 interface Props {
   token: string
   onViewApplication: (candidateId: string) => void
-  filterCandidateIds?: string[]
+  filterSegmentId?: string
+  filterCount?: number
   filterTitle?: string
   onClearFilter?: () => void
   userRole?: string
@@ -31,10 +32,13 @@ interface Props {
 
 type QuickFilter = 'all' | 'appeared' | 'selected' | 'considered_not_selected'
 
-export default function SubmissionsList({ token, onViewApplication, filterCandidateIds, filterTitle, onClearFilter, userRole }: Props) {
+export default function SubmissionsList({ token, onViewApplication, filterSegmentId, filterCount, filterTitle, onClearFilter, userRole }: Props) {
   const [applications, setApplications] = useState<Application[]>([])
   const [loading, setLoading] = useState(true)
-  const [page, setPage] = useState(1)
+  // Cursor of the page on screen and its number, for the query they were issued for
+  const [paging, setPaging] = useState<{ key: string; cursor: string | null; page: number }>({ key: '', cursor: null, page: 1 })
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [prevCursor, setPrevCursor] = useState<string | null>(null)
   const [totalPages, setTotalPages] = useState(1)
   const [total, setTotal] = useState(0)
   const [sortBy, setSortBy] = useState('created_at')
@@ -49,14 +53,23 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
   const [selectedIds, setSelectedIds] = useState<Set<string>>(new Set())
   const [bulkLoading, setBulkLoading] = useState(false)
 
+  // Cursors only fit the sort and filters they came from; any change goes back to page 1
+  const queryKey = JSON.stringify([sortBy, sortOrder, search, filterSegmentId || '', quickFilter])
+  const cursor = paging.key === queryKey ? paging.cursor : null
+  const page = paging.key === queryKey ? paging.page : 1
+
   useEffect(() => {
     fetchApplications()
-  }, [page, sortBy, sortOrder, search, filterCandidateIds, quickFilter])
+  }, [queryKey, cursor])
 
   // Clear selection when page changes
   useEffect(() => {
     setSelectedIds(new Set())
-  }, [page, filterCandidateIds])
+  }, [queryKey, cursor])
+
+  const goToPage = (pageCursor: string | null, pageNumber: number) => {
+    setPaging({ key: queryKey, cursor: pageCursor, page: pageNumber })
+  }
 
   // Set default filter for panel members
   useEffect(() => {
@@ -68,8 +81,6 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
   const fetchApplications = async () => {
     setLoading(true)
     try {
-      const candidateIdsParam = filterCandidateIds?.join(',') || ''
-
       // Build filters based on quickFilter
       const filters: ApplicationFilters = {}
       if (quickFilter === 'appeared' || userRole === 'panel_member') {
@@ -81,10 +92,12 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
         filters.filterSelected = 'false'
       }
 
-      const res = await getApplications(token, page, 20, sortBy, sortOrder, search, candidateIdsParam, filters)
+      const res = await getApplications(token, cursor, 20, sortBy, sortOrder, search, filterSegmentId || '', filters)
       if (res.ok) {
         const data = await res.json()
         setApplications(data.applications)
+        setNextCursor(data.next_cursor)
+        setPrevCursor(data.prev_cursor)
         setTotalPages(data.pages)
         setTotal(data.total)
       }
@@ -107,7 +120,6 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
   const handleSearch = (e: React.FormEvent) => {
     e.preventDefault()
     setSearch(searchInput)
-    setPage(1)
   }
 
   const formatDate = (dateStr: string) => {
@@ -214,11 +226,11 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
       </div>
 
       {/* Widget Filter Banner */}
-      {filterCandidateIds && filterCandidateIds.length > 0 && (
+      {filterSegmentId && (
         <div className="alert alert-info d-flex justify-content-between align-items-center mb-4" style={{ borderRadius: '8px' }}>
           <div>
             <strong>Filtered by Widget:</strong> {filterTitle || 'Custom Widget'}
-            <span className="ms-2 badge bg-primary">{filterCandidateIds.length} records</span>
+            {filterCount !== undefined && <span className="ms-2 badge bg-primary">{filterCount} records</span>}
           </div>
           {onClearFilter && (
             <button
@@ -238,28 +250,28 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
             <span className="text-muted me-2" style={{ fontSize: '14px' }}>Quick Filters:</span>
             <button
               className={`btn btn-sm ${quickFilter === 'all' ? 'btn-primary' : 'btn-outline-secondary'}`}
-              onClick={() => { setQuickFilter('all'); setPage(1) }}
+              onClick={() => setQuickFilter('all')}
               style={{ borderRadius: '20px', padding: '4px 12px', fontSize: '13px' }}
             >
               All Submissions
             </button>
             <button
               className={`btn btn-sm ${quickFilter === 'appeared' ? 'btn-success' : 'btn-outline-success'}`}
-              onClick={() => { setQuickFilter('appeared'); setPage(1) }}
+              onClick={() => setQuickFilter('appeared')}
               style={{ borderRadius: '20px', padding: '4px 12px', fontSize: '13px' }}
             >
               Appeared for Interview
             </button>
             <button
               className={`btn btn-sm ${quickFilter === 'selected' ? 'btn-info' : 'btn-outline-info'}`}
-              onClick={() => { setQuickFilter('selected'); setPage(1) }}
+              onClick={() => setQuickFilter('selected')}
               style={{ borderRadius: '20px', padding: '4px 12px', fontSize: '13px' }}
             >
               Selected
             </button>
             <button
               className={`btn btn-sm ${quickFilter === 'considered_not_selected' ? 'btn-warning' : 'btn-outline-warning'}`}
-              onClick={() => { setQuickFilter('considered_not_selected'); setPage(1) }}
+              onClick={() => setQuickFilter('considered_not_selected')}
               style={{ borderRadius: '20px', padding: '4px 12px', fontSize: '13px' }}
             >
               Considered but Not Selected
@@ -337,7 +349,6 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
                   onClick={() => {
                     setSearch('')
                     setSearchInput('')
-                    setPage(1)
                   }}
                 >
                   Clear
@@ -507,52 +518,29 @@ export default function SubmissionsList({ token, onViewApplication, filterCandid
                 ))}
               </div>
 
-              {/* Pagination */}
-              {totalPages > 1 && (
+              {/* Pagination (cursor based, so pages are stepped through one at a time) */}
+              {(nextCursor || prevCursor) && (
                 <div className="d-flex flex-column flex-md-row justify-content-between align-items-center p-3 border-top gap-2">
                   <div className="text-muted" style={{ fontSize: '0.9rem' }}>
-                    Page {page} of {totalPages}
+                    Page {page} of {Math.max(totalPages, page)}
                   </div>
                   <nav>
                     <ul className="pagination mb-0" style={{ flexWrap: 'wrap', justifyContent: 'center' }}>
-                      <li className={`page-item ${page === 1 ? 'disabled' : ''}`}>
+                      <li className={`page-item ${!prevCursor ? 'disabled' : ''}`}>
                         <button
                           className="page-link"
-                          onClick={() => setPage(page - 1)}
-                          disabled={page === 1}
+                          onClick={() => goToPage(prevCursor, page - 1)}
+                          disabled={!prevCursor}
                           style={{ fontSize: '0.875rem', padding: '0.375rem 0.75rem' }}
                         >
                           Previous
                         </button>
                       </li>
-                      {Array.from({ length: Math.min(5, totalPages) }, (_, i) => {
-                        let pageNum;
-                        if (totalPages <= 5) {
-                          pageNum = i + 1;
-                        } else if (page <= 3) {
-                          pageNum = i + 1;
-                        } else if (page >= totalPages - 2) {
-                          pageNum = totalPages - 4 + i;
-                        } else {
-                          pageNum = page - 2 + i;
-                        }
-                        return (
-                          <li key={pageNum} className={`page-item ${page === pageNum ? 'active' : ''}`}>
-                            <button
-                              className="page-link"
-                              onClick={() => setPage(pageNum)}
-                              style={{ fontSize: '0.875rem', padding: '0.375rem 0.75rem' }}
-                            >
-                              {pageNum}
-                            </button>
-                          </li>
-                        );
-                      })}
-                      <li className={`page-item ${page === totalPages ? 'disabled' : ''}`}>
+                      <li className={`page-item ${!nextCursor ? 'disabled' : ''}`}>
                         <button
                           className="page-link"
-                          onClick={() => setPage(page + 1)}
-                          disabled={page === totalPages}
+                          onClick={() => goToPage(nextCursor, page + 1)}
+                          disabled={!nextCursor}
                           style={{ fontSize: '0.875rem', padding: '0.375rem 0.75rem' }}
                         >
                           Next
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react'
+import React, { useState, useEffect, useCallback, useRef } from 'react'
 import { Widget, WidgetMetadata, WidgetField, WidgetCondition, WidgetChartConfig, WidgetConfigJson } from '../../types/widget'
 import * as adminApi from '../../services/adminApi'
 import WidgetPreview from './WidgetPreview'
@@ -19,12 +19,17 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
   const [previewLoading, setPreviewLoading] = useState(false)
   const [previewData, setPreviewData] = useState<any[]>([])
   const [previewError, setPreviewError] = useState<string | null>(null)
+  const [previewExpensive, setPreviewExpensive] = useState<{ part: string; reason: string; column?: string; index?: number }[]>([])
+  // Preview request in flight, aborted (and its query cancelled) when superseded or on unmount
+  const previewRequest = useRef<{ id: string; controller: AbortController } | null>(null)
 
   // Form state
   const [title, setTitle] = useState(widget?.title || '')
   const [description, setDescription] = useState(widget?.description || '')
   const [widgetType, setWidgetType] = useState<'pie' | 'bar' | 'line' | 'number' | 'table'>(widget?.widget_type || 'pie')
   const [width, setWidth] = useState(widget?.width || 'col-md-6')
+  const [materialize, setMaterialize] = useState(widget?.materialize || false)
+  const [refreshMinutes, setRefreshMinutes] = useState(widget?.refresh_interval ? Math.round(widget.refresh_interval / 60) : 15)
 
   // Data source state
   const [baseTable] = useState('application')
@@ -96,18 +101,37 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
     }
   }, [baseTable, selectedTables, fields, conditions, groupBy, chartConfig, widgetType])
 
+  const cancelPreview = useCallback(() => {
+    const current = previewRequest.current
+    if (current) {
+      previewRequest.current = null
+      current.controller.abort()
+      adminApi.cancelWidgetQuery(token, current.id).catch(() => {})
+    }
+  }, [token])
+
+  useEffect(() => cancelPreview, [cancelPreview])
+
   const handlePreview = async () => {
     if (fields.length === 0) {
       setPreviewError('Please add at least one field')
       return
     }
 
+    cancelPreview()
+    const request = {
+      id: `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`,
+      controller: new AbortController()
+    }
+    previewRequest.current = request
+
     setPreviewLoading(true)
     setPreviewError(null)
+    setPreviewExpensive([])
 
     try {
       const config = buildConfigJson()
-      const res = await adminApi.previewWidget(token, config)
+      const res = await adminApi.previewWidget(token, config, request.id, request.controller.signal)
 
       if (res.ok) {
         const data = await res.json()
@@ -115,11 +139,16 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
       } else {
         const error = await res.json()
         setPreviewError(error.msg || 'Preview failed')
+        setPreviewExpensive(error.expensive || [])
       }
     } catch (err: any) {
+      if (err.name === 'AbortError') return
       setPreviewError(err.message || 'Preview failed')
     } finally {
-      setPreviewLoading(false)
+      if (previewRequest.current === request) {
+        previewRequest.current = null
+        setPreviewLoading(false)
+      }
     }
   }
 
@@ -142,7 +171,9 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
         description: description.trim(),
         widget_type: widgetType,
         config_json: buildConfigJson(),
-        width
+        width,
+        materialize,
+        refresh_interval: materialize ? Math.max(refreshMinutes, 1) * 60 : null
       }
 
       if (widget?.id) {
@@ -238,6 +269,31 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
     return table?.fields || []
   }
 
+  // Date transforms (time buckets, age) offered for a field's column, as select values
+  const getDateTransformOptions = (field: WidgetField) => {
+    const columnType = getAvailableFields(field.table).find(f => f.name === field.column)?.type
+    const options: { value: string; label: string }[] = []
+    for (const t of metadata?.transforms || []) {
+      if (!columnType || !t.types.includes(columnType)) continue
+      if (t.value === 'date_trunc') {
+        (t.units || []).forEach(unit => options.push({ value: `date_trunc:${unit}`, label: `Per ${unit}` }))
+      } else if (t.value === 'age') {
+        options.push({ value: 'age', label: t.label })
+      }
+    }
+    return options
+  }
+
+  const transformValue = (field: WidgetField) =>
+    field.transform?.type === 'date_trunc' ? `date_trunc:${field.transform.unit}` : field.transform?.type || ''
+
+  const setDateTransform = (index: number, value: string) => {
+    const [type, unit] = value.split(':')
+    updateField(index, {
+      transform: !value ? undefined : type === 'date_trunc' ? { type: 'date_trunc', unit: unit as any } : { type: 'age' }
+    })
+  }
+
   const getAllAvailableTables = () => {
     return [baseTable, ...selectedTables.filter(t => t !== baseTable)]
   }
@@ -385,7 +441,7 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
                             <select
                               className="form-select form-select-sm"
                               value={field.column}
-                              onChange={(e) => updateField(index, { column: e.target.value, alias: e.target.value })}
+                              onChange={(e) => updateField(index, { column: e.target.value, alias: e.target.value, transform: undefined })}
                             >
                               <option value="">Select column...</option>
                               {getAvailableFields(field.table).map(f => (
@@ -429,6 +485,22 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
                           </div>
                         </div>
 
+                        {/* Time bucket / age, computed in SQL */}
+                        {getDateTransformOptions(field).length > 0 && (
+                          <div className="mt-2" style={{ maxWidth: '220px' }}>
+                            <select
+                              className="form-select form-select-sm"
+                              value={transformValue(field)}
+                              onChange={(e) => setDateTransform(index, e.target.value)}
+                            >
+                              <option value="">As stored</option>
+                              {getDateTransformOptions(field).map(o => (
+                                <option key={o.value} value={o.value}>{o.label}</option>
+                              ))}
+                            </select>
+                          </div>
+                        )}
+
                         {/* Group By Toggle */}
                         {field.column && !field.aggregation && (
                           <div className="mt-2">
@@ -612,6 +684,33 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
                     placeholder="Enter a brief description..."
                   />
                 </div>
+                <div className="col-md-6">
+                  <div className="form-check">
+                    <input
+                      type="checkbox"
+                      className="form-check-input"
+                      id="widget-materialize"
+                      checked={materialize}
+                      onChange={(e) => setMaterialize(e.target.checked)}
+                    />
+                    <label className="form-check-label" htmlFor="widget-materialize" style={{ fontWeight: '600' }}>
+                      Precompute results
+                    </label>
+                  </div>
+                  <small className="text-muted">For expensive widgets: the dashboard shows a stored result refreshed in the background</small>
+                </div>
+                {materialize && (
+                  <div className="col-md-6">
+                    <label className="form-label" style={{ fontWeight: '600' }}>Refresh every (minutes)</label>
+                    <input
+                      type="number"
+                      className="form-control"
+                      min={1}
+                      value={refreshMinutes}
+                      onChange={(e) => setRefreshMinutes(parseInt(e.target.value) || 1)}
+                    />
+                  </div>
+                )}
               </div>
 
               <hr className="my-4" />
@@ -743,6 +842,19 @@ export default function WidgetBuilder({ token, widget, onSave, onCancel }: Props
               {previewError && (
                 <div className="alert alert-danger" style={{ borderRadius: '8px' }}>
                   <strong>Error:</strong> {previewError}
+                  {previewExpensive.length > 0 && (
+                    <ul className="mb-0 mt-2">
+                      {previewExpensive.map((item, i) => (
+                        <li key={i}>
+                          <strong>
+                            {item.part === 'conditions' && item.index !== undefined ? `Condition ${item.index + 1}` : item.part.replace('_', ' ')}
+                            {item.column ? ` (${item.column})` : ''}:
+                          </strong>{' '}
+                          {item.reason}
+                        </li>
+                      ))}
+                    </ul>
+                  )}
                 </div>
               )}
 
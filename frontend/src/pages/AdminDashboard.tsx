@@ -45,19 +45,22 @@ export default function AdminDashboard({ token, user, onLogout }: AdminDashboard
   const [widgetRefreshTrigger, setWidgetRefreshTrigger] = useState(0)
 
   // Widget filter for submissions
-  const [widgetFilterCandidateIds, setWidgetFilterCandidateIds] = useState<string[] | undefined>(undefined)
+  const [widgetFilterSegmentId, setWidgetFilterSegmentId] = useState<string | undefined>(undefined)
+  const [widgetFilterCount, setWidgetFilterCount] = useState<number | undefined>(undefined)
   const [widgetFilterTitle, setWidgetFilterTitle] = useState<string | undefined>(undefined)
 
-  // Handler for navigating from widget to submissions
-  const handleWidgetNavigation = (candidateIds: string[], widgetTitle: string) => {
-    setWidgetFilterCandidateIds(candidateIds)
+  // Handler for navigating from widget to submissions (segment saved server-side)
+  const handleWidgetNavigation = (segmentId: string, count: number, widgetTitle: string) => {
+    setWidgetFilterSegmentId(segmentId)
+    setWidgetFilterCount(count)
     setWidgetFilterTitle(widgetTitle)
     setActiveTab('submissions')
     setViewingCandidateId(null)
   }
 
   const clearWidgetFilter = () => {
-    setWidgetFilterCandidateIds(undefined)
+    setWidgetFilterSegmentId(undefined)
+    setWidgetFilterCount(undefined)
     setWidgetFilterTitle(undefined)
   }
 
@@ -1034,7 +1037,8 @@ export default function AdminDashboard({ token, user, onLogout }: AdminDashboard
             <SubmissionsList
               token={token}
               onViewApplication={(candidateId) => setViewingCandidateId(candidateId)}
-              filterCandidateIds={widgetFilterCandidateIds}
+              filterSegmentId={widgetFilterSegmentId}
+              filterCount={widgetFilterCount}
               filterTitle={widgetFilterTitle}
               onClearFilter={clearWidgetFilter}
               userRole={user.role}
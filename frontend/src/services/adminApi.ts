@@ -110,24 +110,27 @@ export interface ApplicationFilters {
   filterConsidered?: 'true' | 'false' | ''
 }
 
+// cursor is the next_cursor / prev_cursor of the page on screen (null for the first page)
 export async function getApplications(
   token: string,
-  page: number = 1,
+  cursor: string | null = null,
   perPage: number = 20,
   sortBy: string = 'created_at',
   sortOrder: string = 'desc',
   search: string = '',
-  candidateIds: string = '',
+  segmentId: string = '',
   filters: ApplicationFilters = {}
 ) {
   const params = new URLSearchParams({
-    page: page.toString(),
     per_page: perPage.toString(),
     sort_by: sortBy,
     sort_order: sortOrder,
-    search,
-    candidate_ids: candidateIds
+    search
   })
+  if (cursor) params.append('cursor', cursor)
+
+  // Saved segment from a widget or dashboard drill-down
+  if (segmentId) params.append('segment_id', segmentId)
 
   // Add optional filters
   if (filters.filterAppeared) params.append('filter_appeared', filters.filterAppeared)
@@ -213,14 +216,25 @@ export async function deleteWidget(token: string, widgetId: number) {
   })
 }
 
-export async function previewWidget(token: string, configJson: any) {
+export async function previewWidget(token: string, configJson: any, queryId?: string, signal?: AbortSignal) {
   return fetch(`${BASE}/admin/widgets/preview`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
-      'Authorization': `Bearer ${token}`
+      'Authorization': `Bearer ${token}`,
+      ...(queryId ? { 'X-Widget-Query-Id': queryId } : {})
     },
-    body: JSON.stringify({ config_json: configJson })
+    body: JSON.stringify({ config_json: configJson }),
+    signal
+  })
+}
+
+// Stop a widget query started with the given X-Widget-Query-Id
+export async function cancelWidgetQuery(token: string, queryId: string) {
+  return fetch(`${BASE}/admin/widgets/queries/${encodeURIComponent(queryId)}/cancel`, {
+    method: 'POST',
+    headers: { 'Authorization': `Bearer ${token}` },
+    keepalive: true
   })
 }
 
@@ -230,6 +244,47 @@ export async function getWidgetData(token: string, widgetId: number) {
   })
 }
 
+// Data for several widgets in one request (default: every active widget)
+export async function getWidgetsData(token: string, widgetIds?: number[]) {
+  const query = widgetIds && widgetIds.length ? `?ids=${widgetIds.join(',')}` : ''
+  return fetch(`${BASE}/admin/widgets/data${query}`, {
+    headers: { 'Authorization': `Bearer ${token}` }
+  })
+}
+
+// Create (no id) and update (with id) several widgets in one transaction; nothing is saved if any item is invalid
+export async function saveWidgets(token: string, widgets: any[]) {
+  return fetch(`${BASE}/admin/widgets/bulk`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Authorization': `Bearer ${token}`
+    },
+    body: JSON.stringify({ widgets })
+  })
+}
+
+// Recent executions of a widget's query (SQL, timings, rows) and their summary
+export async function getWidgetProfile(token: string, widgetId: number) {
+  return fetch(`${BASE}/admin/widgets/${widgetId}/profile`, {
+    headers: { 'Authorization': `Bearer ${token}` }
+  })
+}
+
+// Run a widget's query now with its EXPLAIN output captured
+export async function profileWidget(token: string, widgetId: number) {
+  return fetch(`${BASE}/admin/widgets/${widgetId}/profile`, {
+    method: 'POST',
+    headers: { 'Authorization': `Bearer ${token}` }
+  })
+}
+
+export async function getSlowestWidgets(token: string, limit = 10, sort: 'total' | 'avg' | 'p95' | 'max' = 'total') {
+  return fetch(`${BASE}/admin/widgets/slowest?limit=${limit}&sort=${sort}`, {
+    headers: { 'Authorization': `Bearer ${token}` }
+  })
+}
+
 export async function reorderWidgets(token: string, positions: { id: number; position: number }[]) {
   return fetch(`${BASE}/admin/widgets/reorder`, {
     method: 'PUT',
@@ -241,8 +296,9 @@ export async function reorderWidgets(token: string, positions: { id: number; pos
   })
 }
 
+// Drill-down APIs save the matching candidates server-side and return a segment_id
 export async function getWidgetCandidates(token: string, widgetId: number) {
-  return fetch(`${BASE}/admin/widgets/${widgetId}/candidates`, {
+  return fetch(`${BASE}/admin/widgets/${widgetId}/candidates?segment=true`, {
     headers: { 'Authorization': `Bearer ${token}` }
   })
 }
@@ -256,7 +312,8 @@ export async function getWidgetSegmentCandidates(token: string, widgetId: number
     },
     body: JSON.stringify({
       segment_field: segmentField,
-      segment_value: segmentValue
+      segment_value: segmentValue,
+      segment: true
     })
   })
 }
@@ -271,7 +328,8 @@ export async function getDashboardFilterCandidates(token: string, filterType: st
     },
     body: JSON.stringify({
       filter_type: filterType,
-      filter_value: filterValue
+      filter_value: filterValue,
+      segment: true
     })
   })
 }
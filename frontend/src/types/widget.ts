@@ -2,7 +2,23 @@ export interface WidgetField {
   table: string
   column: string
   alias: string
-  aggregation?: 'COUNT' | 'SUM' | 'AVG' | 'MIN' | 'MAX' | null
+  aggregation?: 'COUNT' | 'SUM' | 'AVG' | 'MIN' | 'MAX' | 'PERCENTILE' | null
+  transform?: WidgetFieldTransform
+  percentile?: number  // PERCENTILE fraction, 0.5 (median) by default
+}
+
+// Value computed in SQL before grouping or aggregation
+export type WidgetFieldTransform =
+  | { type: 'date_trunc'; unit: 'hour' | 'day' | 'week' | 'month' }
+  | { type: 'age' }
+  | { type: 'width_bucket'; min: number; max: number; buckets: number }
+
+export interface WidgetTransformOption {
+  value: WidgetFieldTransform['type']
+  label: string
+  types: string[]  // TableField types it applies to
+  units?: string[]
+  options?: string[]
 }
 
 export interface WidgetCondition {
@@ -48,6 +64,8 @@ export interface Widget {
   position?: number
   width?: string
   is_active?: boolean
+  materialize?: boolean
+  refresh_interval?: number | null
   created_by?: string
   created_at?: string
   updated_at?: string
@@ -73,6 +91,15 @@ export interface WidgetMetadata {
   aggregations: { value: string; label: string }[]
   operators: { value: string; label: string }[]
   widget_types: { value: string; label: string }[]
+  transforms?: WidgetTransformOption[]
+}
+
+// Freshness of a materialized widget's precomputed result
+export interface WidgetSnapshotInfo {
+  computed_at: string
+  age_seconds: number
+  duration_ms: number
+  up_to_date: boolean | null
 }
 
 export interface WidgetPreviewData {